@@ -1,8 +1,28 @@
-from flask import Flask, request, jsonify, render_template
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Request, request, jsonify, render_template, Response
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+import io
 import os
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict
+from functools import partial
 from flask_cors import CORS, cross_origin
-from cnnClassifier.utils.common import decodeImage
+from cnnClassifier.utils.common import decodeImageToBytes
 from cnnClassifier.pipeline.prediction import PredictionPipeline
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.components.job_runner import JobRunner, JobAlreadyRunning
+from cnnClassifier.components.prefork_server import PreforkServer, configure_tf_threads
+from cnnClassifier.components.serving_metrics import get_serving_metrics
+from cnnClassifier.components.admission import AdmissionController, Overloaded, DeadlineExceeded
+from cnnClassifier import logger
+
+# NOTE: Nothing above imports TensorFlow. It is only imported when the model
+# is loaded (in ClientApp.start()), so the server can come up in well under a
+# second and report liveness while the heavy work happens in the background.
+_import_seconds = time.perf_counter() - _import_started
 
 # -----------------------------------------------------------------------------
 # WHY THIS FILE EXISTS:
@@ -11,7 +31,7 @@ from cnnClassifier.pipeline.prediction import PredictionPipeline
 # It connects the User (Browser) to our Code (Model).
 # 1. It serves the HTML page (UI).
 # 2. It accepts uploaded images.
-# 3. It runs the Training Pipeline on command.
+# 3. It runs the Training Pipeline on command (as a background job).
 # 4. It runs the Prediction Pipeline and returns the result.
 # -----------------------------------------------------------------------------
 
@@ -19,13 +39,62 @@ from cnnClassifier.pipeline.prediction import PredictionPipeline
 os.putenv('LANG', 'en_US.UTF-8')
 os.putenv('LC_ALL', 'en_US.UTF-8')
 
+class InMemoryRequest(Request):
+    """
+    WHAT: A Flask Request that keeps multipart file uploads in memory.
+
+    WHY:
+    - By default, uploads bigger than 500KB are spooled to a temp file on disk.
+      Our images go straight into the decoder, so the disk round-trip is waste.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
 # Initialize the Flask application
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 
 # Enable CORS (Cross-Origin Resource Sharing)
 # This allows other websites/apps to talk to our API if needed.
 CORS(app)
 
+# Latency histograms, counters and gauges shared with the prediction pipeline.
+metrics = get_serving_metrics()
+STAGE_HELP = "Time spent in each stage of the prediction path"
+
+
+@app.before_request
+def start_request_timer():
+    request.started_at = time.perf_counter()
+    request.arrived_at = time.monotonic()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    WHAT: Counts every request (by route and status) and records its total latency.
+
+    WHY the route rule instead of the URL:
+    - '/train/<job_id>' must be ONE series, not one per job ID.
+    """
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.counter("requests_total", "HTTP requests by route and status",
+                    route=route, status=response.status_code).inc()
+    started = getattr(request, "started_at", None)
+    if started is not None:
+        metrics.histogram("request_seconds", "End-to-end HTTP request latency",
+                          route=route).observe(time.perf_counter() - started)
+    return response
+
+
+def timed_jsonify(result):
+    """
+    WHAT: jsonify() with the time it takes recorded as the "serialize" stage.
+    """
+    with metrics.timer("stage_seconds", STAGE_HELP, stage="serialize"):
+        return jsonify(result)
+
 
 class ClientApp:
     """
@@ -35,10 +104,133 @@ class ClientApp:
     - We want to initialize the pipeline ONLY ONCE when the app starts.
     - If we put this inside the route function, it would reload the model 
       every single time someone clicks "Predict", which is very slow.
+    - __init__ is cheap (config only), so the server can start listening at once.
+    - start() does the heavy work: imports TensorFlow, loads the model once and
+      starts the registry's file watcher (a new 'model.h5' from /train or a
+      deploy is hot-swapped in the background), then warms the model up.
+      Only after that does '/ready' say yes.
+    - enable_batching() starts the MicroBatcher, which groups concurrent
+      /predict calls into one model call.
+    - enable_cache() answers re-submitted images from memory.
+    - The JobRunner runs '/train' jobs in a separate background process.
+    - The AdmissionController caps how many predictions run at once.
+    """
+    def __init__(self, serving_config=None):
+        self.ready = False
+        self.startup_error = None
+        self.startup_timings = {"imports": round(_import_seconds, 3)}
+        with self._phase("config"):
+            config = ConfigurationManager()
+            self.serving_config = serving_config or config.get_serving_config()
+            self.classifier = PredictionPipeline(config=self.serving_config)
+            self.jobs = JobRunner(config.get_training_job_config())
+            self.admission = AdmissionController(self.serving_config.max_in_flight)
+            # Bigger bodies are refused (413) before they are read into memory.
+            app.config["MAX_CONTENT_LENGTH"] = int(self.serving_config.max_request_mb * 1024 * 1024)
+
+    @contextmanager
+    def _phase(self, name):
+        """
+        WHAT: Times one phase of the startup sequence and logs it.
+        """
+        started = time.perf_counter()
+        yield
+        self.startup_timings[name] = round(time.perf_counter() - started, 3)
+        logger.info(f"Startup phase '{name}' took {self.startup_timings[name]:.3f}s")
+
+    def start(self, pin_threads=True):
+        """
+        WHAT: The heavy part of startup (runs in a background thread).
+
+        HOW:
+        1. Import TensorFlow (and pin its thread pools, unless the pre-fork
+           worker already did).
+        2. Load the model into the registry and start the file watcher.
+        3. Warm-up: run a dummy batch for every configured batch size. The first
+           call for each batch shape traces the graph and allocates buffers -
+           we pay that here instead of making the first real user wait.
+        4. Start batching + caching and mark the app as ready.
+        """
+        try:
+            with self._phase("tensorflow_import"):
+                if pin_threads:
+                    configure_tf_threads(self.serving_config.intra_op_threads,
+                                         self.serving_config.inter_op_threads)
+                else:
+                    import tensorflow  # noqa: F401
+            with self._phase("model_load"):
+                self.classifier.registry.start()
+            for batch_size in self.serving_config.warmup_batch_sizes:
+                with self._phase(f"warmup_batch_{batch_size}"):
+                    self.classifier.warm_up(batch_size)
+            self.classifier.enable_batching()
+            self.classifier.enable_cache()
+            self.startup_timings["total"] = round(sum(self.startup_timings.values()), 3)
+            self.ready = True
+            logger.info(f"Server ready: {self.startup_timings}")
+        except Exception as e:
+            self.startup_error = str(e)
+            logger.exception(f"Startup failed: {e}")
+
+
+def request_deadline():
+    """
+    WHAT: The deadline of the current request (time.monotonic() seconds, or None).
+
+    HOW:
+    - Starts from 'request_timeout_ms' in config.yaml, counted from when the
+      request arrived.
+    - A client can ask for a SHORTER timeout with the 'X-Request-Timeout-Ms'
+      header (e.g. when it gives up after 2 seconds itself).
+    """
+    timeout_ms = clApp.serving_config.request_timeout_ms
+    requested = request.headers.get("X-Request-Timeout-Ms", type=float)
+    if requested and requested > 0:
+        timeout_ms = min(timeout_ms, requested) if timeout_ms else requested
+    if not timeout_ms:
+        return None
+    return request.arrived_at + timeout_ms / 1000.0
+
+
+@app.errorhandler(Overloaded)
+def overloaded_response(e):
+    """
+    WHAT: Fast rejection when we are at capacity: HTTP 503 + Retry-After.
+    """
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, round(clApp.serving_config.retry_after_seconds)))
+    return response
+
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded_response(e):
+    """
+    WHAT: HTTP 504 for a request whose deadline passed before it was scored.
     """
-    def __init__(self):
-        self.filename = "inputImage.jpg"
-        self.classifier = PredictionPipeline(self.filename)
+    return jsonify({"error": str(e)}), 504
+
+
+@app.errorhandler(BadRequest)
+@app.errorhandler(RequestEntityTooLarge)
+def client_error_response(e):
+    """
+    WHAT: HTTP 400 (malformed upload) / 413 (body over max_request_mb) as JSON.
+    """
+    return jsonify({"error": e.description}), e.code
+
+
+def not_ready_response():
+    """
+    WHAT: The answer for prediction calls that arrive before the model is warm.
+    (HTTP 503 + Retry-After, so clients and load balancers try again shortly.)
+    """
+    if clApp.ready:
+        return None
+    response = jsonify({"error": "model is still loading", "startup_error": clApp.startup_error})
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
 
 
 # -----------------------------------------------------------------------------
@@ -66,11 +258,92 @@ def trainRoute():
     WHY: 
     - Allows us to retrain the model remotely (e.g., from a button on the UI 
       or an API call) without SSH-ing into the server.
+
+    HOW:
+    - Starts 'python main.py' as a background job and returns its ID right away
+      (HTTP 202). Poll '/train/<job_id>' for its status.
+    - Only one training job can run at a time. A second call gets HTTP 409
+      with the ID of the job that is already running.
+    - The command comes from 'training_jobs' in config.yaml
+      (e.g. switch it to "dvc repro" to reproduce the DVC pipeline instead).
+    """
+    try:
+        job = clApp.jobs.submit("training")
+    except JobAlreadyRunning as e:
+        running_id = e.job.job_id if e.job else None
+        return jsonify({"error": "training is already running", "job_id": running_id}), 409
+    return jsonify({
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/train/{job.job_id}",
+        "log_url": f"/train/{job.job_id}/log",
+    }), 202
+
+
+@app.route("/train/<job_id>", methods=['GET'])
+@cross_origin()
+def trainStatusRoute(job_id):
+    """
+    WHAT: Returns the status of a training job ("running", "succeeded", "failed").
+    """
+    job = clApp.jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"unknown job {job_id}"}), 404
+    return jsonify(asdict(job))
+
+
+@app.route("/train/<job_id>/log", methods=['GET'])
+@cross_origin()
+def trainLogRoute(job_id):
+    """
+    WHAT: Returns the last lines of a training job's log (?lines=N, default 100).
+    """
+    lines = request.args.get("lines", default=100, type=int)
+    log = clApp.jobs.tail(job_id, lines=max(1, lines))
+    if log is None:
+        return jsonify({"error": f"unknown job {job_id}"}), 404
+    return Response(log, mimetype="text/plain")
+
+
+def read_uploaded_images(json_key):
+    """
+    WHAT: Returns the raw bytes of every image in the request, in order.
+
+    WHY:
+    - Base64 in JSON makes uploads ~33% bigger and costs a JSON parse plus a
+      Base64 decode of multi-MB strings. So we also accept the image as-is.
+
+    HOW (checked in this order):
+    1. multipart/form-data: every uploaded file (e.g. curl -F "image=@scan.jpg").
+    2. Raw body with Content-Type image/* or application/octet-stream
+       (e.g. curl --data-binary @scan.jpg -H "Content-Type: image/jpeg").
+    3. JSON with Base64 (what the bundled web UI sends): request.json[json_key],
+       either one string or a list of strings.
+
+    Raises BadRequest (HTTP 400) for anything else, e.g. a missing JSON key
+    or invalid Base64. Bodies over max_request_mb are refused with HTTP 413.
     """
-    # Runs the main.py script just like we do in the terminal
-    os.system("python main.py")
-    # os.system("dvc repro") # Alternative: Use DVC to reproduce the pipeline
-    return "Training done successfully!"
+    with metrics.timer("stage_seconds", STAGE_HELP, stage="body_read"):
+        if request.files:
+            return [f.read() for _, f in request.files.items(multi=True)]
+        if request.mimetype.startswith("image/") or request.mimetype == "application/octet-stream":
+            return [request.get_data(cache=False)]
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or json_key not in body:
+            raise BadRequest(
+                f"send the image as a multipart file, a raw image/* body, "
+                f"or JSON {{\"{json_key}\": <base64>}}"
+            )
+        payload = body[json_key]
+    if isinstance(payload, str):
+        payload = [payload]
+    if not isinstance(payload, list) or not all(isinstance(img, str) for img in payload):
+        raise BadRequest(f"'{json_key}' must be a Base64 string or a list of them")
+    with metrics.timer("stage_seconds", STAGE_HELP, stage="base64_decode"):
+        try:
+            return [decodeImageToBytes(img) for img in payload]
+        except ValueError as e:   # binascii.Error is a ValueError
+            raise BadRequest(f"invalid Base64 in '{json_key}': {e}")
 
 
 # -----------------------------------------------------------------------------
@@ -83,25 +356,197 @@ def predictRoute():
     WHAT: The API endpoint for making predictions.
     
     HOW:
-    1. Receives the image as a Base64 string (text format of an image).
-    2. Decodes it back into a JPG file ('inputImage.jpg').
+    1. Receives the image: as a Base64 string in JSON ({"image": ...}), as a
+       multipart file upload, or as the raw request body (image/*).
+    2. Gets the raw image bytes IN MEMORY (no file on disk, so
+       concurrent requests can't overwrite each other's images).
     3. Calls the classifier to predict.
     4. Returns the result as JSON.
+
+    Under overload it answers 503 + Retry-After right away (admission control),
+    and 504 if the request's deadline passes before the model gets to it.
+    """
+    not_ready = not_ready_response()
+    if not_ready is not None:
+        return not_ready
+    with clApp.admission.admit():
+        deadline = request_deadline()
+        images = read_uploaded_images('image')
+        if len(images) != 1:
+            return jsonify({"error": "send exactly one image (use /predict/batch for more)"}), 400
+        result = clApp.classifier.predict_bytes(images[0], deadline=deadline)
+    return timed_jsonify(result)
+
+
+# -----------------------------------------------------------------------------
+# ROUTE 4: BULK PREDICT (whole CT series)
+# -----------------------------------------------------------------------------
+@app.route("/predict/batch", methods=['POST'])
+@cross_origin()
+def predictBatchRoute():
+    """
+    WHAT: Predicts many images (e.g. every slice of a CT study) in ONE request.
+
+    HOW:
+    1. Receives {"images": [base64, base64, ...]} or a multipart upload with
+       one file per image.
+    2. Gets the raw bytes of every image in memory.
+    3. The classifier decodes/resizes them in parallel and runs the model in chunks.
+    4. Returns one result per image, in the same order, with class probabilities.
+    """
+    not_ready = not_ready_response()
+    if not_ready is not None:
+        return not_ready
+    with clApp.admission.admit():
+        deadline = request_deadline()
+        images = read_uploaded_images('images')
+        result = clApp.classifier.predict_many(images, deadline=deadline)
+    return timed_jsonify(result)
+
+
+# -----------------------------------------------------------------------------
+# ROUTE 5: BATCHING STATS
+# -----------------------------------------------------------------------------
+@app.route("/batching/stats", methods=['GET'])
+@cross_origin()
+def batchingStatsRoute():
+    """
+    WHAT: Shows how well the MicroBatcher is batching requests.
+
+    WHY:
+    - 'mean_batch_size' tells us the batch size we actually achieve, so we
+      can tune 'max_batch_size' and 'max_wait_ms' in config.yaml.
+    """
+    if clApp.classifier.batcher is None:
+        return not_ready_response()
+    return jsonify(clApp.classifier.batcher.stats())
+
+
+# -----------------------------------------------------------------------------
+# ROUTE 6: CACHE STATS
+# -----------------------------------------------------------------------------
+@app.route("/cache/stats", methods=['GET'])
+@cross_origin()
+def cacheStatsRoute():
+    """
+    WHAT: Shows the prediction cache's hit/miss counters.
+    """
+    if clApp.classifier.cache is None:
+        return not_ready_response()
+    return jsonify(clApp.classifier.cache.stats())
+
+
+# -----------------------------------------------------------------------------
+# ROUTE 7: METRICS
+# -----------------------------------------------------------------------------
+@app.route("/metrics", methods=['GET'])
+@cross_origin()
+def metricsRoute():
+    """
+    WHAT: All serving metrics, for Prometheus to scrape (or '?format=json' for humans).
+
+    WHAT'S IN IT:
+    - cnn_stage_seconds{stage=...}: body_read, base64_decode, image_decode,
+      resize, queue_wait, inference (labelled with model_version), serialize.
+    - cnn_request_seconds / cnn_requests_total: per route (and status).
+    - cnn_inference_batch_size, cnn_batch_queue_depth, cache counters.
+    - cnn_model_info{version=...}: which model is being served.
+    - '<name>_percentile{quantile="0.5"|"0.95"|"0.99"}' for every histogram.
+
+    WHY it is cheap:
+    - The request path only bumps counters. Percentiles and gauges are
+      computed here, when someone asks.
+    """
+    if request.args.get("format") == "json":
+        return jsonify(metrics.snapshot())
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+# -----------------------------------------------------------------------------
+# ROUTE 8: HEALTH CHECKS
+# -----------------------------------------------------------------------------
+@app.route("/health", methods=['GET'])
+@cross_origin()
+def healthRoute():
+    """
+    WHAT: Liveness check - "is the process up and answering?"
+
+    WHY separate from /ready:
+    - An orchestrator RESTARTS a container that fails liveness. A server that
+      is still loading its model is alive, just not ready - it must not be killed.
     """
-    image = request.json['image']
-    decodeImage(image, clApp.filename)
-    result = clApp.classifier.predict()
-    return jsonify(result)
+    return jsonify({"status": "alive"})
+
+
+@app.route("/ready", methods=['GET'])
+@cross_origin()
+def readyRoute():
+    """
+    WHAT: Readiness check - "can this server take prediction traffic now?"
+
+    HOW:
+    - 200 once the model is loaded and warmed up, 503 before that.
+    - Includes how long each startup phase took.
+    """
+    body = {
+        "ready": clApp.ready,
+        "model_version": clApp.classifier.registry.version,
+        "startup_timings": clApp.startup_timings,
+        "startup_error": clApp.startup_error,
+    }
+    return jsonify(body), (200 if clApp.ready else 503)
 
 
 # -----------------------------------------------------------------------------
 # MAIN ENTRY POINT
 # -----------------------------------------------------------------------------
+def create_app(pin_threads=True, serving_config=None):
+    """
+    WHAT: Builds the ClientApp and returns the Flask app right away.
+    The model is loaded and warmed up in a background thread (see ClientApp.start()).
+
+    WHY a function:
+    - In pre-fork mode each worker process must open the model after the
+      fork (TensorFlow is not fork-safe), so the workers call this themselves.
+      They memory-map the same .tflite file, so the weights are shared.
+    - 'serving_config' replaces the 'serving' section of config.yaml (the load
+      test uses it to serve a freshly trained model in-process).
+    """
+    global clApp
+    clApp = ClientApp(serving_config)
+    threading.Thread(
+        target=clApp.start, kwargs={"pin_threads": pin_threads}, name="startup", daemon=True
+    ).start()
+    return app
+
+
 if __name__ == "__main__":
-    # Initialize the ClientApp (loads the model)
-    clApp = ClientApp()
-    
-    # Start the Flask server
-    # host='0.0.0.0': Makes it accessible from outside the container/VM (important for AWS/Azure)
-    # port=8080: The port it listens on
-    app.run(host='0.0.0.0', port=8080) 
+    serving_config = ConfigurationManager().get_serving_config()
+
+    if serving_config.workers > 1:
+        # Production mode: N worker processes sharing one socket.
+        # Each worker pins its TensorFlow thread pools, then memory-maps the
+        # TFLite model: all workers share the same pages of its weights.
+        if serving_config.backend != "tflite":
+            raise ValueError(
+                f"serving.workers = {serving_config.workers} needs serving.backend: tflite "
+                f"(the workers share its memory-mapped weights), got '{serving_config.backend}'"
+            )
+        PreforkServer(
+            partial(create_app, pin_threads=False),
+            host='0.0.0.0',
+            port=8080,
+            workers=serving_config.workers,
+            intra_op_threads=serving_config.intra_op_threads,
+            inter_op_threads=serving_config.inter_op_threads,
+            preload_path=serving_config.tflite_model_path,
+        ).serve_forever()
+    else:
+        # Single process: initialize the ClientApp (the model loads in the background)
+        create_app()
+
+        # Start the Flask server
+        # host='0.0.0.0': Makes it accessible from outside the container/VM (important for AWS/Azure)
+        # port=8080: The port it listens on
+        # threaded=True: Handle requests concurrently, so the MicroBatcher can group them
+        app.run(host='0.0.0.0', port=8080, threaded=True) 
@@ -3,6 +3,7 @@ from cnnClassifier.pipeline.s1_data_ingestion import DataIngestionTrainingPipeli
 from cnnClassifier.pipeline.s2_prepare_base_model import PrepareBaseModelTrainingPipeline
 from cnnClassifier.pipeline.s3_model_trainer import ModelTrainingPipeline
 from cnnClassifier.pipeline.s4_mlflow_Evaluation import EvaluationPipeline
+from cnnClassifier.pipeline.s5_model_export import ModelExportPipeline
 
 
 STAGE_NAME = "Data Ingestion stage"
@@ -51,4 +52,17 @@ try:
 
 except Exception as e:
         logger.exception(e)
-        raise e
\ No newline at end of file
+        raise e
+
+
+STAGE_NAME = "Model Export stage"
+try:
+   logger.info(f"*******************")
+   logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+   model_export = ModelExportPipeline()
+   model_export.main()
+   logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+
+except Exception as e:
+        logger.exception(e)
+        raise e
@@ -0,0 +1,98 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+from cnnClassifier.utils.preprocessing import TARGET_SIZE, load_pixels
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# Benchmarks the shared preprocessing (draft-mode JPEG decode + bilinear resize)
+# against the decoder we used before: keras' load_img(), which decodes the
+# full-resolution image and only then resizes it.
+#
+# Usage:
+#   python research/benchmark_preprocessing.py                 # synthetic scans
+#   python research/benchmark_preprocessing.py --images artifacts/data_ingestion
+#   python research/benchmark_preprocessing.py --sizes 512 1024 2048 4096
+# -----------------------------------------------------------------------------
+
+
+def make_synthetic_jpegs(directory: str, sizes: list, per_size: int = 5) -> dict:
+    """
+    WHAT: Writes smooth, noisy grayscale-like JPEGs (roughly what a CT slice looks like).
+    """
+    rng = np.random.default_rng(0)
+    files = {}
+    for size in sizes:
+        y, x = np.mgrid[0:size, 0:size]
+        base = 128 + 80 * np.sin(x / (size / 7)) * np.cos(y / (size / 5))
+        files[size] = []
+        for i in range(per_size):
+            noise = rng.normal(0, 12, (size, size))
+            gray = np.clip(base + noise, 0, 255).astype(np.uint8)
+            path = os.path.join(directory, f"scan_{size}_{i}.jpg")
+            Image.fromarray(np.stack([gray] * 3, axis=-1)).save(path, quality=92)
+            files[size].append(path)
+    return files
+
+
+def keras_load(path: str, interpolation: str) -> np.ndarray:
+    import tensorflow as tf
+    img = tf.keras.preprocessing.image.load_img(
+        path, target_size=TARGET_SIZE[::-1], interpolation=interpolation
+    )
+    return np.asarray(img, dtype=np.uint8)
+
+
+def time_per_image(fn, paths: list, repeats: int) -> float:
+    """
+    WHAT: Median milliseconds per image over 'repeats' passes (after one warm-up pass).
+    """
+    for path in paths:
+        fn(path)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for path in paths:
+            fn(path)
+        timings.append((time.perf_counter() - started) * 1000.0 / len(paths))
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark draft-mode JPEG preprocessing vs. keras load_img().")
+    parser.add_argument("--images", default=None, help="Directory of real images (default: synthetic)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048, 4096])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    decoders = {
+        "keras load_img (nearest, old serving)": lambda p: keras_load(p, "nearest"),
+        "keras load_img (bilinear, old training)": lambda p: keras_load(p, "bilinear"),
+        "shared load_pixels (draft + bilinear)": load_pixels,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = [os.path.join(root, name)
+                     for root, _, names in os.walk(args.images) for name in sorted(names)
+                     if name.lower().endswith((".jpg", ".jpeg", ".png"))]
+            groups = {"images": paths}
+        else:
+            groups = make_synthetic_jpegs(tmp, args.sizes)
+
+        print(f"{'input':>10} | " + " | ".join(f"{name:>40}" for name in decoders) + " | speedup")
+        for group, paths in groups.items():
+            if not paths:
+                continue
+            timings = [time_per_image(fn, paths, args.repeats) for fn in decoders.values()]
+            speedup = timings[1] / timings[-1] if timings[-1] else float("nan")
+            label = f"{group}px" if isinstance(group, int) else group
+            print(f"{label:>10} | " + " | ".join(f"{t:>37.2f} ms" for t in timings) + f" | {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from cnnClassifier.components.serving_metrics import get_serving_metrics
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Admission Control" Component for serving.
+#
+# During a burst, every request used to be accepted and queued without limit.
+# Clients time out after a few seconds, but the server still decoded and ran
+# the model for them - work nobody was waiting for, which made the backlog
+# (and everyone else's latency) even worse.
+#
+# Admission control keeps the server responsive under overload:
+# 1. At most 'max_in_flight' prediction requests are admitted at once. The
+#    next one is rejected IMMEDIATELY (HTTP 503 + Retry-After), so the client
+#    can retry elsewhere instead of waiting in a hopeless line.
+# 2. Every admitted request carries a deadline. Work for a request whose
+#    deadline has passed is skipped (before decoding, and again right before
+#    inference in the MicroBatcher).
+# 3. Rejections and expirations are counted in '/metrics', so capacity can be
+#    planned from real numbers.
+# -----------------------------------------------------------------------------
+
+METRICS = get_serving_metrics()
+
+
+class Overloaded(Exception):
+    """
+    WHAT: Raised when a request is rejected because the server is at capacity.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(f"server overloaded ({reason})")
+        self.reason = reason
+
+
+class DeadlineExceeded(Exception):
+    """
+    WHAT: Raised when a request's deadline passes before its prediction is done.
+    """
+
+    def __init__(self, stage: str):
+        super().__init__(f"request deadline exceeded ({stage})")
+        self.stage = stage
+
+
+def time_left(deadline: Optional[float]) -> Optional[float]:
+    """
+    WHAT: Seconds until the deadline (negative once it has passed), or None.
+    """
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(deadline: Optional[float], stage: str):
+    """
+    WHAT: Raises DeadlineExceeded (and counts it) if the deadline has passed.
+    """
+    if deadline is not None and time.monotonic() >= deadline:
+        record_expired(stage)
+        raise DeadlineExceeded(stage)
+
+
+def record_expired(stage: str):
+    METRICS.counter("deadline_expired_total",
+                    "Requests dropped because their deadline passed, by stage",
+                    stage=stage).inc()
+
+
+def record_rejected(reason: str):
+    METRICS.counter("rejected_total",
+                    "Requests rejected by admission control, by reason",
+                    reason=reason).inc()
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = 32):
+        """
+        WHAT: Limits how many prediction requests are worked on at the same time.
+
+        ARGS:
+        - max_in_flight: Requests admitted at once (0 = no limit).
+        """
+        self.max_in_flight = max(0, int(max_in_flight))
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+
+        METRICS.gauge("admission_in_flight", lambda: self.in_flight,
+                      "Prediction requests currently admitted")
+        METRICS.gauge("admission_max_in_flight", lambda: self.max_in_flight,
+                      "Admission limit (0 = unlimited)")
+
+    @contextmanager
+    def admit(self):
+        """
+        WHAT: Holds one admission slot for the 'with' block.
+
+        HOW:
+        - A plain counter under a lock (no waiting): either there is a free
+          slot right now, or we raise Overloaded right now.
+        """
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                rejected = True
+            else:
+                self.in_flight += 1
+                self.admitted += 1
+                rejected = False
+        if rejected:
+            record_rejected("in_flight")
+            raise Overloaded("too many requests in flight")
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self.in_flight,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
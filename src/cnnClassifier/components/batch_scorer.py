@@ -0,0 +1,289 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import BatchScoringConfig
+from cnnClassifier.pipeline.prediction import PredictionPipeline, CLASS_LABELS
+from cnnClassifier.utils.preprocessing import TARGET_SIZE
+from cnnClassifier.utils.common import save_json
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Batch Scorer" Component (offline, not part of the web app).
+#
+# We re-score archives of hundreds of thousands of CT slices overnight.
+# Calling PredictionPipeline(filename).predict() once per file runs the model
+# on ONE image at a time and keeps the CPU idle while files are read.
+#
+# The Batch Scorer:
+# 1. Streams image paths from a directory tree or a JSONL manifest (never
+#    lists the whole archive in memory).
+# 2. Reads + decodes images on a thread pool, at most a few batches ahead of
+#    the model ("bounded prefetch"), using the SAME preprocessing as serving.
+# 3. Runs fixed-size batches through the model (the last batch is padded, so
+#    the model only ever sees one input shape).
+# 4. Writes results shard by shard (part-00000.jsonl, part-00001.jsonl, ...).
+#    A shard file only appears once it is complete, so an interrupted run
+#    resumes from the first missing shard.
+# -----------------------------------------------------------------------------
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+OUTPUT_FORMATS = ("jsonl", "parquet")
+
+# Keys a manifest line may use for the image path (the first one found wins).
+PATH_KEYS = ("path", "image", "filename", "file")
+
+RUN_FILE = "_run.json"
+SUMMARY_FILE = "summary.json"
+
+
+def iter_records(source: Path) -> Iterator[dict]:
+    """
+    WHAT: Yields one {"path": ..., ...} record per image, in a stable order.
+
+    HOW:
+    - Directory: walks the tree (folders and files sorted by name) and yields
+      every image file.
+    - JSONL manifest: one JSON object per line. The path is read from the
+      first of PATH_KEYS present; relative paths are relative to the manifest.
+      Every other field (e.g. a study ID) is kept and copied to the output.
+    """
+    source = Path(source)
+    if source.is_dir():
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield {"path": os.path.join(root, name)}
+        return
+
+    with open(source) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            key = next((k for k in PATH_KEYS if k in record), None)
+            if key is None:
+                raise ValueError(
+                    f"{source}:{line_number} has none of the path keys {PATH_KEYS}"
+                )
+            path = Path(record.pop(key))
+            if not path.is_absolute():
+                path = source.parent / path
+            yield {"path": str(path), **record}
+
+
+class BatchScorer:
+    def __init__(self, config: BatchScoringConfig, classifier: PredictionPipeline):
+        """
+        WHAT: Initializes the scorer.
+
+        ARGS:
+        - config: The 'batch_scoring' section of config.yaml.
+        - classifier: The PredictionPipeline whose model + preprocessing we use.
+        """
+        if config.output_format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"output_format must be one of {OUTPUT_FORMATS}, got '{config.output_format}'"
+            )
+        self.config = config
+        self.classifier = classifier
+        self.batch_size = max(1, config.batch_size)
+        self.shard_size = max(self.batch_size, config.shard_size)
+
+    def run(self, source: Path, output_dir: Path = None, overwrite: bool = False) -> dict:
+        """
+        WHAT: Scores every image in 'source' and writes the results to 'output_dir'.
+
+        HOW:
+        1. Check (or create) '_run.json' so we never resume with different settings.
+        2. Cut the record stream into shards of 'shard_size' images.
+        3. Skip shards whose output file already exists, score the others.
+        4. Save a 'summary.json' with counts and throughput.
+
+        Returns:
+            dict: The summary.
+        """
+        source = Path(source).resolve()
+        output_dir = Path(output_dir or self.config.root_dir)
+        model_version = self.classifier.registry.get().version
+        self._prepare_output(output_dir, source, model_version, overwrite)
+
+        started = time.perf_counter()
+        totals = {"shards": 0, "skipped_shards": 0, "images": 0, "errors": 0}
+        with ThreadPoolExecutor(max_workers=max(1, self.config.decode_workers)) as pool:
+            records = iter_records(source)
+            shard_index = 0
+            while True:
+                shard = list(islice(records, self.shard_size))
+                if not shard:
+                    break
+                shard_path = output_dir / f"part-{shard_index:05d}.{self.config.output_format}"
+                if shard_path.exists():
+                    totals["skipped_shards"] += 1
+                else:
+                    shard_started = time.perf_counter()
+                    rows = self._score(pool, shard, model_version)
+                    errors = self._write_shard(shard_path, rows)
+                    totals["errors"] += errors
+                    totals["images"] += len(shard)
+                    elapsed = time.perf_counter() - shard_started
+                    logger.info(
+                        f"Wrote {shard_path.name}: {len(shard)} images ({errors} errors) "
+                        f"in {elapsed:.1f}s ({len(shard) / elapsed:.1f} images/s)"
+                    )
+                totals["shards"] += 1
+                shard_index += 1
+
+        seconds = time.perf_counter() - started
+        summary = {
+            **totals,
+            "source": str(source),
+            "model_version": model_version,
+            "seconds": round(seconds, 3),
+            "images_per_second": (totals["images"] / seconds) if seconds else 0.0,
+        }
+        save_json(path=output_dir / SUMMARY_FILE, data=summary)
+        return summary
+
+    def _prepare_output(self, output_dir: Path, source: Path, model_version: str, overwrite: bool):
+        """
+        WHAT: Makes sure resuming into 'output_dir' is safe.
+
+        WHY:
+        - Shards are identified only by their number. If the source, shard size,
+          format or model changed, shard 7 of the old run is NOT shard 7 of this
+          one, so mixing them would silently give wrong results.
+
+        'overwrite' deletes only the scorer's own files (shards, '_run.json',
+        'summary.json'): anything else in 'output_dir' is left alone.
+        """
+        run = {
+            "source": str(source),
+            "shard_size": self.shard_size,
+            "output_format": self.config.output_format,
+            "model_version": model_version,
+        }
+        run_path = output_dir / RUN_FILE
+        if overwrite and output_dir.exists():
+            for path in [*output_dir.glob("part-*"), run_path, output_dir / SUMMARY_FILE]:
+                if path.is_file():
+                    path.unlink()
+        if run_path.exists():
+            with open(run_path) as f:
+                previous = json.load(f)
+            if previous != run:
+                raise ValueError(
+                    f"{output_dir} holds a run with different settings ({previous}). "
+                    f"Use another output directory or --overwrite."
+                )
+            logger.info(f"Resuming batch scoring in {output_dir}")
+            return
+        os.makedirs(output_dir, exist_ok=True)
+        save_json(path=run_path, data=run)
+
+    def _load(self, path: str):
+        """
+        WHAT: Reads and decodes one image (runs on the thread pool).
+        Returns the uint8 pixels, or the exception if the file is unreadable.
+        """
+        try:
+            with open(path, "rb") as f:
+                return self.classifier.decode_pixels(f.read())
+        except Exception as e:
+            return e
+
+    def _decoded(self, pool: ThreadPoolExecutor, records: list) -> Iterator[tuple]:
+        """
+        WHAT: Yields (record, pixels_or_error) in order, decoding ahead of the caller.
+
+        WHY bounded:
+        - At most 'batch_size * prefetch_batches' images are in flight, so the
+          decoders stay ahead of the model without piling up decoded images.
+        """
+        limit = self.batch_size * max(1, self.config.prefetch_batches)
+        window = deque()
+        for record in records:
+            window.append((record, pool.submit(self._load, record["path"])))
+            if len(window) >= limit:
+                record, future = window.popleft()
+                yield record, future.result()
+        while window:
+            record, future = window.popleft()
+            yield record, future.result()
+
+    def _score(self, pool: ThreadPoolExecutor, records: list, model_version: str) -> Iterator[dict]:
+        """
+        WHAT: Yields one output row per record, in input order.
+
+        HOW:
+        1. Take the next 'batch_size' decoded images.
+        2. Pad the batch with black images up to 'batch_size' (one input shape
+           for the whole run), predict, and keep only the real rows.
+        3. Undecodable images get an "error" row instead.
+        """
+        pending = []
+        for item in self._decoded(pool, records):
+            pending.append(item)
+            if len(pending) == self.batch_size:
+                yield from self._predict_pending(pending, model_version)
+                pending = []
+        if pending:
+            yield from self._predict_pending(pending, model_version)
+
+    def _predict_pending(self, pending: list, model_version: str) -> list:
+        valid = [pixels for _, pixels in pending if not isinstance(pixels, Exception)]
+        probabilities = np.empty((0, len(CLASS_LABELS)), dtype=np.float32)
+        if valid:
+            batch = np.zeros((self.batch_size, *TARGET_SIZE[::-1], 3), dtype=np.uint8)
+            batch[:len(valid)] = np.stack(valid)
+            probabilities = self.classifier.predict_batch(self.classifier.normalize(batch))[:len(valid)]
+        labels = self.classifier.labels_for(probabilities).tolist()
+
+        rows = []
+        predictions = iter(zip(labels, probabilities.tolist()))
+        for record, pixels in pending:
+            if isinstance(pixels, Exception):
+                rows.append({**record, "error": f"could not decode image: {pixels}"})
+                continue
+            label, row = next(predictions)
+            rows.append({
+                **record,
+                "prediction": label,
+                "probabilities": dict(zip(CLASS_LABELS.tolist(), row)),
+                "model_version": model_version,
+            })
+        return rows
+
+    def _write_shard(self, shard_path: Path, rows: Iterator[dict]) -> int:
+        """
+        WHAT: Writes one shard to a temp file, then renames it into place.
+
+        WHY the rename:
+        - os.replace() is atomic, so a shard file either exists complete or not
+          at all. That is what makes "resume from the last completed shard" safe.
+
+        Returns:
+            int: Number of error rows in the shard.
+        """
+        tmp_path = shard_path.with_name(shard_path.name + ".tmp")
+        errors = 0
+        if self.config.output_format == "jsonl":
+            with open(tmp_path, "w") as f:
+                for row in rows:
+                    errors += "error" in row
+                    f.write(json.dumps(row) + "\n")
+        else:
+            import pandas as pd  # Parquet needs pyarrow (or fastparquet) installed
+            rows = list(rows)
+            errors = sum("error" in row for row in rows)
+            pd.DataFrame(rows).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, shard_path)
+        return errors
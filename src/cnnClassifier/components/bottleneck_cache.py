@@ -0,0 +1,231 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+from pathlib import Path
+import numpy as np
+import tensorflow as tf
+from cnnClassifier import logger
+from cnnClassifier.utils.common import get_size
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Bottleneck Cache" used by Training (BOTTLENECK_CACHE in params.yaml).
+#
+# PrepareBaseModel freezes the whole VGG16, so training only changes the small
+# Flatten -> Dense "head". Yet every epoch pushed every image through the
+# 14.7M frozen VGG16 weights again - and their output never changes.
+#
+# So we split the model in two:
+# - backbone: the frozen layers (image -> 7x7x512 "bottleneck features").
+# - head: the trainable layers on top (features -> class probabilities).
+# We run the backbone ONCE per image, keep the features in memory-mapped
+# .npy files, and train the head on them: an epoch becomes a few matrix
+# multiplications instead of a full VGG16 pass.
+#
+# With augmentation, every epoch sees a NEW random version of each image, so
+# its features can't be reused. AUGMENTED_VIEWS > 0 instead precomputes that
+# many fixed augmented versions of every training image.
+#
+# The cache folder is named after a hash of the backbone weights, the images
+# (manifest SHA-256s + split), IMAGE_SIZE and AUGMENTED_VIEWS.
+# -----------------------------------------------------------------------------
+
+# Bump when the cache layout changes (invalidates all caches).
+CACHE_VERSION = 1
+
+# Layers without weights that belong to the head if they sit right below it
+# (we want to cache the 7x7x512 map, not its flattened copy).
+RESHAPE_LAYERS = (tf.keras.layers.Flatten, tf.keras.layers.Reshape)
+
+
+def split_frozen_backbone(model: tf.keras.Model):
+    """
+    WHAT: Splits 'model' into (backbone, head), or returns None if it can't.
+
+    HOW:
+    1. The head starts at the first layer with trainable weights (for our
+       model: the Dense layer), plus the Flatten right below it.
+    2. Everything under that must be frozen - that is the backbone.
+    3. The head is rebuilt on a new Input by calling its layers in order.
+       The layers are SHARED with 'model', so training the head trains
+       'model' too.
+
+    Returns None if nothing is trainable, everything is, or a trainable
+    layer hides inside the backbone (e.g. a partly unfrozen VGG16).
+    """
+    layers = model.layers
+    first_trainable = next((i for i, layer in enumerate(layers) if layer.trainable_weights), None)
+    if not first_trainable:
+        return None
+    start = first_trainable
+    while start > 1 and isinstance(layers[start - 1], RESHAPE_LAYERS):
+        start -= 1
+    if any(layer.trainable_weights for layer in layers[:start]):
+        return None
+
+    backbone = tf.keras.Model(model.input, layers[start - 1].output, name="backbone")
+    features = tf.keras.Input(shape=backbone.output.shape[1:], name="bottleneck_features")
+    x = features
+    for layer in layers[start:]:
+        x = layer(x)
+    head = tf.keras.Model(features, x, name="head")
+    return backbone, head
+
+
+def cache_key(backbone: tf.keras.Model, rows: list, image_size: list, augmented_views: int) -> str:
+    """
+    WHAT: A hash of everything the cached features depend on.
+    """
+    digest = hashlib.sha256(json.dumps({
+        "version": CACHE_VERSION,
+        "image_size": list(image_size),
+        "augmented_views": augmented_views,
+    }).encode())
+    for weight in backbone.weights:
+        digest.update(np.ascontiguousarray(weight.numpy()).tobytes())
+    for row in rows:
+        digest.update(f"{row['path']}\0{row['sha256']}\0{row['split']}\n".encode())
+    return digest.hexdigest()
+
+
+def _batches(generator):
+    """
+    WHAT: Iterates ONE pass of (images, labels) over a Keras iterator/Sequence
+    or a (finite) tf.data.Dataset.
+    """
+    if isinstance(generator, tf.data.Dataset):
+        for images, labels in generator:
+            yield images.numpy(), labels.numpy()
+    else:
+        for index in range(len(generator)):
+            yield generator[index]
+
+
+class FeatureSequence(tf.keras.utils.Sequence):
+    """
+    WHAT: Batches of (features, one-hot labels) from the memory-mapped cache.
+    """
+
+    def __init__(self, features: np.ndarray, labels: np.ndarray, batch_size: int, shuffle: bool,
+                 seed: int = None):
+        super().__init__()
+        self.features = features
+        self.labels = labels
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.samples = len(labels)
+        self._order = np.arange(self.samples)
+        self.on_epoch_end()
+
+    def __len__(self):
+        return math.ceil(self.samples / self.batch_size)
+
+    def __getitem__(self, batch_index):
+        rows = np.sort(self._order[batch_index * self.batch_size:(batch_index + 1) * self.batch_size])
+        return np.asarray(self.features[rows]), self.labels[rows]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self._order)
+
+
+class BottleneckCache:
+    def __init__(self, root_dir: Path, backbone: tf.keras.Model, num_classes: int,
+                 shared: bool = False):
+        """
+        WHAT: Initializes the cache.
+
+        ARGS:
+        - root_dir: Where cache folders live (one per key).
+        - backbone: The frozen part of the model (see split_frozen_backbone()).
+        - num_classes: Width of the one-hot labels.
+        - shared: Other processes (sweep trials) may be reading other keys'
+          folders right now: never delete them.
+        """
+        self.root_dir = Path(root_dir)
+        self.backbone = backbone
+        self.num_classes = num_classes
+        self.shared = shared
+
+    def load_or_build(self, key: str, splits: dict) -> dict:
+        """
+        WHAT: Returns {split: (features, labels)}, computing the features once.
+
+        ARGS:
+        - splits: {name: (generator, samples, passes)} - the (unshuffled)
+          batches of each split, its number of images, and how many passes
+          to run over it (AUGMENTED_VIEWS for augmented training data, 1 otherwise).
+
+        HOW:
+        - If 'root_dir/<key>' exists, its .npy files are opened memory-mapped.
+        - Otherwise every batch goes through the backbone once and the
+          features are written straight into memory-mapped .npy files in a
+          temporary folder (one per process), which is renamed into place
+          when complete.
+        - Several processes may build the same cache at once: the first
+          rename wins, the others drop their copy.
+        - The folders of other keys are deleted after a build, unless the
+          cache is 'shared'.
+        """
+        cache_dir = self.root_dir / key[:16]
+        if not cache_dir.exists():
+            started = time.perf_counter()
+            tmp_dir = self.root_dir / f"{key[:16]}.tmp-{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for name, (generator, samples, passes) in splits.items():
+                self._extract(tmp_dir, name, generator, samples, passes)
+            try:
+                os.rename(tmp_dir, cache_dir)
+            except OSError:
+                if not cache_dir.exists():
+                    raise
+                shutil.rmtree(tmp_dir, ignore_errors=True)   # another process was faster
+            if not self.shared:
+                for old in self.root_dir.iterdir():
+                    # Other processes' ".tmp-<pid>" folders may still be in use.
+                    if old.is_dir() and old != cache_dir and ".tmp-" not in old.name:
+                        shutil.rmtree(old, ignore_errors=True)
+            logger.info(
+                f"Built bottleneck cache {cache_dir} in {time.perf_counter() - started:.1f}s"
+            )
+        else:
+            logger.info(f"Bottleneck cache {cache_dir} is up to date")
+
+        return {
+            name: (
+                np.load(cache_dir / f"{name}_features.npy", mmap_mode="r"),
+                np.load(cache_dir / f"{name}_labels.npy"),
+            )
+            for name in splits
+        }
+
+    def _extract(self, cache_dir: Path, name: str, generator, samples: int, passes: int):
+        """
+        WHAT: Runs 'passes' passes of 'generator' through the backbone into '<name>_features.npy'.
+        """
+        features = np.lib.format.open_memmap(
+            cache_dir / f"{name}_features.npy", mode="w+", dtype=np.float32,
+            shape=(samples * passes, *self.backbone.output.shape[1:]),
+        )
+        labels = np.zeros((samples * passes, self.num_classes), dtype=np.float32)
+        # A plain compiled forward pass: under a multi-worker strategy,
+        # predict_on_batch() would gather the outputs of ALL workers.
+        predict = tf.function(lambda images: self.backbone(images, training=False))
+        row = 0
+        for _ in range(passes):
+            for images, batch_labels in _batches(generator):
+                features[row:row + len(images)] = predict(images).numpy()
+                labels[row:row + len(images)] = batch_labels
+                row += len(images)
+        features.flush()
+        del features
+        np.save(cache_dir / f"{name}_labels.npy", labels)
+        logger.info(
+            f"Cached {row} {name} bottleneck features "
+            f"({get_size(cache_dir / f'{name}_features.npy')})"
+        )
@@ -1,8 +1,15 @@
 import os
+import json
+import shutil
+import threading
+import time
 import zipfile
-import gdown
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from cnnClassifier import logger
-from cnnClassifier.utils.common import get_size
+from cnnClassifier.utils.common import get_size, save_json, file_sha256
+from cnnClassifier.components.download_sources import source_for
 from cnnClassifier.entity.config_entity import DataIngestionConfig
 
 # -----------------------------------------------------------------------------
@@ -30,59 +37,217 @@ class DataIngestion:
 
     
      
-    def download_file(self) -> str:
+    def download_file(self):
         '''
-        WHAT: Downloads the dataset from Google Drive.
-        
-        WHY: 
-        - Our data is hosted on Google Drive. 
-        - Standard 'requests' library often fails with large Drive files due to 
-          virus scan warnings.
-        - We use 'gdown', a specialized library that handles Google Drive downloads reliably.
-        
+        WHAT: Downloads the dataset zip, unless we already have exactly that file.
+
+        WHY:
+        - Re-downloading the same zip on every run of main.py wasted minutes.
+        - A half-finished download must never be mistaken for the dataset.
+
         HOW:
-        1. Gets the URL from config.
-        2. Extracts the unique 'file_id' from the Google Drive URL.
-        3. Constructs a special download link.
-        4. Uses gdown.download to save the file.
+        1. If the local zip is already up to date (see is_up_to_date()), stop here.
+        2. Pick the source from the URL (Google Drive, HTTP(S) or file://, see
+           download_sources.py) and download into 'data.zip.part', resuming
+           where a previous attempt stopped.
+        3. Check its SHA-256 against 'source_sha256' in config.yaml (if pinned;
+           if not, a warning shows the hash to pin).
+        4. Only then rename it to 'data.zip' and remember what we downloaded.
+
+        NOTE: 'data.zip' and 'data.zip.json' live in artifacts/data_ingestion,
+        an output of the DVC stage, which DVC deletes before it reruns the
+        stage. So the skip (and the resume) work for 'python main.py', but
+        'dvc repro' downloads the zip again.
         '''
+        dataset_url = self.config.source_URL
+        zip_download_dir = Path(self.config.local_data_file)
+        os.makedirs(zip_download_dir.parent, exist_ok=True)
 
-        try: 
-            dataset_url = self.config.source_URL
-            zip_download_dir = self.config.local_data_file
-            os.makedirs("artifacts/data_ingestion", exist_ok=True)
-            logger.info(f"Downloading data from {dataset_url} into file {zip_download_dir}")
-
-            # Google Drive URLs look like: https://drive.google.com/file/d/FILE_ID/view
-            # We split the URL by '/' and take the second to last part to get the ID.
-            file_id = dataset_url.split("/")[-2]
-            
-            # This is the prefix for direct download links
-            prefix = 'https://drive.google.com/uc?/export=download&id='
-            
-            # Download the file
-            gdown.download(prefix+file_id, zip_download_dir)
-
-            logger.info(f"Downloaded data from {dataset_url} into file {zip_download_dir}")
-
-        except Exception as e:
-            raise e
-        
-    
-    def extract_zip_file(self):
+        if self.is_up_to_date():
+            logger.info(f"{zip_download_dir} is up to date, skipping the download")
+            return
+
+        part_path = zip_download_dir.with_name(zip_download_dir.name + ".part")
+        logger.info(f"Downloading data from {dataset_url} into file {zip_download_dir}")
+        source = source_for(dataset_url, retries=self.config.download_retries)
+        source.fetch(dataset_url, part_path)
+
+        sha256 = file_sha256(part_path)
+        expected = self.config.source_sha256
+        if expected and sha256 != expected.lower():
+            source.discard(part_path)
+            raise ValueError(
+                f"Checksum mismatch for {dataset_url}: expected {expected}, got {sha256}"
+            )
+        if not expected:
+            logger.warning(
+                f"source_sha256 is not pinned in config.yaml: the download of {dataset_url} "
+                f"is not verified. Pin it with 'source_sha256: {sha256}'"
+            )
+        os.replace(part_path, zip_download_dir)
+        source.discard(part_path)   # the record of the partial download
+        self._save_state(sha256)
+        logger.info(f"Downloaded data from {dataset_url} into file {zip_download_dir} "
+                    f"({get_size(zip_download_dir)}, sha256 {sha256})")
+
+    def _state_path(self) -> Path:
+        return Path(str(self.config.local_data_file) + ".json")
+
+    def _save_state(self, sha256: str):
+        """
+        WHAT: Remembers which URL/hash the local zip came from, and its (mtime, size).
+        """
+        stat = os.stat(self.config.local_data_file)
+        save_json(path=self._state_path(), data={
+            "source_URL": self.config.source_URL,
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        })
+
+    def is_up_to_date(self) -> bool:
+        """
+        WHAT: Is the local zip exactly the dataset config.yaml asks for?
+
+        HOW:
+        1. No local zip -> no.
+        2. Find its SHA-256. If the zip is unchanged (same size and mtime) since
+           we downloaded it, we reuse the hash we saved then. Otherwise we hash it.
+        3. With a pinned 'source_sha256': up to date if the hashes match.
+           Without one: up to date if it came from the same 'source_URL' and
+           was not modified since.
         """
-        WHAT: Unzips the downloaded file.
+        local_path = Path(self.config.local_data_file)
+        if not local_path.exists():
+            return False
+
+        state = {}
+        if self._state_path().exists():
+            with open(self._state_path()) as f:
+                state = json.load(f)
+        stat = os.stat(local_path)
+        unchanged = (state.get("size") == stat.st_size and state.get("mtime_ns") == stat.st_mtime_ns)
+
+        expected = self.config.source_sha256
+        if expected:
+            sha256 = state["sha256"] if unchanged else file_sha256(local_path)
+            if sha256 != expected.lower():
+                logger.info(f"{local_path} does not match the pinned sha256, downloading again")
+                return False
+            if not unchanged:
+                self._save_state(sha256)
+            return True
+
+        return unchanged and state.get("source_URL") == self.config.source_URL
+
+    def extract_zip_file(self) -> dict:
+        """
+        WHAT: Unzips the downloaded file, skipping files that are already there.
         
         WHY: 
         - We downloaded a .zip file to save space/bandwidth.
         - Our model needs the actual image files (jpg/png), not a zip file.
-        - This function extracts everything into the 'unzip_dir'.
+        - 'extractall' used ONE thread and rewrote every image on every run,
+          even when nothing had changed.
         
         HOW:
-        - Uses Python's built-in 'zipfile' library.
-        - 'extractall' pulls every file out of the zip.
+        1. Members are spread over 'extract_workers' threads (zlib and file
+           writes release the GIL, so threads really run in parallel here).
+        2. A member whose file on disk already has the same size and CRC-32
+           (the checksum stored in the zip) is skipped.
+        3. Every file is written to '<name>.tmp' and then renamed into place,
+           so an interrupted run never leaves a half-written image behind.
+        4. Logs (and returns) files/sec and bytes/sec.
+
+        Returns:
+            dict: Extraction stats (files written/skipped, bytes, speed).
         """
-        unzip_path = self.config.unzip_dir
+        unzip_path = Path(self.config.unzip_dir)
         os.makedirs(unzip_path, exist_ok=True)
+        started = time.perf_counter()
+        local = threading.local()
+        handles = []
+        lock = threading.Lock()
+
+        def extract(member: zipfile.ZipInfo) -> bool:
+            # ZipFile objects are not safe to read from several threads at
+            # once, so every worker opens its own handle.
+            zip_ref = getattr(local, "zip_ref", None)
+            if zip_ref is None:
+                zip_ref = local.zip_ref = zipfile.ZipFile(self.config.local_data_file, 'r')
+                with lock:
+                    handles.append(zip_ref)
+            return _extract_member(zip_ref, member, unzip_path)
+
         with zipfile.ZipFile(self.config.local_data_file, 'r') as zip_ref:
-            zip_ref.extractall(unzip_path)
+            members = zip_ref.infolist()
+        files = [member for member in members if not member.is_dir()]
+        for member in members:
+            if member.is_dir():
+                os.makedirs(_target_path(unzip_path, member), exist_ok=True)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.config.extract_workers)) as pool:
+                written = list(pool.map(extract, files))
+        finally:
+            for handle in handles:
+                handle.close()
+
+        seconds = time.perf_counter() - started
+        bytes_written = sum(member.file_size for member, wrote in zip(files, written) if wrote)
+        total_bytes = sum(member.file_size for member in files)
+        stats = {
+            "files": len(files),
+            "written": sum(written),
+            "skipped": len(files) - sum(written),
+            "bytes_written": bytes_written,
+            "seconds": round(seconds, 3),
+            "files_per_second": len(files) / seconds if seconds else 0.0,
+            "bytes_per_second": total_bytes / seconds if seconds else 0.0,
+        }
+        logger.info(
+            f"Extracted {self.config.local_data_file} into {unzip_path}: "
+            f"{stats['written']} written, {stats['skipped']} unchanged, in {seconds:.2f}s "
+            f"({stats['files_per_second']:.0f} files/s, "
+            f"{stats['bytes_per_second'] / 1024 / 1024:.1f} MB/s)"
+        )
+        return stats
+
+
+def _target_path(unzip_path: Path, member: zipfile.ZipInfo) -> Path:
+    """
+    WHAT: Where 'member' goes on disk.
+
+    WHY:
+    - A name like '../../etc/passwd' or '/etc/passwd' must never escape
+      'unzip_path'. Like ZipFile.extractall(), we drop absolute prefixes and
+      '..' parts.
+    """
+    parts = [part for part in member.filename.replace("\\", "/").split("/")
+             if part not in ("", ".", "..")]
+    return unzip_path.joinpath(*parts)
+
+
+def _crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _extract_member(zip_ref: zipfile.ZipFile, member: zipfile.ZipInfo, unzip_path: Path) -> bool:
+    """
+    WHAT: Extracts one file. Returns False if it was already up to date.
+    """
+    target = _target_path(unzip_path, member)
+    if target.is_file() and target.stat().st_size == member.file_size \
+            and _crc32(target) == member.CRC:
+        return False
+
+    os.makedirs(target.parent, exist_ok=True)
+    tmp_path = target.with_name(target.name + ".tmp")
+    with zip_ref.open(member) as src, open(tmp_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(tmp_path, target)
+    return True
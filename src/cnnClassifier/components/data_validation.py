@@ -0,0 +1,178 @@
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import DataValidationConfig
+from cnnClassifier.components.dataset_manifest import list_class_images
+from cnnClassifier.utils.common import file_sha256, save_json
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Data Validation" Component (runs right after the zip is extracted).
+#
+# One truncated or fake .jpg in the dataset used to crash (or stall) Training
+# halfway through an epoch - after minutes of work. This component finds such
+# files BEFORE anything else reads them:
+# 1. Fully decodes every image (header AND pixel data) on a process pool, and
+#    checks its mode (RGB, grayscale, ...) and size.
+# 2. Moves every bad file to a quarantine folder (outside the dataset, so it
+#    can't become a "class") and writes a report of what was wrong.
+# 3. Remembers the verdict per file CONTENT (SHA-256), so an unchanged image
+#    is never decoded again on the next run.
+# -----------------------------------------------------------------------------
+
+# Bump when check_image() changes, so old verdicts are not trusted any more.
+RULES_VERSION = 1
+
+
+def check_image(path: str, min_image_size: int, allowed_modes: tuple) -> dict:
+    """
+    WHAT: Checks one image file. Runs in a worker process.
+
+    HOW:
+    1. Image.verify(): checks the file structure without decoding pixels.
+    2. Re-open and load(): decodes ALL the pixel data (verify() does not, so
+       a truncated JPEG only fails here).
+    3. Checks the mode and that both sides are at least 'min_image_size'.
+    Decompression-bomb warnings (absurdly large images) count as errors.
+
+    Returns:
+        dict: {"ok": bool, "reason": str or None, "mode": ..., "width": ..., "height": ...}
+    """
+    result = {"ok": False, "reason": None, "mode": None, "width": None, "height": None}
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(path) as img:
+                img.verify()
+            with Image.open(path) as img:
+                img.load()
+                result.update(mode=img.mode, width=img.width, height=img.height)
+    except Exception as e:
+        result["reason"] = f"could not decode: {type(e).__name__}: {e}"
+        return result
+
+    if result["mode"] not in allowed_modes:
+        result["reason"] = f"unsupported mode {result['mode']}"
+    elif min(result["width"], result["height"]) < min_image_size:
+        result["reason"] = f"too small ({result['width']}x{result['height']})"
+    else:
+        result["ok"] = True
+    return result
+
+
+class DataValidation:
+    def __init__(self, config: DataValidationConfig):
+        """
+        WHAT: Initializes the Data Validation component.
+
+        ARGS:
+        - config: The dataset folder, where to put bad files and the report,
+          where the verdict cache lives, and the rules (modes, minimum size).
+        """
+        self.config = config
+
+    def _rules(self) -> dict:
+        return {
+            "version": RULES_VERSION,
+            "min_image_size": self.config.min_image_size,
+            "allowed_modes": sorted(self.config.allowed_modes),
+        }
+
+    def _load_cache(self) -> dict:
+        """
+        WHAT: The saved verdicts ({sha256: result}), or {} if the rules changed.
+        """
+        cache_path = Path(self.config.cache_path)
+        if not cache_path.exists():
+            return {}
+        with open(cache_path) as f:
+            cache = json.load(f)
+        if cache.get("rules") != self._rules():
+            logger.info("Validation rules changed, re-checking every image")
+            return {}
+        return cache.get("results", {})
+
+    def validate(self) -> dict:
+        """
+        WHAT: Validates every image of the dataset and quarantines the bad ones.
+
+        HOW:
+        1. List the images (one folder per class) and hash them (thread pool).
+        2. Images whose hash has a saved verdict are not decoded again.
+        3. The rest are checked on a process pool (decoding is CPU work, and
+           processes are not held back by the GIL).
+        4. Bad files are moved to 'quarantine_dir' (keeping their relative
+           path), the verdicts and a report are saved.
+
+        Returns:
+            dict: The report (counts + one entry per quarantined file).
+        """
+        started = time.perf_counter()
+        data_dir = Path(self.config.data_dir)
+        _, samples = list_class_images(data_dir)
+        paths = [path for path, _ in samples]
+        workers = max(1, self.config.workers)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashes = list(pool.map(file_sha256, paths))
+
+        cache = self._load_cache()
+        todo = [(path, sha256) for path, sha256 in zip(paths, hashes) if sha256 not in cache]
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(
+                    check_image,
+                    [path for path, _ in todo],
+                    [self.config.min_image_size] * len(todo),
+                    [tuple(self.config.allowed_modes)] * len(todo),
+                    chunksize=max(1, len(todo) // (workers * 4)),
+                )
+                for (_, sha256), result in zip(todo, results):
+                    cache[sha256] = result
+
+        quarantined = []
+        for path, sha256 in zip(paths, hashes):
+            result = cache[sha256]
+            if result["ok"]:
+                continue
+            relative = Path(path).relative_to(data_dir)
+            target = Path(self.config.quarantine_dir) / relative
+            os.makedirs(target.parent, exist_ok=True)
+            os.replace(path, target)
+            quarantined.append({
+                "path": relative.as_posix(),
+                "sha256": sha256,
+                "reason": result["reason"],
+                "quarantined_to": target.as_posix(),
+            })
+            logger.warning(f"Quarantined {relative}: {result['reason']}")
+
+        # Keep only verdicts of files we still have (the cache must not grow forever).
+        seen = set(hashes)
+        save_json(path=Path(self.config.cache_path), data={
+            "rules": self._rules(),
+            "results": {sha256: result for sha256, result in cache.items() if sha256 in seen},
+        })
+
+        seconds = time.perf_counter() - started
+        report = {
+            "images": len(paths),
+            "checked": len(todo),
+            "cached": len(paths) - len(todo),
+            "valid": len(paths) - len(quarantined),
+            "quarantined": len(quarantined),
+            "seconds": round(seconds, 3),
+            "files": quarantined,
+        }
+        save_json(path=Path(self.config.report_path), data=report)
+        logger.info(
+            f"Validated {len(paths)} images in {seconds:.1f}s "
+            f"({len(todo)} decoded, {report['cached']} from cache): "
+            f"{len(quarantined)} quarantined to {self.config.quarantine_dir}"
+        )
+        return report
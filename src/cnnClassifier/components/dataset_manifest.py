@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import DatasetManifestConfig
+from cnnClassifier.utils.common import file_sha256
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Dataset Manifest" Component (runs at the end of Data Ingestion).
+#
+# Training used validation_split=0.20 and Evaluation validation_split=0.30,
+# each re-scanning 'artifacts/data_ingestion' on every run. So the "validation"
+# images Evaluation scored were partly images the model had trained on.
+#
+# The manifest fixes that by deciding the split ONCE:
+# 1. Lists every image (one folder per class) with its size and SHA-256.
+# 2. Assigns each image to "training" or "validation": stratified (every
+#    class gets the same VALIDATION_SPLIT fraction) and seeded (SPLIT_SEED).
+# 3. Writes 'manifest.jsonl', one image per line:
+#    {"path": ..., "class": ..., "size": ..., "sha256": ..., "split": ...}
+#
+# Training, Evaluation and Model Export read that ONE file instead of scanning
+# folders, so they all agree on which image is which. Paths are relative to
+# the manifest, so the Batch Scorer can read it directly too.
+# -----------------------------------------------------------------------------
+
+SPLITS = ("training", "validation")
+
+# The image types flow_from_directory() picks up.
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm", ".tif", ".tiff")
+
+
+def list_class_images(data_dir: Path) -> tuple:
+    """
+    WHAT: Lists every image of a "one folder per class" dataset, in the exact
+    order flow_from_directory() uses.
+
+    HOW:
+    - Classes are the sub-folders, sorted alphabetically (class index = position).
+    - Inside a class, folders are visited in sorted order and files are sorted by name.
+    - Files directly in 'data_dir' (like data.zip) are not images of any class.
+
+    Returns:
+        tuple: (class_names, [(path, class_index), ...])
+    """
+    data_dir = Path(data_dir)
+    classes = sorted(d.name for d in data_dir.iterdir() if d.is_dir())
+    samples = []
+    for class_index, class_name in enumerate(classes):
+        for root, _, files in sorted(os.walk(data_dir / class_name), key=lambda x: x[0]):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    samples.append((os.path.join(root, name), class_index))
+    return classes, samples
+
+
+class Manifest:
+    """
+    WHAT: A manifest loaded from 'manifest.jsonl'.
+
+    ATTRIBUTES:
+    - rows: One dict per image, in manifest order (class, then path).
+    - classes / class_indices: Class names, as flow_from_directory() reports them.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(
+                f"No dataset manifest at {self.path}. Run the Data Ingestion stage first."
+            )
+        with open(self.path) as f:
+            self.rows = [json.loads(line) for line in f if line.strip()]
+        self.classes = sorted({row["class"] for row in self.rows})
+        self.class_indices = {name: i for i, name in enumerate(self.classes)}
+
+    def subset(self, split: str) -> list:
+        """
+        WHAT: The rows of one split ("training" or "validation").
+        """
+        if split not in SPLITS:
+            raise ValueError(f"split must be one of {SPLITS}, got '{split}'")
+        return [row for row in self.rows if row["split"] == split]
+
+    def filepath(self, row: dict) -> str:
+        """
+        WHAT: The image file of a row (manifest paths are relative to the manifest).
+        """
+        return os.path.normpath(self.path.parent / row["path"])
+
+    def filepaths(self, rows: list) -> list:
+        return [self.filepath(row) for row in rows]
+
+    def labels(self, rows: list) -> list:
+        return [self.class_indices[row["class"]] for row in rows]
+
+
+def load_manifest(path: Path) -> Manifest:
+    return Manifest(path)
+
+
+def _split_rank(seed: int, path: str) -> str:
+    """
+    WHAT: A stable pseudo-random sort key for an image.
+
+    WHY not random.shuffle():
+    - The rank of an image depends only on (seed, path), so adding or removing
+      a few images only moves those images - every other image keeps its split.
+    """
+    return hashlib.sha256(f"{seed}:{path}".encode()).hexdigest()
+
+
+class DatasetManifest:
+    def __init__(self, config: DatasetManifestConfig):
+        """
+        WHAT: Initializes the Dataset Manifest builder.
+
+        ARGS:
+        - config: The data folder, where to write the manifest, and the split
+          settings (VALIDATION_SPLIT / SPLIT_SEED in params.yaml).
+        """
+        if not 0.0 <= config.params_validation_split < 1.0:
+            raise ValueError(
+                f"VALIDATION_SPLIT must be in [0, 1), got {config.params_validation_split}"
+            )
+        self.config = config
+
+    def build(self) -> Path:
+        """
+        WHAT: Writes the manifest of the current data folder and returns its path.
+
+        HOW:
+        1. List the images per class and hash them (on a thread pool).
+        2. Per class: order the images by their seeded rank and send the first
+           round(VALIDATION_SPLIT * n) to "validation", the rest to "training".
+        3. Write the manifest to a temp file and rename it into place.
+        """
+        manifest_path = Path(self.config.manifest_path)
+        os.makedirs(manifest_path.parent, exist_ok=True)
+        classes, samples = list_class_images(self.config.data_dir)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.config.hash_workers)) as pool:
+            hashes = list(pool.map(file_sha256, [path for path, _ in samples]))
+
+        rows = []
+        for (path, class_index), sha256 in zip(samples, hashes):
+            rows.append({
+                "path": Path(os.path.relpath(path, manifest_path.parent)).as_posix(),
+                "class": classes[class_index],
+                "size": os.path.getsize(path),
+                "sha256": sha256,
+                "split": "training",
+            })
+
+        for class_name in classes:
+            members = [row for row in rows if row["class"] == class_name]
+            members.sort(key=lambda row: _split_rank(self.config.params_split_seed, row["path"]))
+            for row in members[:int(round(self.config.params_validation_split * len(members)))]:
+                row["split"] = "validation"
+
+        tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        os.replace(tmp_path, manifest_path)
+
+        counts = Counter((row["class"], row["split"]) for row in rows)
+        logger.info(
+            f"Wrote dataset manifest {manifest_path}: {len(rows)} images, "
+            + ", ".join(f"{c}: {counts[(c, 'training')]} training / {counts[(c, 'validation')]} validation"
+                        for c in classes)
+        )
+        return manifest_path
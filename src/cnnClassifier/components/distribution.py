@@ -0,0 +1,279 @@
+import json
+import os
+import socket
+import subprocess
+import time
+import tensorflow as tf
+from cnnClassifier import logger
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is "Distributed Training" (DISTRIBUTION_STRATEGY in params.yaml).
+#
+# Training used ONE process on ONE machine. Our training boxes are a pool of
+# CPU-only nodes, so this file lets several processes (one per node) train
+# the SAME model together with tf.distribute:
+# - every worker reads its own 1/N of the images (sharding),
+# - computes gradients on them,
+# - and the gradients are averaged over all workers before every update, so
+#   all copies of the model stay identical.
+# One update now covers N times more images (the "global batch"), so the
+# learning rate is scaled by N as well (the linear scaling rule).
+#
+# The cluster is described by the TF_CONFIG environment variable (the
+# standard tf.distribute format). launch_local_workers() starts N workers on
+# localhost with the right TF_CONFIG, to try it out on one machine.
+# -----------------------------------------------------------------------------
+
+# - single: one process, no tf.distribute (the default).
+# - mirrored: one process, the model mirrored over all local devices.
+# - multi_worker: one process per node (TF_CONFIG), gradients all-reduced.
+STRATEGIES = ("single", "mirrored", "multi_worker")
+
+
+def make_strategy(name: str) -> tf.distribute.Strategy:
+    """
+    WHAT: Creates the tf.distribute strategy called 'name'.
+
+    NOTE: Create it before any other TensorFlow work in the process (a
+    multi-worker strategy must set up its cluster first).
+    """
+    if name not in STRATEGIES:
+        raise ValueError(f"DISTRIBUTION_STRATEGY must be one of {STRATEGIES}, got '{name}'")
+    if name == "mirrored":
+        return tf.distribute.MirroredStrategy()
+    if name == "multi_worker":
+        return tf.distribute.MultiWorkerMirroredStrategy()
+    return tf.distribute.get_strategy()
+
+
+def worker_info(strategy: tf.distribute.Strategy) -> tuple:
+    """
+    WHAT: (num_workers, worker_index, is_chief) of this process.
+
+    HOW:
+    - Without a cluster (single / mirrored, or no TF_CONFIG) there is one worker.
+    - The chief is the "chief" task if the cluster has one, otherwise worker 0.
+      Only the chief writes checkpoints and the trained model.
+    """
+    resolver = getattr(strategy, "cluster_resolver", None)
+    if resolver is None or not resolver.cluster_spec().as_dict():
+        return 1, 0, True
+    cluster = resolver.cluster_spec().as_dict()
+    workers = cluster.get("chief", []) + cluster.get("worker", [])
+    index = resolver.task_id + (len(cluster.get("chief", [])) if resolver.task_type == "worker" else 0)
+    is_chief = resolver.task_type == "chief" or (resolver.task_type == "worker" and index == 0)
+    return len(workers), index, is_chief
+
+
+def broadcast_from_chief(strategy: tf.distribute.Strategy, values: list) -> list:
+    """
+    WHAT: The chief's 'values' (a list of tensors) on every worker.
+
+    HOW:
+    - A SUM all-reduce in which only the first replica (on the chief)
+      contributes its values and every other replica contributes zeros.
+    """
+    def replica_fn(values):
+        context = tf.distribute.get_replica_context()
+        first = tf.equal(context.replica_id_in_sync_group, 0)
+        contribution = [tf.where(first, value, tf.zeros_like(value)) for value in values]
+        return context.all_reduce(tf.distribute.ReduceOp.SUM, contribution)
+
+    values = [tf.convert_to_tensor(value) for value in values]
+    results = strategy.run(replica_fn, args=(values,))
+    return [strategy.experimental_local_results(result)[0] for result in results]
+
+
+def broadcast_json(strategy: tf.distribute.Strategy, value):
+    """
+    WHAT: The chief's 'value' (anything JSON can store) on every worker.
+    """
+    encoded = json.dumps(value, default=int).encode()
+    (size,) = broadcast_from_chief(strategy, [tf.constant(len(encoded), tf.int64)])
+    # Every worker needs the same shape: pad (or cut) to the chief's size.
+    encoded = encoded[:int(size)].ljust(int(size), b" ")
+    (data,) = broadcast_from_chief(strategy, [tf.constant(list(encoded), tf.int32)])
+    return json.loads(bytes(data.numpy().astype("uint8").tolist()).decode())
+
+
+def to_dataset(data, repeat: bool = False) -> tf.data.Dataset:
+    """
+    WHAT: A tf.data.Dataset of the batches of 'data' (a Keras Sequence or a Dataset).
+
+    WHY:
+    - The multi-worker loop feeds every worker through tf.distribute, which
+      needs tf.data. Our Sequences (tensor cache, image files, bottleneck
+      features) are wrapped, batch by batch, in a generator.
+    - Automatic sharding is switched off: every worker's data is already its
+      own shard (see split_generator()).
+    - The batches are prefetched across epoch boundaries, so the batch order
+      saved in a checkpoint is only approximately where the stream was: a
+      resumed multi-worker run does not replay the exact same batches.
+    """
+    if isinstance(data, tf.data.Dataset):
+        dataset = data
+    else:
+        images, labels = data[0]
+
+        def batches():
+            for index in range(len(data)):
+                yield data[index]
+            data.on_epoch_end()
+
+        dataset = tf.data.Dataset.from_generator(batches, output_signature=(
+            tf.TensorSpec((None, *images.shape[1:]), tf.float32),
+            tf.TensorSpec((None, *labels.shape[1:]), tf.float32),
+        ))
+    if repeat and dataset.cardinality() != tf.data.INFINITE_CARDINALITY:
+        dataset = dataset.repeat()
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+    return dataset.with_options(options).prefetch(tf.data.AUTOTUNE)
+
+
+def distributed_fit(strategy: tf.distribute.Strategy, model: tf.keras.Model, train_data,
+                    epochs: int, steps_per_epoch: int, validation_data=None,
+                    initial_epoch: int = 0, callbacks: list = ()):
+    """
+    WHAT: model.fit() for a multi-worker strategy: a training loop with
+    tf.distribute that calls the same Keras callbacks.
+
+    WHY not model.fit():
+    - Keras 3 fit() fails under MultiWorkerMirroredStrategy (it can't reduce
+      the per-worker batches and metrics). This loop does what fit() does,
+      with tf.distribute doing the gradient all-reduce.
+
+    HOW:
+    - Every epoch runs exactly 'steps_per_epoch' steps on EVERY worker (the
+      workers wait for each other at every step, so they must agree).
+    - Validation is one full pass over every worker's validation shard. The
+      shards may differ by a batch; tf.distribute then hands the workers that
+      ran out empty batches, so they all stop together.
+    - The loss is averaged over the global batch; loss and metrics are
+      summed over all workers, so every worker logs (and early-stops on)
+      the same numbers.
+    """
+    with strategy.scope():
+        metrics = {
+            "loss": tf.keras.metrics.Mean(name="loss"),
+            "accuracy": tf.keras.metrics.CategoricalAccuracy(name="accuracy"),
+        }
+
+    def update_metrics(labels, predictions, per_example_loss, prefix=""):
+        metrics[f"{prefix}loss"].update_state(per_example_loss)
+        metrics[f"{prefix}accuracy"].update_state(labels, predictions)
+
+    @tf.function
+    def train_step(iterator):
+        def step(images, labels):
+            with tf.GradientTape() as tape:
+                predictions = model(images, training=True)
+                per_example_loss = tf.keras.losses.categorical_crossentropy(labels, predictions)
+                loss = tf.nn.compute_average_loss(per_example_loss)
+            gradients = tape.gradient(loss, model.trainable_variables)
+            model.optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+            update_metrics(labels, predictions, per_example_loss)
+        strategy.run(step, args=next(iterator))
+
+    if validation_data is not None:
+        with strategy.scope():
+            metrics["val_loss"] = tf.keras.metrics.Mean(name="val_loss")
+            metrics["val_accuracy"] = tf.keras.metrics.CategoricalAccuracy(name="val_accuracy")
+
+        @tf.function
+        def test_step(batch):
+            def step(images, labels):
+                def evaluate():
+                    predictions = model(images, training=False)
+                    update_metrics(labels, predictions,
+                                   tf.keras.losses.categorical_crossentropy(labels, predictions), prefix="val_")
+                    return tf.constant(True)
+
+                # A worker whose shard has ended gets an empty batch: skip it.
+                tf.cond(tf.shape(images)[0] > 0, evaluate, lambda: tf.constant(False))
+            strategy.run(step, args=batch)
+
+    train_iterator = iter(strategy.experimental_distribute_dataset(to_dataset(train_data, repeat=True)))
+    if validation_data is not None:
+        validation_dataset = strategy.experimental_distribute_dataset(to_dataset(validation_data))
+
+    callbacks = tf.keras.callbacks.CallbackList(
+        list(callbacks), model=model, epochs=epochs, steps=steps_per_epoch, verbose=0,
+    )
+    model.stop_training = False
+    callbacks.on_train_begin()
+    history = {}
+    for epoch in range(initial_epoch, epochs):
+        started = time.perf_counter()
+        for metric in metrics.values():
+            metric.reset_state()
+        callbacks.on_epoch_begin(epoch)
+        for _ in range(steps_per_epoch):
+            train_step(train_iterator)
+        if validation_data is not None:
+            for batch in validation_dataset:   # a full pass, every epoch
+                test_step(batch)
+        logs = {name: float(metric.result()) for name, metric in metrics.items()}
+        logger.info(
+            f"Epoch {epoch + 1}/{epochs} ({time.perf_counter() - started:.1f}s): "
+            + ", ".join(f"{name}: {value:.4f}" for name, value in logs.items())
+        )
+        for name, value in logs.items():
+            history.setdefault(name, []).append(value)
+        callbacks.on_epoch_end(epoch, logs)
+        if model.stop_training:
+            break
+    callbacks.on_train_end()
+    return history
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def local_tf_configs(num_workers: int) -> list:
+    """
+    WHAT: The TF_CONFIG of every worker of a cluster on localhost (one free port each).
+    """
+    workers = [f"localhost:{_free_port()}" for _ in range(num_workers)]
+    return [
+        {"cluster": {"worker": workers}, "task": {"type": "worker", "index": index}}
+        for index in range(num_workers)
+    ]
+
+
+def launch_local_workers(num_workers: int, command: list) -> int:
+    """
+    WHAT: Runs 'command' as 'num_workers' worker processes of one localhost
+    cluster and waits for all of them. Returns the first non-zero exit code (or 0).
+
+    WHY:
+    - To try multi-worker training on a laptop: N processes on one machine
+      behave like N nodes (slower, as they share the CPU).
+
+    If one worker fails, the others are stopped (they would wait for it forever).
+    """
+    processes = []
+    for tf_config in local_tf_configs(num_workers):
+        env = dict(os.environ, TF_CONFIG=json.dumps(tf_config))
+        processes.append(subprocess.Popen(command, env=env))
+        logger.info(f"Started worker {tf_config['task']['index']} (pid {processes[-1].pid})")
+
+    exit_code = 0
+    running = list(processes)
+    while running:
+        for process in list(running):
+            code = process.poll()
+            if code is None:
+                continue
+            running.remove(process)
+            if code != 0 and exit_code == 0:
+                exit_code = code
+                logger.error(f"Worker pid {process.pid} failed with exit code {code}, stopping the others")
+                for other in running:
+                    other.terminate()
+        time.sleep(0.2)
+    return exit_code
@@ -0,0 +1,239 @@
+import json
+import os
+import re
+import shutil
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlparse
+from cnnClassifier import logger
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# These are the "Download Sources" used by Data Ingestion.
+#
+# The dataset used to come ONLY from Google Drive (through gdown). Now the
+# 'source_URL' in config.yaml picks how it is fetched:
+# - https://drive.google.com/...  -> GoogleDriveSource (gdown)
+# - http:// or https://           -> HttpSource (plain HTTP, e.g. a mirror or S3)
+# - file:///path/to/data.zip      -> FileSource (a local mirror, or tests)
+#
+# Every source downloads INTO a '.part' file and continues where that file
+# stopped, so an interrupted multi-GB download does not start from zero.
+#
+# Next to it, '.part.json' records WHAT the partial bytes are: the URL, and
+# (for HTTP) the server's ETag / Last-Modified and total size. A partial file
+# of another URL, or of an older version of the file, is thrown away instead
+# of having new bytes appended to it.
+# -----------------------------------------------------------------------------
+
+# Bytes read/written per step. Large enough to be fast, small enough to keep
+# memory flat no matter how big the dataset is.
+CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadSource:
+    """
+    WHAT: Base class. A source knows how to copy 'url' into 'part_path',
+    continuing from the bytes already in 'part_path'.
+    """
+
+    def __init__(self, retries: int = 3, timeout: float = 60.0):
+        self.retries = max(1, retries)
+        self.timeout = timeout
+
+    def fetch(self, url: str, part_path: Path):
+        """
+        WHAT: Downloads with retries. Every retry resumes from the partial file.
+
+        A partial file left by a download of another URL (or with no record
+        of where it came from) is discarded first.
+        """
+        part_path = Path(part_path)
+        meta = self.read_meta(part_path)
+        if meta.get("url") != url and any(path.exists() for path in self._partial_files(part_path)):
+            logger.info(f"{part_path} is from another download ({meta.get('url')}), starting over")
+            self.discard(part_path)
+            meta = {}
+        if meta.get("url") != url:
+            self.write_meta(part_path, {"url": url})
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._fetch(url, Path(part_path))
+                return
+            except OSError as e:  # URLError, connection resets and timeouts are all OSErrors
+                # A 4xx (404, 403...) will not go away by retrying.
+                client_error = isinstance(e, urllib.error.HTTPError) and 400 <= e.code < 500
+                if attempt == self.retries or client_error:
+                    raise
+                wait = 2 ** attempt
+                logger.warning(f"Download attempt {attempt} failed ({e}), resuming in {wait}s")
+                time.sleep(wait)
+
+    def _fetch(self, url: str, part_path: Path):
+        raise NotImplementedError
+
+    @staticmethod
+    def meta_path(part_path: Path) -> Path:
+        return part_path.with_name(part_path.name + ".json")
+
+    def read_meta(self, part_path: Path) -> dict:
+        try:
+            with open(self.meta_path(part_path)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def write_meta(self, part_path: Path, meta: dict):
+        tmp_path = self.meta_path(part_path).with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=4)
+        os.replace(tmp_path, self.meta_path(part_path))
+
+    def _partial_files(self, part_path: Path) -> list:
+        """
+        WHAT: The files holding partial download bytes.
+        """
+        return [part_path]
+
+    def discard(self, part_path: Path):
+        """
+        WHAT: Deletes the partial download and its record (call it after a
+        finished download is renamed, or when its bytes can't be trusted).
+        """
+        part_path = Path(part_path)
+        for path in self._partial_files(part_path) + [self.meta_path(part_path)]:
+            path.unlink(missing_ok=True)
+
+    def _restart(self, url: str, part_path: Path, reason: str):
+        logger.info(f"Cannot resume {part_path} ({reason}), downloading from the start")
+        self.discard(part_path)
+        self.write_meta(part_path, {"url": url})
+        self._fetch(url, part_path)
+
+
+def _copy_stream(src, dst):
+    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+class HttpSource(DownloadSource):
+    """
+    WHAT: Plain HTTP(S) download with "Range" requests for resuming.
+
+    HOW:
+    - If a partial file exists, ask for 'Range: bytes=<size>-' with
+      'If-Range: <ETag or Last-Modified of the partial file>'. A server that
+      supports it answers 206 and we append. One that doesn't - or whose file
+      changed since the partial download - answers 200 and we start over.
+    - A 206 whose total size differs from the partial file's is not appended.
+    - 416 ("range not satisfiable") means the partial file is already complete
+      (if it has the size the server announced for it).
+    """
+
+    def _fetch(self, url: str, part_path: Path):
+        meta = self.read_meta(part_path)
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {}
+        if offset:
+            validator = meta.get("etag") or meta.get("last_modified")
+            if validator is None:
+                return self._restart(url, part_path, "no ETag / Last-Modified recorded")
+            headers = {"Range": f"bytes={offset}-", "If-Range": validator}
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                if offset != meta.get("size"):
+                    return self._restart(url, part_path, f"416 with {offset} of {meta.get('size')} bytes")
+                logger.info(f"{part_path} is already complete ({offset} bytes)")
+                return
+            raise
+        with response:
+            if offset and response.status == 206:
+                match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", response.headers.get("Content-Range", ""))
+                total = int(match.group(2)) if match and match.group(2) != "*" else None
+                if match is None or int(match.group(1)) != offset or total != meta.get("size"):
+                    response.close()
+                    return self._restart(url, part_path, "the server's file changed size")
+                logger.info(f"Resuming download at byte {offset}")
+            else:
+                if offset:
+                    logger.info("Server ignored the Range request (or the file changed), "
+                                "downloading from the start")
+                offset = 0
+                length = response.headers.get("Content-Length")
+                self.write_meta(part_path, {
+                    "url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "size": int(length) if length is not None else None,
+                })
+            with open(part_path, "ab" if offset else "wb") as f:
+                _copy_stream(response, f)
+
+
+class FileSource(DownloadSource):
+    """
+    WHAT: Copies from a local path ('file:///mnt/mirror/data.zip'), resumable too.
+
+    The partial file is only continued if the source still has the size and
+    modification time it had when the copy started.
+    """
+
+    def _fetch(self, url: str, part_path: Path):
+        source_path = urllib.request.url2pathname(urlparse(url).path)
+        stat = os.stat(source_path)
+        identity = {"url": url, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        if offset and self.read_meta(part_path) != identity:
+            logger.info(f"{source_path} changed since {part_path} was started, copying from the start")
+            offset = 0
+        self.write_meta(part_path, identity)
+        with open(source_path, "rb") as src, open(part_path, "ab" if offset else "wb") as dst:
+            src.seek(offset)
+            _copy_stream(src, dst)
+
+
+class GoogleDriveSource(DownloadSource):
+    """
+    WHAT: Google Drive download through gdown.
+
+    WHY gdown:
+    - Drive answers large files with a "can't scan for viruses" page instead
+      of the file. gdown handles that confirmation step.
+    - gdown's resume=True continues from its own temp file if one is left over
+      ('<part file name>...part' next to it). gdown does not check that those
+      bytes are from the same file version; the recorded URL is all we check.
+    """
+
+    def _partial_files(self, part_path: Path) -> list:
+        return [part_path] + [
+            path for path in part_path.parent.glob(part_path.name + "*.part") if path != part_path
+        ]
+
+    def _fetch(self, url: str, part_path: Path):
+        import gdown
+
+        # Google Drive URLs look like: https://drive.google.com/file/d/FILE_ID/view
+        # We split the URL by '/' and take the second to last part to get the ID.
+        file_id = url.split("/")[-2]
+        result = gdown.download(id=file_id, output=str(part_path), resume=True)
+        if result is None:
+            raise ConnectionError(f"gdown could not download {url}")
+
+
+def source_for(url: str, retries: int = 3) -> DownloadSource:
+    """
+    WHAT: Picks the download source from the URL.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return FileSource(retries)
+    if parsed.scheme in ("http", "https"):
+        if parsed.hostname == "drive.google.com":
+            return GoogleDriveSource(retries)
+        return HttpSource(retries)
+    raise ValueError(f"Unsupported source_URL scheme '{parsed.scheme}' in {url}")
@@ -5,6 +5,8 @@ import mlflow.keras
 from urllib.parse import urlparse
 from cnnClassifier.entity.config_entity import EvaluationConfig
 from cnnClassifier.utils.common import read_yaml, create_directories,save_json
+from cnnClassifier.components.dataset_manifest import Manifest
+from cnnClassifier.components.model_trainer import split_generator
 import dagshub
 
 # -----------------------------------------------------------------------------
@@ -13,7 +15,8 @@ import dagshub
 # 
 # Its job is to:
 # 1. Load the trained model.
-# 2. Test it on the "Validation Set" (the images it has never seen).
+# 2. Test it on the "Validation Set" (the images it has never seen - the
+#    validation split of the dataset manifest, the same one Training held out).
 # 3. Calculate the final Score (Accuracy & Loss).
 # 4. Save the score to a file (scores.json).
 # 5. Log everything to MLflow (for experiment tracking).
@@ -36,28 +39,17 @@ class Evaluation:
         WHY: 
         - Just like in training, we need to load images in batches to test the model.
         - We use the same 'rescale' (1./255) because the model expects normalized numbers.
+        - The images are the manifest's "validation" split: exactly the images
+          Training held out (before, Training held out 20% and we tested on
+          30%, so some test images had been trained on).
+        - Images are loaded with the shared preprocessing (utils/preprocessing.py),
+          the same code the web app uses - through the input pipeline chosen
+          by INPUT_PIPELINE (see split_generator() in model_trainer.py).
         """
-
-        datagenerator_kwargs = dict(
-            rescale = 1./255,
-            validation_split=0.30 # Note: Ensure this matches your training split logic if needed
-        )
-
-        dataflow_kwargs = dict(
-            target_size=self.config.params_image_size[:-1],
-            batch_size=self.config.params_batch_size,
-            interpolation="bilinear"
-        )
-
-        valid_datagenerator = tf.keras.preprocessing.image.ImageDataGenerator(
-            **datagenerator_kwargs
-        )
-
-        self.valid_generator = valid_datagenerator.flow_from_directory(
-            directory=self.config.training_data,
-            subset="validation",
-            shuffle=False,
-            **dataflow_kwargs
+        valid_datagenerator = tf.keras.preprocessing.image.ImageDataGenerator(rescale=1./255)
+        self.valid_generator = split_generator(
+            self.config, Manifest(self.config.manifest_path), "validation", shuffle=False,
+            image_data_generator=valid_datagenerator,
         )
 
 
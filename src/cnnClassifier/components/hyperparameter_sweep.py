@@ -0,0 +1,353 @@
+import itertools
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import replace
+from multiprocessing import get_context
+from pathlib import Path
+import yaml
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import SweepConfig, TrainingConfig
+from cnnClassifier.utils.common import save_json
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Hyperparameter Sweep" Component (Stage 7).
+#
+# Tuning LEARNING_RATE, BATCH_SIZE or AUGMENTATION meant editing params.yaml
+# and re-running the whole pipeline, once per guess. The sweep tries many
+# combinations ("trials") in one run:
+# 1. Trials run in parallel, each in its own process with its own share of
+#    the CPU threads (so N trials don't fight over every core).
+# 2. Bad trials are stopped early with ASHA (asynchronous successive halving):
+#    every trial first trains for MIN_EPOCHS; only the best 1/REDUCTION_FACTOR
+#    of the trials that reached a "rung" continue to REDUCTION_FACTOR times
+#    more epochs, and so on up to MAX_EPOCHS. A promoted trial resumes from
+#    its own checkpoint (training_checkpoints.py) - no epoch is trained twice.
+# 3. Every trial reuses the ingested data: the same manifest, tensor cache and
+#    bottleneck cache. The bottleneck caches the trials need are built before
+#    the first trial starts, once each (the frozen VGG16 runs once per image,
+#    not once per trial), and no trial deletes another one's cache.
+# 4. Writes a leaderboard and the best params (ready to copy into params.yaml).
+# -----------------------------------------------------------------------------
+
+# Search space keys -> the TrainingConfig field each one sets.
+SPACE_FIELDS = {
+    "LEARNING_RATE": "params_learning_rate",
+    "BATCH_SIZE": "params_batch_size",
+    "AUGMENTATION": "params_is_augmentation",
+}
+
+
+def expand_space(space: dict, trials: int, seed: int) -> list:
+    """
+    WHAT: The trials (one {PARAM: value} dict each) of a search space.
+
+    ARGS:
+    - space: {PARAM: [values]} (a single value means "fixed").
+    - trials: 0 = every combination (grid); N = N random combinations of the grid.
+    """
+    unknown = set(space) - set(SPACE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {sorted(unknown)}; allowed: {sorted(SPACE_FIELDS)}")
+    names = sorted(space)
+    values = [space[name] if isinstance(space[name], (list, tuple)) else [space[name]] for name in names]
+    grid = [dict(zip(names, combination)) for combination in itertools.product(*values)]
+    if 0 < trials < len(grid):
+        grid = random.Random(seed).sample(grid, trials)
+    return grid
+
+
+def rung_epochs(min_epochs: int, max_epochs: int, reduction_factor: int) -> list:
+    """
+    WHAT: The epochs of every rung, e.g. (1, 9, 3) -> [1, 3, 9].
+    """
+    if not 1 <= min_epochs <= max_epochs:
+        raise ValueError(f"Need 1 <= MIN_EPOCHS <= MAX_EPOCHS, got {min_epochs} and {max_epochs}")
+    if reduction_factor < 2:
+        raise ValueError(f"REDUCTION_FACTOR must be at least 2, got {reduction_factor}")
+    rungs = [min_epochs]
+    while rungs[-1] * reduction_factor < max_epochs:
+        rungs.append(rungs[-1] * reduction_factor)
+    if rungs[-1] != max_epochs:
+        rungs.append(max_epochs)
+    return rungs
+
+
+def _init_trial_process(threads: int):
+    """
+    WHAT: Runs once in every trial process: limits its CPU threads.
+
+    WHY here:
+    - TensorFlow reads its thread settings once, before its first operation,
+      so they are set when the process starts (before any trial runs).
+    """
+    for name in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run_trial(config: TrainingConfig) -> dict:
+    """
+    WHAT: Trains one trial up to config.params_epochs epochs. Runs in a trial process.
+
+    Resumes from the trial's checkpoint, so a promoted trial only trains the
+    new epochs. Returns the checkpoint state (best metric, best epoch, history).
+    """
+    from cnnClassifier.components.model_trainer import Training
+    from cnnClassifier.components.training_checkpoints import STATE_FILE
+
+    training = Training(config=config)
+    training.get_base_model()
+    training.train_valid_generator()
+    training.train()
+    with open(Path(config.checkpoint_dir) / STATE_FILE) as f:
+        return json.load(f)
+
+
+def build_trial_cache(config: TrainingConfig) -> bool:
+    """
+    WHAT: Builds the bottleneck cache of a trial config (if it uses one). Runs in a trial process.
+    """
+    from cnnClassifier.components.model_trainer import Training
+
+    training = Training(config=config)
+    training.get_base_model()
+    training.train_valid_generator()
+    return training.bottleneck_features() is not None
+
+
+class HyperparameterSweep:
+    def __init__(self, config: SweepConfig, training_config: TrainingConfig):
+        """
+        WHAT: Initializes the sweep.
+
+        ARGS:
+        - config: The search space, the ASHA settings, the parallelism and
+          where to write the trials, leaderboard and best params.
+        - training_config: The normal training settings. Every trial starts
+          from them and only changes the swept parameters.
+        """
+        self.config = config
+        self.training_config = training_config
+        self.rungs = rung_epochs(config.params_min_epochs, config.params_max_epochs,
+                                 config.params_reduction_factor)
+        self.minimize = "loss" in config.params_monitor
+        self.workers = max(1, config.workers)
+        self.threads = config.threads_per_trial or max(1, (os.cpu_count() or 1) // self.workers)
+
+    def trial_config(self, trial: dict, epochs: int) -> TrainingConfig:
+        """
+        WHAT: The TrainingConfig of one trial, trained up to 'epochs' epochs.
+
+        HOW:
+        - Own folder (model + checkpoints) under 'trials_dir'.
+        - SHARED data: manifest, tensor cache, bottleneck cache (marked
+          shared, so a trial never deletes the cache of another one).
+        - One process per trial (no multi-worker), no early stopping (ASHA
+          decides who stops), and a disk tf.data cache is replaced by memory
+          (two trials must not write the same cache file).
+        """
+        trial_dir = Path(self.config.trials_dir) / trial["id"]
+        overrides = {SPACE_FIELDS[name]: value for name, value in trial["params"].items()}
+        return replace(
+            self.training_config,
+            root_dir=trial_dir,
+            trained_model_path=trial_dir / "model.h5",
+            checkpoint_dir=trial_dir / "checkpoints",
+            params_epochs=epochs,
+            params_monitor=self.config.params_monitor,
+            params_early_stopping_patience=0,
+            params_distribution_strategy="single",
+            bottleneck_cache_shared=True,
+            params_tf_data_cache="memory" if self.training_config.params_tf_data_cache == "disk"
+            else self.training_config.params_tf_data_cache,
+            **overrides,
+        )
+
+    def _build_caches(self, pool, trials: dict):
+        """
+        WHAT: Builds every bottleneck cache the trials need, once each, before any trial runs.
+
+        WHY:
+        - Trials with the same cache would otherwise all run the VGG16
+          extraction at once on a cold start. Only the cache settings matter
+          here (AUGMENTATION, not e.g. LEARNING_RATE), so one job per
+          distinct setting is enough.
+        - A failed build is logged; the trials then build it themselves.
+        """
+        if not self.training_config.params_bottleneck_cache:
+            return
+        variants = {}
+        for trial in trials.values():
+            config = self.trial_config(trial, self.rungs[0])
+            variants.setdefault(config.params_is_augmentation, config)
+        futures = {pool.submit(build_trial_cache, config): augmentation
+                   for augmentation, config in variants.items()}
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.exception(f"Building the bottleneck cache (AUGMENTATION = {futures[future]}) failed: {e}")
+
+    def _score(self, metric) -> float:
+        """
+        WHAT: Sort key of a metric: lower is better, failed trials last.
+        """
+        if metric is None or math.isnan(metric):
+            return math.inf
+        return metric if self.minimize else -metric
+
+    def _next_job(self, trials: dict, pending: list, results: list, promoted: list, finishing: bool):
+        """
+        WHAT: The next (trial, rung) to run, or None.
+
+        HOW (ASHA):
+        1. From the highest rung down: if a trial is in the top
+           1/REDUCTION_FACTOR of the trials that finished that rung and was
+           not promoted yet, promote it to the next rung.
+        2. Otherwise start a new trial at rung 0.
+        3. 'finishing' (no trial running, nothing else to do) and no trial
+           reached MAX_EPOCHS yet (a failed one does not count): promote the
+           best trial of the highest rung reached, so at least one trial is
+           trained to MAX_EPOCHS.
+        """
+        eta = self.config.params_reduction_factor
+        for rung in reversed(range(len(self.rungs) - 1)):
+            ranked = sorted(results[rung], key=lambda t: self._score(results[rung][t]))
+            for trial_id in ranked[:len(ranked) // eta]:
+                if trial_id not in promoted[rung] and not math.isinf(self._score(results[rung][trial_id])):
+                    promoted[rung].add(trial_id)
+                    return trials[trial_id], rung + 1
+        if pending:
+            return pending.pop(0), 0
+        reached_max = any(not math.isinf(self._score(metric)) for metric in results[-1].values())
+        if finishing and not reached_max:
+            for rung in reversed(range(len(self.rungs) - 1)):
+                ranked = [t for t in sorted(results[rung], key=lambda t: self._score(results[rung][t]))
+                          if t not in promoted[rung] and not math.isinf(self._score(results[rung][t]))]
+                if ranked:
+                    promoted[rung].add(ranked[0])
+                    return trials[ranked[0]], rung + 1
+        return None
+
+    def run(self) -> dict:
+        """
+        WHAT: Runs the sweep and writes the leaderboard and the best params.
+
+        HOW:
+        1. Expand the search space into trials and build the bottleneck
+           caches they need (see _build_caches()).
+        2. Keep 'workers' trial processes busy with ASHA jobs (see _next_job()).
+        3. Every finished job records the trial's best MONITOR value so far.
+        4. Rank the trials (failed ones last, then most epochs reached first,
+           then by metric) and save the leaderboard + the best params. The
+           leaderboard is written even if every trial failed.
+
+        Returns:
+            dict: The best trial's leaderboard entry.
+        """
+        started = time.perf_counter()
+        trials = {
+            f"trial-{index:03d}": {"id": f"trial-{index:03d}", "params": params}
+            for index, params in enumerate(
+                expand_space(self.config.params_space, self.config.params_trials, self.config.params_seed)
+            )
+        }
+        pending = list(trials.values())
+        results = [dict() for _ in self.rungs]       # rung -> {trial_id: metric}
+        promoted = [set() for _ in self.rungs]
+        states = {}
+        seconds = {trial_id: 0.0 for trial_id in trials}
+        logger.info(
+            f"Sweeping {len(trials)} trials over rungs {self.rungs} epochs: "
+            f"{self.workers} processes x {self.threads} threads"
+        )
+
+        running = {}
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"),
+                                 initializer=_init_trial_process, initargs=(self.threads,)) as pool:
+            self._build_caches(pool, trials)
+            while True:
+                while len(running) < self.workers:
+                    job = self._next_job(trials, pending, results, promoted, finishing=not running)
+                    if job is None:
+                        break
+                    trial, rung = job
+                    future = pool.submit(run_trial, self.trial_config(trial, self.rungs[rung]))
+                    running[future] = (trial["id"], rung, time.perf_counter())
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    trial_id, rung, submitted = running.pop(future)
+                    seconds[trial_id] += time.perf_counter() - submitted
+                    try:
+                        states[trial_id] = state = future.result()
+                        metric = state["best"]
+                    except Exception as e:
+                        logger.exception(f"{trial_id} failed at rung {rung}: {e}")
+                        states.setdefault(trial_id, {})["error"] = f"{type(e).__name__}: {e}"
+                        metric = None
+                    results[rung][trial_id] = metric
+                    logger.info(
+                        f"{trial_id} {trials[trial_id]['params']} reached {self.rungs[rung]} epochs: "
+                        f"{self.config.params_monitor} = {metric}"
+                    )
+
+        leaderboard = []
+        for trial_id, trial in trials.items():
+            reached = max((rung for rung in range(len(self.rungs)) if trial_id in results[rung]), default=None)
+            if reached is None:
+                continue
+            state = states.get(trial_id, {})
+            leaderboard.append({
+                "trial": trial_id,
+                "params": trial["params"],
+                "epochs": self.rungs[reached],
+                "best_epoch": state.get("best_epoch"),
+                self.config.params_monitor: results[reached][trial_id],
+                "status": "failed" if "error" in state else ("stopped" if reached < len(self.rungs) - 1 else "completed"),
+                "error": state.get("error"),
+                "seconds": round(seconds[trial_id], 1),
+                "model_path": str(self.trial_config(trial, self.rungs[reached]).trained_model_path),
+            })
+        leaderboard.sort(key=lambda entry: (
+            math.isinf(self._score(entry[self.config.params_monitor])),
+            -entry["epochs"],
+            self._score(entry[self.config.params_monitor]),
+        ))
+        for rank, entry in enumerate(leaderboard, start=1):
+            entry["rank"] = rank
+
+        total = time.perf_counter() - started
+        save_json(path=Path(self.config.leaderboard_path), data={
+            "monitor": self.config.params_monitor,
+            "rungs": self.rungs,
+            "trials": len(trials),
+            "seconds": round(total, 1),
+            "leaderboard": leaderboard,
+        })
+        if not leaderboard or math.isinf(self._score(leaderboard[0][self.config.params_monitor])):
+            raise RuntimeError(f"No sweep trial produced a {self.config.params_monitor} value, "
+                               f"see the logs and {self.config.leaderboard_path}")
+        best = leaderboard[0]
+        best_params = dict(best["params"], EPOCHS=best["best_epoch"] or best["epochs"])
+        os.makedirs(Path(self.config.best_params_path).parent, exist_ok=True)
+        with open(self.config.best_params_path, "w") as f:
+            f.write(f"# Best of {len(trials)} sweep trials ({best['trial']}, "
+                    f"{self.config.params_monitor} = {best[self.config.params_monitor]:.4f}).\n"
+                    f"# Copy into params.yaml to train with them.\n")
+            yaml.safe_dump(best_params, f, sort_keys=True)
+        logger.info(
+            f"Sweep done in {total:.1f}s: best {best['trial']} {best_params} "
+            f"({self.config.params_monitor} = {best[self.config.params_monitor]:.4f}), "
+            f"leaderboard at {self.config.leaderboard_path}"
+        )
+        return best
@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import TrainingJobConfig
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Training Job Runner" Component.
+#
+# '/train' used to run 'python main.py' INSIDE the web request. That:
+# 1. Blocked a server worker for the whole training run.
+# 2. Hit HTTP timeouts on long runs.
+# 3. Let two '/train' calls write to the same 'artifacts/' folder at once.
+#
+# The JobRunner instead:
+# 1. Starts training as a separate background process and returns a job ID at once.
+# 2. Allows only ONE running job per pipeline (a lock file, so this also holds
+#    across several server processes).
+# 3. Writes each job's status (JSON) and output (log file) under 'artifacts/jobs',
+#    so '/train/<id>' can report progress.
+# 4. On success, copies the trained model to the serving path, where the
+#    Model Registry picks it up and hot-swaps it in.
+#
+# Training runs in its own process, so the web server keeps serving predictions.
+# -----------------------------------------------------------------------------
+
+
+@dataclass
+class TrainingJob:
+    """
+    WHAT: Everything we know about one training run.
+
+    FIELDS:
+    - status: "running", "succeeded" or "failed".
+    - return_code: Exit code of the training process (None while running,
+      and for a job whose server died before it could record the exit code).
+    - pid / server_pid: The training process, and the server process that
+      started it (and waits for it).
+    - pid_start / server_pid_start: When those processes started (see
+      _process_start()), so a new process that got the same PID (e.g. the
+      server restarted as PID 1 in a fresh container) is not mistaken for them.
+    """
+    job_id: str
+    pipeline: str
+    command: list
+    status: str
+    log_path: str
+    created_at: float
+    finished_at: Optional[float] = None
+    return_code: Optional[int] = None
+    pid: Optional[int] = None
+    server_pid: Optional[int] = None
+    pid_start: Optional[int] = None
+    server_pid_start: Optional[int] = None
+    model_promoted: bool = False
+
+
+class JobAlreadyRunning(Exception):
+    """
+    WHAT: Raised when a pipeline already has a running job (single-flight).
+
+    The running job is attached so the caller can point the user at it.
+    """
+    def __init__(self, job: Optional[TrainingJob]):
+        self.job = job
+        super().__init__(f"A job is already running: {job.job_id if job else 'unknown'}")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start(pid: int) -> Optional[int]:
+    """
+    WHAT: The start time of process 'pid' (clock ticks since boot, from
+    /proc/<pid>/stat), or None if it is gone or /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name (field 2) may contain spaces: count from the last ')'.
+    return int(stat.rsplit(")", 1)[1].split()[19])
+
+
+def _process_alive(pid: Optional[int], start: Optional[int]) -> bool:
+    """
+    WHAT: True if process 'pid' is alive AND is still the process that started at 'start'.
+
+    A PID is reused once its process ends; comparing the start time tells the
+    original process from a new one (skipped if either start time is unknown).
+    """
+    if pid is None or not _pid_alive(pid):
+        return False
+    current = _process_start(pid)
+    return start is None or current is None or current == start
+
+
+class JobRunner:
+    def __init__(self, config: TrainingJobConfig):
+        self.config = config
+        self.root_dir = Path(config.root_dir)
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._processes = {}
+
+    def _job_file(self, job_id: str) -> Path:
+        return self.root_dir / f"{job_id}.json"
+
+    def _lock_file(self, pipeline: str) -> Path:
+        return self.root_dir / f"{pipeline}.lock"
+
+    def _save(self, job: TrainingJob):
+        """
+        WHAT: Writes the job status to '<job_id>.json' (temp file + rename, so
+        readers never see a half-written file).
+        """
+        tmp_path = self._job_file(job.job_id).with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(job), f, indent=4)
+        os.replace(tmp_path, self._job_file(job.job_id))
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        """
+        WHAT: Returns a job's current status (or None if the ID is unknown).
+        """
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._job_file(job_id)) as f:
+                job = TrainingJob(**json.load(f))
+        except FileNotFoundError:
+            return None
+        return self._reconcile(job)
+
+    def _reconcile(self, job: TrainingJob) -> TrainingJob:
+        """
+        WHAT: Marks a "running" job as failed once nobody can finish it.
+
+        WHY:
+        - The server that started a job records its outcome (see _wait()).
+          If that server crashed, the training process may still run (it is
+          not killed with the server) - the job is still running then.
+        - Only when the training process is gone too is the job orphaned:
+          nobody will ever write its outcome, so it is failed here.
+        - A process counts as alive only if its start time matches too: after
+          a container restart the server is PID 1 again, and the recorded
+          PIDs may belong to new processes.
+        - A job "started by this process" that this process does not wait for
+          was started by an earlier server with the same PID: orphaned too.
+        """
+        if job.status != "running":
+            return job
+        if _process_alive(job.pid, job.pid_start):
+            return job
+        if job.server_pid == os.getpid() and job.job_id not in self._processes:
+            reason = "it was started by an earlier server with this PID"
+        elif job.server_pid is None or _process_alive(job.server_pid, job.server_pid_start):
+            # The server still waits for it and records the outcome itself.
+            return job
+        else:
+            reason = "the training process and its server are gone"
+        logger.warning(f"Job {job.job_id}: {reason}, marking it failed")
+        job.status = "failed"
+        job.finished_at = time.time()
+        self._save(job)
+        return job
+
+    def _acquire(self, pipeline: str, job_id: str):
+        """
+        WHAT: Takes the single-flight lock for a pipeline.
+
+        HOW:
+        - O_CREAT | O_EXCL creates the lock file only if it does not exist yet,
+          which the OS guarantees is atomic (even across processes).
+        - A lock whose job is no longer running is removed. A job keeps the
+          lock while its training process lives, even if the server that
+          started it crashed (see _reconcile()).
+        """
+        lock_file = self._lock_file(pipeline)
+        for _ in range(2):
+            try:
+                fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                running = self._lock_owner(pipeline)
+                if running is not None:
+                    raise JobAlreadyRunning(running)
+                logger.info(f"Removing stale lock {lock_file}")
+                try:
+                    os.remove(lock_file)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                json.dump({"job_id": job_id, "server_pid": os.getpid()}, f)
+            return
+        raise JobAlreadyRunning(self._lock_owner(pipeline))
+
+    def _lock_owner(self, pipeline: str) -> Optional[TrainingJob]:
+        """
+        WHAT: Returns the job holding the lock, or None if the lock is stale.
+
+        The lock is stale once its job is no longer running: it finished, or
+        its training process is gone (checked on the training process, not
+        on the server - a crashed server leaves its training still running).
+        """
+        try:
+            with open(self._lock_file(pipeline)) as f:
+                owner = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        job = self.get(owner.get("job_id", ""))
+        if job is None or job.status != "running":
+            return None
+        return job
+
+    def _release(self, pipeline: str):
+        try:
+            os.remove(self._lock_file(pipeline))
+        except FileNotFoundError:
+            pass
+
+    def submit(self, pipeline: str = "training") -> TrainingJob:
+        """
+        WHAT: Starts a training job in the background and returns immediately.
+
+        Raises:
+            JobAlreadyRunning: If this pipeline already has a running job.
+        """
+        command = shlex.split(self.config.command)
+        if command and command[0] == "python":
+            # Use the same Python (and virtualenv) the server runs in.
+            command[0] = sys.executable
+
+        with self._lock:
+            job_id = uuid.uuid4().hex[:12]
+            self._acquire(pipeline, job_id)
+            try:
+                job = TrainingJob(
+                    job_id=job_id,
+                    pipeline=pipeline,
+                    command=command,
+                    status="running",
+                    log_path=str(self.root_dir / f"{job_id}.log"),
+                    created_at=time.time(),
+                    server_pid=os.getpid(),
+                    server_pid_start=_process_start(os.getpid()),
+                )
+                log_file = open(job.log_path, "wb")
+                process = subprocess.Popen(
+                    command,
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                    # Lower priority, so serving stays responsive while we train.
+                    preexec_fn=(lambda: os.nice(10)) if hasattr(os, "nice") else None,
+                )
+                log_file.close()
+                self._processes[job_id] = process
+                job.pid = process.pid
+                job.pid_start = _process_start(process.pid)
+                self._save(job)
+            except Exception:
+                self._release(pipeline)
+                raise
+
+        threading.Thread(
+            target=self._wait, args=(job, process), name=f"job-{job_id}", daemon=True
+        ).start()
+        logger.info(f"Started {pipeline} job {job_id}: {' '.join(command)}")
+        return job
+
+    def _wait(self, job: TrainingJob, process: subprocess.Popen):
+        """
+        WHAT: Waits for the training process, then records the outcome,
+        promotes the model (on success) and releases the lock.
+        """
+        try:
+            job.return_code = process.wait()
+            job.status = "succeeded" if job.return_code == 0 else "failed"
+            if job.status == "succeeded" and self.config.promote_model:
+                job.model_promoted = self._promote_model()
+        except Exception as e:
+            logger.exception(f"Job {job.job_id} failed: {e}")
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            self._release(job.pipeline)
+            self._processes.pop(job.job_id, None)
+            logger.info(f"Job {job.job_id} finished with status {job.status}")
+
+    def _promote_model(self) -> bool:
+        """
+        WHAT: Copies the freshly trained model to the path the server serves from.
+
+        HOW:
+        - Copy to a temp file next to the target, then os.replace() it in.
+          The rename is atomic, so the Model Registry never sees a half-copied file.
+        """
+        source = Path(self.config.trained_model_path)
+        target = Path(self.config.serving_model_path)
+        if not source.exists():
+            logger.warning(f"Trained model {source} not found, nothing to promote")
+            return False
+        os.makedirs(target.parent, exist_ok=True)
+        tmp_path = target.with_name(target.name + ".tmp")
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+        logger.info(f"Promoted {source} to {target}")
+        return True
+
+    def tail(self, job_id: str, lines: int = 100) -> Optional[str]:
+        """
+        WHAT: Returns the last 'lines' lines of a job's log.
+
+        HOW:
+        - Reads the file backwards in 8KB blocks, so a huge log (TensorFlow
+          progress bars) is never read in full.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        try:
+            with open(job.log_path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                data = b""
+                while position > 0 and data.count(b"\n") <= lines:
+                    step = min(8192, position)
+                    position -= step
+                    f.seek(position)
+                    data = f.read(step) + data
+        except FileNotFoundError:
+            return ""
+        text = data.decode("utf-8", errors="replace")
+        return "\n".join(text.splitlines()[-lines:])
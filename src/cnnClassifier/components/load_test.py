@@ -0,0 +1,345 @@
+import base64
+import http.client
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+from urllib.parse import urlparse
+import numpy as np
+from cnnClassifier import logger
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.entity.config_entity import LoadTestConfig
+from cnnClassifier.utils.common import save_json
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Load Test" Component.
+#
+# We had no repeatable way to answer "how much traffic can app.py take, and
+# did this change make it slower?". This component:
+# 1. Loads real images (from artifacts/data_ingestion, or inputImage.jpg).
+# 2. Sends them to '/predict' - either in-process (the Flask app is started
+#    inside this process, no network needed) or to a running server's URL.
+# 3. Drives the load in one of two ways:
+#    - Closed loop (arrival_rate = 0): 'concurrency' clients, each sending the
+#      next request as soon as the previous one is answered.
+#    - Open loop (arrival_rate > 0): requests START at a fixed rate no matter
+#      how slow the server is, like real users do. Latency is measured from
+#      the scheduled start, so a server that falls behind can't hide it.
+# 4. Reports throughput and latency percentiles, saves them as a DVC metric
+#    ('load_test_scores.json'), and FAILS if no request succeeded, too many
+#    failed, or p95 latency is above the limit or regressed against the
+#    accepted baseline ('load_test_baseline.json').
+#
+# The baseline is NOT the last run: it only changes when someone accepts a
+# run with '--accept-baseline'. Otherwise every passing run could raise the
+# bar a little, and p95 could creep up forever without ever failing.
+# -----------------------------------------------------------------------------
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+PAYLOAD_TYPES = ("raw", "base64")
+CONTENT_TYPES = {".png": "image/png", ".bmp": "image/bmp"}
+
+
+class LatencyRegression(Exception):
+    """
+    WHAT: Raised when a run breaks a configured threshold (errors or p95 latency).
+    """
+
+
+class LoadTest:
+    def __init__(self, config: LoadTestConfig):
+        if config.payload not in PAYLOAD_TYPES:
+            raise ValueError(f"payload must be one of {PAYLOAD_TYPES}, got '{config.payload}'")
+        self.config = config
+        self._local = threading.local()
+
+    def load_images(self):
+        """
+        WHAT: Reads up to 'max_images' images into memory as (content_type, bytes).
+
+        WHY in memory:
+        - Reading files during the test would measure our disk, not the server.
+        - A fixed seed picks the same sample every run, so runs are comparable.
+        """
+        paths = []
+        if self.config.images_dir.is_dir():
+            for root, dirs, files in os.walk(self.config.images_dir):
+                dirs.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not paths:
+            logger.warning(f"No images in {self.config.images_dir}, using {self.config.fallback_image}")
+            paths = [str(self.config.fallback_image)]
+        random.Random(42).shuffle(paths)
+
+        images = []
+        for path in paths[:max(1, self.config.max_images)]:
+            with open(path, "rb") as f:
+                content_type = CONTENT_TYPES.get(Path(path).suffix.lower(), "image/jpeg")
+                images.append((content_type, f.read()))
+        self.images = images
+        logger.info(f"Load test will send {len(images)} distinct images")
+
+    def _body(self, index: int):
+        """
+        WHAT: Builds the (content_type, body) of request number 'index'.
+
+        WHY 'bypass_cache':
+        - The prediction cache answers a repeated image without running the
+          model, so a load test cycling through 200 images would mostly
+          measure the cache. A few random bytes after the end of the image
+          change its hash but not its pixels (decoders ignore trailing data).
+        """
+        content_type, data = self.images[index % len(self.images)]
+        if self.config.bypass_cache:
+            data = data + os.urandom(8)
+        if self.config.payload == "base64":
+            body = json.dumps({"image": base64.b64encode(data).decode("ascii")}).encode()
+            return "application/json", body
+        return content_type, data
+
+    def start_target(self):
+        """
+        WHAT: Prepares the function that sends one request.
+
+        HOW:
+        - "inprocess": import app.py, start it with the model under test and
+          wait until '/ready'. Each load thread gets its own Flask test client.
+        - A URL ("http://host:port"): each load thread keeps one HTTP
+          keep-alive connection to the server.
+        """
+        if self.config.target == "inprocess":
+            app_module = self._import_app()
+            serving_config = _serving_config_for(self.config.model_path)
+            flask_app = app_module.create_app(serving_config=serving_config)
+            deadline = time.monotonic() + 600
+            while not app_module.clApp.ready:
+                if app_module.clApp.startup_error:
+                    raise RuntimeError(f"App failed to start: {app_module.clApp.startup_error}")
+                if time.monotonic() > deadline:
+                    raise TimeoutError("App did not become ready within 600s")
+                time.sleep(0.2)
+            self._flask_app = flask_app
+            self._send = self._send_inprocess
+        else:
+            url = urlparse(self.config.target)
+            if url.scheme != "http" or not url.hostname:
+                raise ValueError(f"target must be 'inprocess' or an http:// URL, got '{self.config.target}'")
+            self._url = url
+            self._send = self._send_http
+
+    def _import_app(self):
+        """
+        WHAT: Imports app.py from its path (it lives in the repo root, not in the package).
+        """
+        if "app" in sys.modules:
+            return sys.modules["app"]
+        spec = importlib.util.spec_from_file_location("app", self.config.app_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["app"] = module
+        spec.loader.exec_module(module)
+        return module
+
+    def _send_inprocess(self, content_type: str, body: bytes) -> int:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._flask_app.test_client()
+        return client.post(self.config.endpoint, data=body, content_type=content_type).status_code
+
+    def _send_http(self, content_type: str, body: bytes) -> int:
+        for attempt in range(2):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(
+                    self._url.hostname, self._url.port or 80, timeout=self.config.timeout_seconds
+                )
+            try:
+                connection.request("POST", self.config.endpoint, body=body,
+                                   headers={"Content-Type": content_type})
+                response = connection.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed our keep-alive connection: reconnect once.
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+    def _timed_request(self, index: int, scheduled_at: float = None) -> tuple:
+        """
+        WHAT: Sends request 'index' and returns (latency_seconds, status).
+        Status 0 means the request itself failed (connection error, timeout...).
+        """
+        content_type, body = self._body(index)
+        started = time.perf_counter() if scheduled_at is None else scheduled_at
+        try:
+            status = self._send(content_type, body)
+        except Exception as e:
+            logger.warning(f"Request {index} failed: {e}")
+            status = 0
+        return time.perf_counter() - started, status
+
+    def run(self) -> dict:
+        """
+        WHAT: Warms up, runs the load, and returns the results.
+        """
+        for index in range(self.config.warmup_requests):
+            self._timed_request(index)
+
+        concurrency = max(1, self.config.concurrency)
+        total = max(1, self.config.requests)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            if self.config.arrival_rate > 0:
+                samples = self._open_loop(pool, total)
+            else:
+                samples = self._closed_loop(pool, total, concurrency)
+        duration = time.perf_counter() - started
+
+        self.results = self._summarize(samples, duration)
+        logger.info(f"Load test results: {self.results}")
+        return self.results
+
+    def _closed_loop(self, pool: ThreadPoolExecutor, total: int, concurrency: int) -> list:
+        counter = iter(range(total))
+        lock = threading.Lock()
+
+        def client():
+            samples = []
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return samples
+                samples.append(self._timed_request(index))
+
+        futures = [pool.submit(client) for _ in range(concurrency)]
+        return [sample for future in futures for sample in future.result()]
+
+    def _open_loop(self, pool: ThreadPoolExecutor, total: int) -> list:
+        interval = 1.0 / self.config.arrival_rate
+        first = time.perf_counter()
+        futures = []
+        for index in range(total):
+            scheduled_at = first + index * interval
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(self._timed_request, index, scheduled_at))
+        return [future.result() for future in futures]
+
+    def _summarize(self, samples: list, duration: float) -> dict:
+        latencies_ms = np.array([latency for latency, _ in samples]) * 1000.0
+        statuses = [status for _, status in samples]
+        status_counts = {}
+        for status in statuses:
+            status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+        ok = sum(1 for status in statuses if 200 <= status < 300)
+        ok_latencies = np.array(
+            [latency for latency, status in zip(latencies_ms, statuses) if 200 <= status < 300]
+        )
+        measured = ok_latencies if len(ok_latencies) else latencies_ms
+        return {
+            "target": self.config.target,
+            "endpoint": self.config.endpoint,
+            "mode": "open_loop" if self.config.arrival_rate > 0 else "closed_loop",
+            "concurrency": self.config.concurrency,
+            "arrival_rate": self.config.arrival_rate,
+            "payload": self.config.payload,
+            "requests": len(samples),
+            "ok": ok,
+            "error_rate": (len(samples) - ok) / len(samples) if samples else 0.0,
+            "status_counts": status_counts,
+            "duration_seconds": round(duration, 3),
+            "throughput_rps": ok / duration if duration else 0.0,
+            "latency_ms": {
+                "mean": float(np.mean(measured)),
+                "p50": float(np.percentile(measured, 50)),
+                "p90": float(np.percentile(measured, 90)),
+                "p95": float(np.percentile(measured, 95)),
+                "p99": float(np.percentile(measured, 99)),
+                "max": float(np.max(measured)),
+            },
+        }
+
+    def check_thresholds(self, check_regression: bool = True):
+        """
+        WHAT: Compares the error rate and p95 latency with the limits from config.yaml.
+
+        HOW:
+        - A run without a single 2xx response always fails: its latencies
+          are those of fast errors (e.g. 503s), not of predictions.
+        - max_error_rate: Largest allowed share of non-2xx responses (1 = off).
+        - max_p95_ms: Absolute limit (0 = off).
+        - max_p95_regression: Allowed relative increase over the p95 of the
+          accepted baseline ('baseline_path', 0.2 = 20% slower). 0 = off.
+          'check_regression' = False skips it (when accepting a new baseline).
+        - On failure the results are NOT written to 'load_test_scores.json'.
+          They are kept in 'artifacts/load_test/last_run.json' for inspection.
+
+        Raises:
+            LatencyRegression: If a limit is broken.
+        """
+        p95 = self.results["latency_ms"]["p95"]
+        problems = []
+        if not self.results["ok"]:
+            problems.append(f"none of the {self.results['requests']} requests succeeded "
+                            f"(status counts {self.results['status_counts']})")
+        error_rate = self.results["error_rate"]
+        if error_rate > self.config.max_error_rate:
+            problems.append(f"error rate {error_rate:.1%} is above the {self.config.max_error_rate:.1%} limit")
+        if self.config.max_p95_ms and p95 > self.config.max_p95_ms:
+            problems.append(f"p95 {p95:.1f} ms is above the {self.config.max_p95_ms:.1f} ms limit")
+
+        baseline = None
+        if check_regression and self.config.max_p95_regression:
+            if self.config.baseline_path.exists():
+                with open(self.config.baseline_path) as f:
+                    baseline = json.load(f).get("latency_ms", {}).get("p95")
+            if not baseline:
+                logger.warning(
+                    f"No latency baseline in {self.config.baseline_path}: the regression check is "
+                    f"skipped. Accept one with 's6_load_test.py --accept-baseline'."
+                )
+        if baseline:
+            self.results["baseline_p95_ms"] = baseline
+            limit = baseline * (1.0 + self.config.max_p95_regression)
+            if p95 > limit:
+                problems.append(
+                    f"p95 {p95:.1f} ms regressed more than {self.config.max_p95_regression:.0%} "
+                    f"over the baseline {baseline:.1f} ms"
+                )
+
+        save_json(path=self.config.root_dir / "last_run.json", data=self.results)
+        if problems:
+            raise LatencyRegression("; ".join(problems))
+
+    def save_scores(self):
+        save_json(path=self.config.scores_path, data=self.results)
+
+    def accept_baseline(self):
+        """
+        WHAT: Makes this run the p95 baseline later runs are compared against.
+        """
+        save_json(path=self.config.baseline_path, data=self.results)
+        logger.info(
+            f"Accepted p95 {self.results['latency_ms']['p95']:.1f} ms as the new baseline "
+            f"({self.config.baseline_path}) - commit it"
+        )
+
+
+def _serving_config_for(model_path: Path):
+    """
+    WHAT: The 'serving' config, but pointing at the model under test.
+    """
+    serving_config = ConfigurationManager().get_serving_config()
+    model_field = "tflite_model_path" if serving_config.backend == "tflite" else "model_path"
+    return replace(serving_config, **{model_field: Path(model_path)})
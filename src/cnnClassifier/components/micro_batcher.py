@@ -0,0 +1,254 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, List
+import numpy as np
+from cnnClassifier import logger
+from cnnClassifier.components.serving_metrics import get_serving_metrics
+from cnnClassifier.components.admission import (Overloaded, DeadlineExceeded, record_expired,
+                                                record_rejected, time_left)
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Micro-Batching" Component for serving.
+#
+# Every '/predict' call used to run the model on a batch of exactly ONE image.
+# VGG16 is mostly big matrix multiplications, and those are MUCH more
+# efficient on a batch of many images than on one image at a time.
+#
+# The MicroBatcher sits between the Flask routes and the model:
+# 1. Each request puts its (224, 224, 3) image into a queue and waits.
+# 2. A background thread collects queued images until the batch is full OR
+#    a short deadline (a few milliseconds) expires.
+# 3. It stacks them into ONE (N, 224, 224, 3) tensor and runs the model once.
+# 4. Each waiting request gets back its own row of the result.
+#
+# The queue is bounded ('max_queue_size'): when it is full, submit() fails
+# at once instead of letting the backlog grow. Requests whose deadline has
+# passed while queued are dropped before the model runs.
+# -----------------------------------------------------------------------------
+
+
+class _PendingItem:
+    """
+    WHAT: One queued request: its input, the Future its caller waits on,
+    when it was queued (to measure time spent waiting for a batch) and its
+    deadline (time.monotonic() seconds, or None).
+    """
+    __slots__ = ("array", "future", "enqueued_at", "deadline")
+
+    def __init__(self, array: np.ndarray, deadline: float = None):
+        self.array = array
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.deadline = deadline
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 max_queue_size: int = 0):
+        """
+        WHAT: Initializes the batcher.
+
+        ARGS:
+        - predict_fn: Runs the model on a (N, ...) batch and returns N rows.
+        - max_batch_size: Flush as soon as this many requests are queued.
+        - max_wait_ms: Flush after this long, even if the batch is not full.
+          This is the most latency batching can ever add to a request.
+        - max_queue_size: Reject new requests when this many are waiting (0 = no limit).
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue_size = max(0, int(max_queue_size))
+
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._worker = None
+        self._stop_event = threading.Event()
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._items = 0
+        self._batches = 0
+        self._queue_wait_seconds = 0.0
+        self._rejected = 0
+        self._expired = 0
+
+    def start(self):
+        """
+        WHAT: Starts the background thread that forms and runs the batches.
+        """
+        if self._worker is None or not self._worker.is_alive():
+            self._stop_event.clear()
+            self._worker = threading.Thread(
+                target=self._run, name="micro-batcher", daemon=True
+            )
+            self._worker.start()
+        return self
+
+    def stop(self):
+        """
+        WHAT: Stops the background thread (requests still queued are failed).
+        """
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout=1.0)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item.future.set_running_or_notify_cancel():
+                item.future.set_exception(RuntimeError("MicroBatcher stopped"))
+
+    def submit(self, array: np.ndarray, deadline: float = None) -> Future:
+        """
+        WHAT: Queues ONE preprocessed image and returns a Future for its result row.
+
+        Raises:
+            Overloaded: If the queue is full (never blocks).
+        """
+        if self._worker is None:
+            self.start()
+        item = _PendingItem(array, deadline)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            record_rejected("batch_queue_full")
+            raise Overloaded("batch queue is full")
+        return item.future
+
+    def predict(self, array: np.ndarray, timeout: float = None, deadline: float = None) -> np.ndarray:
+        """
+        WHAT: Blocking helper - queues the image and waits for its result row.
+
+        Raises:
+            DeadlineExceeded: If the deadline passes before the result is ready.
+        """
+        future = self.submit(array, deadline)
+        remaining = time_left(deadline)
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        try:
+            return future.result(timeout=max(0.0, timeout) if timeout is not None else None)
+        except FutureTimeout:
+            future.cancel()
+            if deadline is not None:
+                record_expired("batch_wait")
+                raise DeadlineExceeded("batch_wait")
+            raise
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        """
+        WHAT: Returns the batching metrics.
+
+        KEY NUMBERS:
+        - mean_batch_size: The batch size we actually achieve. If this stays
+          near 1 under load, 'max_wait_ms' is too small.
+        - batch_size_histogram: How many batches had each size.
+        - mean_queue_wait_ms: Average time a request waited for its batch.
+        - rejected / expired: Requests turned away because the queue was full /
+          dropped because their deadline passed before inference.
+        """
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "mean_queue_wait_ms": (1000.0 * self._queue_wait_seconds / self._items) if self._items else 0.0,
+                "queue_depth": self.queue_depth,
+                "max_queue_size": self.max_queue_size,
+                "rejected": self._rejected,
+                "expired": self._expired,
+            }
+
+    def _collect(self) -> List[_PendingItem]:
+        """
+        WHAT: Blocks for the first request, then gathers more until the batch is
+        full or the max-wait deadline expires.
+        """
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drop_expired(self, batch: List[_PendingItem]) -> List[_PendingItem]:
+        """
+        WHAT: Removes requests whose caller gave up (cancelled) or whose deadline
+        has passed, so the model only runs for requests someone still waits for.
+        """
+        now = time.monotonic()
+        live = []
+        expired = 0
+        for item in batch:
+            # Marks the Future as running, so a caller can no longer cancel it
+            # (False = the caller already gave up and cancelled it).
+            if not item.future.set_running_or_notify_cancel():
+                continue
+            if item.deadline is not None and now >= item.deadline:
+                expired += 1
+                record_expired("batch_queue")
+                item.future.set_exception(DeadlineExceeded("batch_queue"))
+                continue
+            live.append(item)
+        if expired:
+            with self._stats_lock:
+                self._expired += expired
+        return live
+
+    def _run(self):
+        """
+        WHAT: The background loop: collect -> stack -> predict -> hand out results.
+        """
+        while not self._stop_event.is_set():
+            batch = self._drop_expired(self._collect())
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                inputs = np.stack([item.array for item in batch])
+                outputs = self.predict_fn(inputs)
+            except Exception as e:
+                logger.exception(f"Batch of {len(batch)} failed: {e}")
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            queue_wait = get_serving_metrics().histogram(
+                "stage_seconds", "Time spent in each stage of the prediction path", stage="queue_wait"
+            )
+            for item, row in zip(batch, outputs):
+                queue_wait.observe(started - item.enqueued_at)
+                item.future.set_result(row)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._queue_wait_seconds += sum(started - item.enqueued_at for item in batch)
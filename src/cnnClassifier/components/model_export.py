@@ -0,0 +1,214 @@
+import os
+import random
+import threading
+import numpy as np
+import tensorflow as tf
+from pathlib import Path
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import ModelExportConfig
+from cnnClassifier.utils.common import save_json, get_size
+from cnnClassifier.components.dataset_manifest import Manifest
+from cnnClassifier.utils.preprocessing import load_pixels, normalize, flow_from_files
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Model Export" Component (runs after Training).
+#
+# We serve on CPU-only machines, where the full-precision Keras VGG16 is slow
+# and uses a lot of memory. This component:
+# 1. Converts 'artifacts/training/model.h5' to TensorFlow Lite (a compact,
+#    fast format for CPU inference).
+# 2. Optionally quantizes it (stores weights as 8-bit integers instead of
+#    32-bit floats -> ~4x smaller and faster on CPU).
+#    For "int8" it calibrates on a sample of our real training images.
+# 3. Compares the accuracy of the exported model against the Keras model on
+#    the validation set, so we can trust the faster model before serving it.
+# -----------------------------------------------------------------------------
+
+# Quantization modes we support (QUANTIZATION in params.yaml).
+# - none: plain float32 TFLite.
+# - dynamic: int8 weights, float activations. No calibration data needed.
+# - float16: float16 weights (half the size, almost no accuracy loss).
+# - int8: int8 weights AND activations, calibrated on real images.
+QUANTIZATION_MODES = ("none", "dynamic", "float16", "int8")
+
+
+class TFLiteModel:
+    """
+    WHAT: Runs a '.tflite' model with the same predict_on_batch() call a Keras model has.
+
+    WHY:
+    - The prediction pipeline can then use either backend without caring which one it got.
+    - The TFLite interpreter is NOT thread-safe, so calls are serialized with a lock
+      (the MicroBatcher already sends one batch at a time anyway).
+    - Loading from 'model_path' lets TFLite memory-map the file, so the weights are
+      read straight from the OS page cache (shared between worker processes).
+    - Resizing the input re-allocates all of the interpreter's tensors, which
+      is slow. The MicroBatcher sends any batch size from 1 to max_batch_size,
+      so batches are padded up to the next power of two (1, 2, 4, 8, ...) and
+      the padding rows are dropped from the output: only those few "bucket"
+      sizes are ever allocated.
+    """
+
+    def __init__(self, model_path: Path, num_threads: int = None):
+        self.interpreter = tf.lite.Interpreter(
+            model_path=str(model_path), num_threads=num_threads or None
+        )
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+
+    def predict_on_batch(self, images: np.ndarray) -> np.ndarray:
+        """
+        WHAT: Predicts a (N, 224, 224, 3) batch and returns (N, CLASSES) probabilities.
+        """
+        images = np.asarray(images, dtype=self._input["dtype"])
+        count = images.shape[0]
+        bucket = self.bucket_size(count)
+        if bucket != count:
+            padding = np.zeros((bucket - count, *images.shape[1:]), dtype=images.dtype)
+            images = np.concatenate([images, padding])
+        with self._lock:
+            if bucket != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], list(images.shape))
+                self.interpreter.allocate_tensors()
+                self._batch_size = bucket
+            self.interpreter.set_tensor(self._input["index"], images)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"])[:count].copy()
+
+    @staticmethod
+    def bucket_size(count: int) -> int:
+        """
+        WHAT: The batch size a batch of 'count' images is padded to (the next power of two).
+        """
+        return 1 << max(0, count - 1).bit_length()
+
+    def predict(self, images: np.ndarray, verbose=0) -> np.ndarray:
+        return self.predict_on_batch(images)
+
+
+class ModelExport:
+    def __init__(self, config: ModelExportConfig):
+        self.config = config
+
+    def load_model(self):
+        """
+        WHAT: Loads the trained Keras model from Stage 3.
+        """
+        self.model = tf.keras.models.load_model(self.config.trained_model_path)
+
+    def _image_paths(self) -> list:
+        """
+        WHAT: Lists (path, class_index) for every TRAINING image of the dataset
+        manifest (calibration must not peek at the validation images we score on).
+        """
+        manifest = Manifest(self.config.manifest_path)
+        rows = manifest.subset("training")
+        return list(zip(manifest.filepaths(rows), manifest.labels(rows)))
+
+    def _load_image(self, path: str) -> np.ndarray:
+        """
+        WHAT: Loads one image exactly like the training generator does
+        (the shared preprocessing: draft-mode decode, bilinear resize, rescale 1./255).
+        """
+        height, width = self.config.params_image_size[:-1]
+        return normalize(load_pixels(path, (width, height)))
+
+    def representative_dataset(self):
+        """
+        WHAT: Yields calibration images for int8 quantization.
+
+        WHY:
+        - To turn float activations into 8-bit integers, the converter must know
+          the range of values each layer actually produces. It learns that by
+          running a few hundred REAL images through the model.
+        - A fixed seed keeps the calibration sample (and the exported model) reproducible.
+        """
+        samples = self._image_paths()
+        random.Random(42).shuffle(samples)
+        for path, _ in samples[:self.config.params_calibration_samples]:
+            yield [self._load_image(path)[np.newaxis, ...].astype(np.float32)]
+
+    def convert(self):
+        """
+        WHAT: Converts the Keras model to TFLite with the configured quantization.
+
+        HOW:
+        - Optimize.DEFAULT turns on weight quantization ("dynamic").
+        - float16: also tells the converter to store weights as float16.
+        - int8: also gives it the representative dataset and restricts it to
+          int8 kernels. Input/output stay float32, so the serving code does not change.
+        """
+        mode = self.config.params_quantization
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"QUANTIZATION must be one of {QUANTIZATION_MODES}, got '{mode}'")
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+        if mode != "none":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if mode == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        elif mode == "int8":
+            converter.representative_dataset = self.representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+        tflite_model = converter.convert()
+        os.makedirs(Path(self.config.tflite_model_path).parent, exist_ok=True)
+        with open(self.config.tflite_model_path, "wb") as f:
+            f.write(tflite_model)
+        logger.info(
+            f"Exported {mode} TFLite model to {self.config.tflite_model_path} "
+            f"({get_size(Path(self.config.tflite_model_path))})"
+        )
+
+    def evaluate(self):
+        """
+        WHAT: Measures how much accuracy the export cost.
+
+        HOW:
+        1. Take the same validation images the Evaluation stage uses
+           (the manifest's validation split, no shuffling).
+        2. Run BOTH models on them, batch by batch.
+        3. Report both accuracies, the delta, and how often the two models agree.
+        4. Save the numbers to 'export_scores.json' (DVC tracks it as a metric).
+        """
+        manifest = Manifest(self.config.manifest_path)
+        rows = manifest.subset("validation")
+        valid_generator = flow_from_files(
+            tf.keras.preprocessing.image.ImageDataGenerator(rescale=1./255),
+            manifest.filepaths(rows),
+            manifest.labels(rows),
+            manifest.class_indices,
+            target_size=self.config.params_image_size[:-1],
+            batch_size=self.config.params_batch_size,
+            shuffle=False,
+        )
+        tflite_model = TFLiteModel(self.config.tflite_model_path)
+
+        keras_correct = tflite_correct = agree = total = 0
+        for _ in range(len(valid_generator)):
+            images, labels = next(valid_generator)
+            truth = np.argmax(labels, axis=1)
+            keras_pred = np.argmax(self.model.predict_on_batch(images), axis=1)
+            tflite_pred = np.argmax(tflite_model.predict_on_batch(images), axis=1)
+            keras_correct += int(np.sum(keras_pred == truth))
+            tflite_correct += int(np.sum(tflite_pred == truth))
+            agree += int(np.sum(keras_pred == tflite_pred))
+            total += len(truth)
+
+        keras_accuracy = keras_correct / total if total else 0.0
+        tflite_accuracy = tflite_correct / total if total else 0.0
+        self.scores = {
+            "quantization": self.config.params_quantization,
+            "keras_accuracy": keras_accuracy,
+            "tflite_accuracy": tflite_accuracy,
+            "accuracy_delta": tflite_accuracy - keras_accuracy,
+            "agreement": agree / total if total else 0.0,
+            "keras_size_bytes": os.path.getsize(self.config.trained_model_path),
+            "tflite_size_bytes": os.path.getsize(self.config.tflite_model_path),
+        }
+        save_json(path=Path(self.config.scores_path), data=self.scores)
+        logger.info(f"Export accuracy delta: {self.scores['accuracy_delta']:+.4f}")
@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+from cnnClassifier import logger
+from cnnClassifier.utils.common import file_sha256
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Model Registry" Component for serving.
+#
+# Loading VGG16 from 'model.h5' takes seconds and hundreds of MB of RAM.
+# Doing that on every '/predict' call is far too slow. The registry:
+# 1. Loads the model ONCE and keeps it in memory (resident).
+# 2. Watches the model file in a background thread.
+# 3. When a new 'model.h5' appears (after '/train' or a deploy), it loads the
+#    new model in the background and swaps it in atomically.
+#
+# Requests always see either the old model or the new one - never a
+# half-loaded model - and no request ever pays the load cost.
+# -----------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """
+    WHAT: A snapshot of the model that is currently being served.
+
+    WHY frozen=True:
+    - The registry replaces the WHOLE snapshot in one assignment.
+    - A request that grabbed a snapshot keeps a consistent (model, version)
+      pair even if a swap happens while it is still predicting.
+
+    FIELDS:
+    - model: The loaded model object (anything with a .predict() method).
+    - version: Short content hash of the model file (e.g. "3f2a9c1b0d4e").
+    - path: Where the model was loaded from.
+    - loaded_at: Unix timestamp of when the load finished.
+    """
+    model: Any
+    version: str
+    path: Path
+    loaded_at: float
+
+
+def file_fingerprint(path: Path) -> tuple:
+    """
+    WHAT: A cheap "did the file change?" signature: (mtime in ns, size).
+
+    WHY: Hashing a multi-hundred-MB file every few seconds would waste CPU.
+    We only compute the real content hash when this signature changes.
+    """
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def load_keras_model(path: Path):
+    """
+    WHAT: Default loader - reads a Keras model from disk.
+
+    WHY the import is inside the function:
+    - TensorFlow is heavy. Only the code that actually loads a model pays for it.
+    """
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+def load_tflite_model(path: Path, num_threads: int = None):
+    """
+    WHAT: Loader for the '.tflite' model exported by the Model Export stage.
+
+    Returns an object with the same predict_on_batch() call as a Keras model.
+    """
+    from cnnClassifier.components.model_export import TFLiteModel
+    return TFLiteModel(path, num_threads=num_threads)
+
+
+class ModelRegistry:
+    def __init__(self, model_path: Path, poll_interval: float = 5.0,
+                 loader: Callable[[Path], Any] = load_keras_model):
+        """
+        WHAT: Initializes the registry (does NOT load the model yet).
+
+        ARGS:
+        - model_path: The model file to serve and watch.
+        - poll_interval: How often (seconds) the watcher checks the file.
+        - loader: Function that turns a path into a model object.
+        """
+        self.model_path = Path(model_path)
+        self.poll_interval = poll_interval
+        self.loader = loader
+
+        self._current: Optional[LoadedModel] = None
+        self._load_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._fingerprint = None
+        # The fingerprint of a file that failed to load: it is not retried
+        # until the file changes again.
+        self._failed_fingerprint = None
+        self._listeners = []
+
+    def add_listener(self, callback: Callable[[LoadedModel], None]):
+        """
+        WHAT: Registers a function to call right after a new model is swapped in.
+
+        WHY:
+        - Anything derived from the old model (e.g. cached predictions) must
+          be thrown away when the model changes.
+        """
+        self._listeners.append(callback)
+
+    def start(self):
+        """
+        WHAT: Loads the model (blocking) and starts the background watcher.
+
+        WHY blocking:
+        - The server should not accept predictions before a model is resident.
+        """
+        if self._current is None:
+            self._load()
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop_event.clear()
+            self._watcher = threading.Thread(
+                target=self._watch, name="model-registry-watcher", daemon=True
+            )
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        """
+        WHAT: Stops the background watcher.
+        """
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.poll_interval + 1)
+
+    def get(self) -> LoadedModel:
+        """
+        WHAT: Returns the current model snapshot.
+
+        HOW:
+        - Reading 'self._current' is a single attribute read, so it is atomic.
+        - If nobody called start() yet, we load the model on first use.
+        """
+        current = self._current
+        if current is None:
+            current = self._load()
+        return current
+
+    @property
+    def version(self) -> Optional[str]:
+        current = self._current
+        return current.version if current is not None else None
+
+    def reload_if_changed(self) -> bool:
+        """
+        WHAT: Checks the model file once and hot-swaps it if it changed.
+
+        HOW:
+        1. Compare the cheap (mtime, size) fingerprint.
+        2. Wait until the file stops changing (a copy may still be in progress).
+        3. Compare the content hash - a 'touch' alone is not a new model.
+        4. Load the new model and swap it in.
+
+        A file that failed to load is skipped until it changes again, so a
+        broken model does not get reloaded (and logged) on every poll.
+
+        Returns:
+            bool: True if a new model was swapped in.
+        """
+        try:
+            fingerprint = file_fingerprint(self.model_path)
+        except FileNotFoundError:
+            return False
+        if fingerprint in (self._fingerprint, self._failed_fingerprint):
+            return False
+
+        # The writer may still be copying the file. Only load once it is stable.
+        time.sleep(min(self.poll_interval, 1.0))
+        try:
+            if file_fingerprint(self.model_path) != fingerprint:
+                return False
+        except FileNotFoundError:
+            return False
+
+        current = self._current
+        if current is not None and file_sha256(self.model_path)[:12] == current.version:
+            self._fingerprint = fingerprint
+            return False
+
+        self._load()
+        return True
+
+    def _load(self) -> LoadedModel:
+        """
+        WHAT: Loads the model from disk and publishes it as the current snapshot.
+
+        WHY the lock:
+        - Only one load runs at a time (first request vs. watcher).
+        - The old model keeps serving while the new one is loading.
+        """
+        with self._load_lock:
+            fingerprint = file_fingerprint(self.model_path)
+            current = self._current
+            if current is not None and fingerprint == self._fingerprint:
+                return current
+
+            version = file_sha256(self.model_path)[:12]
+            start = time.perf_counter()
+            try:
+                model = self.loader(self.model_path)
+            except Exception:
+                self._failed_fingerprint = fingerprint
+                raise
+            self._failed_fingerprint = None
+            loaded = LoadedModel(
+                model=model,
+                version=version,
+                path=self.model_path,
+                loaded_at=time.time(),
+            )
+
+            # The atomic swap: a single reference assignment.
+            self._current = loaded
+            self._fingerprint = fingerprint
+            logger.info(
+                f"Loaded model {self.model_path} (version {version}) "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+            for callback in list(self._listeners):
+                try:
+                    callback(loaded)
+                except Exception as e:
+                    logger.exception(f"Model swap listener failed: {e}")
+            return loaded
+
+    def _watch(self):
+        """
+        WHAT: The background loop that polls the model file.
+        """
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                # A broken new file must never take down the model we are serving.
+                logger.exception(f"Model reload failed, keeping version {self.version}: {e}")
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_model_registry(model_path: Path, poll_interval: float = 5.0,
+                       loader: Callable[[Path], Any] = load_keras_model) -> ModelRegistry:
+    """
+    WHAT: Returns the process-wide registry for a model file.
+
+    WHY:
+    - Every PredictionPipeline in the process should share ONE resident model
+      instead of each loading its own copy.
+    """
+    key = os.path.abspath(model_path)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = ModelRegistry(model_path, poll_interval=poll_interval, loader=loader)
+            _registries[key] = registry
+        return registry
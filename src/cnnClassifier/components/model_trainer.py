@@ -3,7 +3,17 @@ import urllib.request as request
 from zipfile import ZipFile
 import tensorflow as tf
 import time
-from cnnClassifier.entity.config_entity import TrainingConfig
+from cnnClassifier.entity.config_entity import TrainingConfig, TensorCacheConfig
+from cnnClassifier.components.tensor_cache import TensorCache
+from cnnClassifier.components.dataset_manifest import Manifest
+from cnnClassifier.components import tf_data_input
+from cnnClassifier.components.bottleneck_cache import (BottleneckCache, FeatureSequence,
+                                                        cache_key, split_frozen_backbone)
+from cnnClassifier.components.training_checkpoints import TrainingCheckpoint, run_key
+from cnnClassifier.components.distribution import (broadcast_from_chief, broadcast_json, distributed_fit,
+                                                   make_strategy, worker_info)
+from cnnClassifier import logger
+from cnnClassifier.utils.preprocessing import flow_from_files
 from pathlib import Path
 
 # -----------------------------------------------------------------------------
@@ -12,11 +22,99 @@ from pathlib import Path
 # 
 # Its job is to:
 # 1. Load the "Updated Base Model" (VGG16 + New Head) we created in the last step.
-# 2. Load the Images (Data) from the folder.
-# 3. "Teach" the model by showing it the images (Training).
+# 2. Load the Images (Data) listed in the dataset manifest.
+# 3. "Teach" the model by showing it the images (Training), saving a
+#    checkpoint after every epoch (training_checkpoints.py) so a crashed run
+#    resumes where it stopped, and stopping early once it stops improving.
 # 4. Save the final "Trained Model".
+#
+# With DISTRIBUTION_STRATEGY = multi_worker, several processes (one per node)
+# run this same code together (distribution.py): each one trains on its own
+# shard of the images, and only the "chief" writes checkpoints and the model.
 # -----------------------------------------------------------------------------
 
+# Where images come from (INPUT_PIPELINE in params.yaml).
+# - directory: decode the image files on every epoch (flow_from_files()).
+# - tensor_cache: stream the pixels decoded once at ingestion (tensor_cache.py).
+# - tf_data: a parallel, prefetching tf.data pipeline (tf_data_input.py).
+INPUT_PIPELINES = ("directory", "tensor_cache", "tf_data")
+
+
+def open_tensor_cache(cache_dir: Path, manifest_path: Path, image_size: list):
+    """
+    WHAT: Opens the tensor cache of the manifest's images (building it if ingestion did not).
+
+    The cache is 'shared': sweep trials, workers and evaluation may read it at
+    the same time, so only ingestion deletes older versions.
+    """
+    return TensorCache(TensorCacheConfig(
+        root_dir=Path(cache_dir),
+        manifest_path=Path(manifest_path),
+        params_image_size=image_size,
+        decode_workers=os.cpu_count() or 1,
+    ), shared=True).load()
+
+
+def split_generator(config, manifest: Manifest, split: str, shuffle: bool,
+                    image_data_generator, augment: bool = False, batch_size: int = None,
+                    num_shards: int = 1, shard_index: int = 0):
+    """
+    WHAT: The batches of one manifest split ("training" or "validation"),
+    from the input pipeline chosen by INPUT_PIPELINE.
+
+    ARGS:
+    - config: A TrainingConfig or EvaluationConfig.
+    - image_data_generator: Rescales (and, with 'augment', augments) every image.
+    - batch_size: Overrides BATCH_SIZE (a multi-device worker loads one batch per device).
+    - num_shards / shard_index: Only serve every num_shards-th image, starting
+      at shard_index (each worker of a multi-worker job gets its own shard).
+    """
+    if config.params_input_pipeline not in INPUT_PIPELINES:
+        raise ValueError(
+            f"INPUT_PIPELINE must be one of {INPUT_PIPELINES}, "
+            f"got '{config.params_input_pipeline}'"
+        )
+    rows = manifest.subset(split)
+    shard = rows[shard_index::num_shards]
+    batch_size = batch_size or config.params_batch_size
+    if config.params_input_pipeline == "tensor_cache":
+        dataset = open_tensor_cache(config.tensor_cache_dir, config.manifest_path, config.params_image_size)
+        return dataset.sequence(
+            dataset.indices(shard),
+            batch_size=batch_size,
+            shuffle=shuffle,
+            # Without augmentation the Sequence rescales by itself (faster).
+            image_data_generator=image_data_generator if augment else None,
+        )
+    if config.params_input_pipeline == "tf_data":
+        cache_path = Path(config.tf_data_cache_dir) / (
+            f"{split}-{tf_data_input.cache_key(rows, config.params_image_size)}"
+            + (f"-shard{shard_index}of{num_shards}" if num_shards > 1 else "")
+        )
+        return tf_data_input.make_dataset(
+            manifest.filepaths(rows),
+            manifest.labels(rows),
+            num_classes=len(manifest.classes),
+            target_size=config.params_image_size[:-1],
+            batch_size=batch_size,
+            shuffle=shuffle,
+            cache=config.params_tf_data_cache,
+            cache_path=cache_path,
+            image_data_generator=image_data_generator if augment else None,
+            num_shards=num_shards,
+            shard_index=shard_index,
+        )
+    return flow_from_files(
+        image_data_generator,
+        manifest.filepaths(shard),
+        manifest.labels(shard),
+        manifest.class_indices,
+        target_size=config.params_image_size[:-1],
+        batch_size=batch_size,
+        shuffle=shuffle,
+    )
+
+
 class Training:
     def __init__(self, config: TrainingConfig):
         self.config = config
@@ -29,14 +127,40 @@ class Training:
         WHY: 
         - We don't build a new model here. We use the one we already added the 
           custom head to.
+
+        DISTRIBUTED (DISTRIBUTION_STRATEGY):
+        - The strategy is created first, and the model is loaded inside its
+          scope, so its weights are mirrored on every device / worker.
+        - Every update averages the gradients of the global batch
+          (BATCH_SIZE x number of replicas), so LEARNING_RATE is scaled
+          by the number of replicas (linear scaling rule).
         """
-        self.model = tf.keras.models.load_model(
-            self.config.updated_base_model_path
-        )
-        
-        # Re-compile the model to avoid state issues
-        self.model.compile(
-            optimizer=tf.keras.optimizers.SGD(learning_rate=0.01),
+        self.strategy = make_strategy(self.config.params_distribution_strategy)
+        self.num_workers, self.worker_index, self.is_chief = worker_info(self.strategy)
+        self.multi_worker = self.config.params_distribution_strategy == "multi_worker"
+        replicas = self.strategy.num_replicas_in_sync
+        # Images per batch of THIS worker: BATCH_SIZE for each of its devices.
+        self.worker_batch_size = self.config.params_batch_size * max(1, replicas // self.num_workers)
+        self.learning_rate = self.config.params_learning_rate * replicas
+        if replicas > 1:
+            logger.info(
+                f"{self.config.params_distribution_strategy}: worker {self.worker_index} of "
+                f"{self.num_workers}, {replicas} replicas, global batch "
+                f"{self.config.params_batch_size * replicas}, learning rate {self.learning_rate}"
+            )
+
+        with self.strategy.scope():
+            self.model = tf.keras.models.load_model(
+                self.config.updated_base_model_path
+            )
+
+            # Re-compile the model to avoid state issues
+            self._compile(self.model, self.learning_rate)
+
+    @staticmethod
+    def _compile(model: tf.keras.Model, learning_rate: float):
+        model.compile(
+            optimizer=tf.keras.optimizers.SGD(learning_rate=learning_rate),
             loss=tf.keras.losses.CategoricalCrossentropy(),
             metrics=['accuracy']
         )
@@ -55,32 +179,33 @@ class Training:
         KEY CONCEPTS:
         - Rescale=1./255: Neural Networks like small numbers (0 to 1). 
           Images are 0-255. So we divide by 255 to normalize them.
-        - Validation Split=0.20: We keep 20% of data hidden from the model 
-          to test it later (Validation Set).
+        - Validation Split: Which images we keep hidden from the model to test
+          it later (Validation Set) is decided ONCE, in the dataset manifest
+          (VALIDATION_SPLIT in params.yaml). Evaluation uses the same split.
+        - Images are loaded with the shared preprocessing (utils/preprocessing.py),
+          so the model trains on exactly the pixels the web app will send it.
+        - With INPUT_PIPELINE = tensor_cache, those pixels come from the
+          tensor cache instead (decoded once, at ingestion). With tf_data,
+          they are decoded by a parallel tf.data pipeline. Same images,
+          same split, same augmentation.
         """
-
-        datagenerator_kwargs = dict(
-            rescale = 1./255,
-            validation_split=0.20
-        )
-
-        dataflow_kwargs = dict(
-            target_size=self.config.params_image_size[:-1], # (224, 224)
-            batch_size=self.config.params_batch_size,
-            interpolation="bilinear"
-        )
+        self.manifest = manifest = Manifest(self.config.manifest_path)
+        self.train_samples = len(manifest.subset("training"))
+        self.valid_samples = len(manifest.subset("validation"))
 
         # 1. Validation Generator (The "Test" Data)
         # We DO NOT augment validation data. We want to test on "real" images.
-        valid_datagenerator = tf.keras.preprocessing.image.ImageDataGenerator(
-            **datagenerator_kwargs
-        )
+        valid_datagenerator = tf.keras.preprocessing.image.ImageDataGenerator(rescale=1./255)
+
+        # Every worker of a multi-worker job reads only its own shard of the images.
+        self.shards = dict(batch_size=self.worker_batch_size,
+                           num_shards=self.num_workers, shard_index=self.worker_index)
+        self.train_shard_samples = len(manifest.subset("training")[self.worker_index::self.num_workers])
+        self.valid_shard_samples = len(manifest.subset("validation")[self.worker_index::self.num_workers])
 
-        self.valid_generator = valid_datagenerator.flow_from_directory(
-            directory=self.config.training_data,
-            subset="validation",
-            shuffle=False,
-            **dataflow_kwargs
+        self.valid_generator = split_generator(
+            self.config, manifest, "validation", shuffle=False,
+            image_data_generator=valid_datagenerator, **self.shards,
         )
 
         # 2. Training Generator (The "Study" Data)
@@ -94,17 +219,22 @@ class Training:
                 height_shift_range=0.2,
                 shear_range=0.2,
                 zoom_range=0.2,
-                **datagenerator_kwargs
+                rescale=1./255,
             )
         else:
             train_datagenerator = valid_datagenerator
+        self.train_datagenerator = train_datagenerator
 
-        self.train_generator = train_datagenerator.flow_from_directory(
-            directory=self.config.training_data,
-            subset="training",
-            shuffle=True,
-            **dataflow_kwargs
+        self.train_generator = split_generator(
+            self.config, manifest, "training", shuffle=True,
+            image_data_generator=train_datagenerator,
+            augment=self.config.params_is_augmentation,
+            **self.shards,
         )
+        if self.config.params_input_pipeline == "tf_data":
+            # A tf.data pipeline ends after one pass; fit() counts the epochs
+            # with steps_per_epoch instead.
+            self.train_generator = self.train_generator.repeat()
 
     
     @staticmethod
@@ -121,19 +251,205 @@ class Training:
         HOW:
         - steps_per_epoch: How many batches to run in one "Epoch" (Full cycle).
         - model.fit: The command that starts the training process.
+        - Validation runs over ALL validation images every epoch (a full pass,
+          so a tf.data cache of them is completed and reused, never thrown away).
         """
-        self.steps_per_epoch = self.train_generator.samples // self.train_generator.batch_size
-        self.validation_steps = self.valid_generator.samples // self.valid_generator.batch_size
-
-        self.model.fit(
-            self.train_generator,
-            epochs=self.config.params_epochs,
-            steps_per_epoch=self.steps_per_epoch,
-            validation_steps=self.validation_steps,
-            validation_data=self.valid_generator
-        )
+        # Per worker: its shard of the images, in batches of worker_batch_size.
+        self.steps_per_epoch = self.train_samples // self.num_workers // self.worker_batch_size
+
+        if not self.train_on_bottleneck_features():
+            self.fit(
+                self.model,
+                "full",
+                self.train_generator,
+                steps_per_epoch=self.steps_per_epoch,
+                validation_data=self.valid_generator
+            )
 
+        if not self.is_chief:
+            logger.info(f"Worker {self.worker_index} done (the chief saves the model)")
+            return
         self.save_model(
             path=self.config.trained_model_path,
             model=self.model
         )
+
+    def train_on_bottleneck_features(self) -> bool:
+        """
+        WHAT: Trains only the head, on cached backbone features (see bottleneck_cache.py).
+
+        WHEN (otherwise it returns False and train() trains the full model):
+        - BOTTLENECK_CACHE is on,
+        - the backbone is completely frozen (PrepareBaseModel freezes all of VGG16),
+        - AUGMENTATION is off, or AUGMENTED_VIEWS > 0 fixed augmented views
+          of every training image may be cached instead.
+
+        HOW:
+        1. Load (or compute) the features, see bottleneck_features().
+        2. Fit the head on the features for EPOCHS epochs. An epoch covers
+           every cached view of every training image.
+        """
+        parts = self.bottleneck_features()
+        if parts is None:
+            return False
+        head, features, views = parts
+
+        with self.strategy.scope():
+            self._compile(head, self.learning_rate)
+        batch_size = self.worker_batch_size
+        steps = {}
+        if self.multi_worker:
+            # Every worker must run the same number of steps (see distribution.py).
+            steps = dict(steps_per_epoch=self.train_samples // self.num_workers * views // batch_size)
+        self.fit(
+            head,
+            "head",
+            FeatureSequence(*features["training"], batch_size=batch_size, shuffle=True),
+            validation_data=FeatureSequence(*features["validation"], batch_size=batch_size, shuffle=False),
+            **steps,
+        )
+        return True
+
+    def bottleneck_features(self):
+        """
+        WHAT: (head, {split: (features, labels)}, views) for
+        train_on_bottleneck_features(), or None if the head can't be trained
+        on cached features (see its WHEN).
+
+        HOW:
+        1. Split the model into backbone + head (the head shares its layers
+           with self.model, so training it updates the model we save).
+        2. Load the features for this backbone + these images, or compute
+           them once (one backbone pass per image and view).
+        """
+        if not self.config.params_bottleneck_cache:
+            return None
+        augmentation = self.config.params_is_augmentation
+        views = self.config.params_augmented_views if augmentation else 1
+        if views < 1:
+            logger.info("AUGMENTATION is on and AUGMENTED_VIEWS is 0: training the full model")
+            return None
+        with self.strategy.scope():
+            parts = split_frozen_backbone(self.model)
+        if parts is None:
+            logger.info("The backbone is not frozen: training the full model")
+            return None
+        backbone, head = parts
+
+        key = cache_key(backbone, self.manifest.rows, self.config.params_image_size,
+                        views if augmentation else 0)
+        cache_dir = Path(self.config.bottleneck_cache_dir)
+        if self.num_workers > 1:
+            # Each worker caches the features of its own shard.
+            cache_dir = cache_dir / f"worker-{self.worker_index}-of-{self.num_workers}"
+        train_generator = split_generator(
+            self.config, self.manifest, "training", shuffle=False,
+            image_data_generator=self.train_datagenerator, augment=augmentation, **self.shards,
+        )
+        cache = BottleneckCache(cache_dir, backbone, len(self.manifest.classes),
+                                shared=self.config.bottleneck_cache_shared)
+        features = cache.load_or_build(key, {
+            "training": (train_generator, self.train_shard_samples, views),
+            "validation": (self.valid_generator, self.valid_shard_samples, 1),
+        })
+        return head, features, views
+
+    def fit(self, model: tf.keras.Model, mode: str, train_data, **fit_kwargs):
+        """
+        WHAT: model.fit() for EPOCHS epochs, with checkpoints, resume and early stopping.
+
+        HOW:
+        1. The checkpoints are only valid for this base model, these images
+           and these settings ('mode' is "full" or "head": what is trained).
+        2. Resume from the newest valid checkpoint in 'checkpoint_dir' (if
+           any) and only run the remaining epochs.
+        3. Every CHECKPOINT_EVERY epochs save a checkpoint; stop once MONITOR
+           has not improved for EARLY_STOPPING_PATIENCE epochs.
+        4. End with the weights of the best epoch (RESTORE_BEST_WEIGHTS).
+        5. Multi-worker: only the chief reads and writes checkpoints (the
+           workers need not share a filesystem); it sends the restored
+           epoch, state and weights to the other workers (sync_with_chief()),
+           and training runs in distributed_fit().
+        """
+        key = run_key(
+            [self.config.updated_base_model_path, self.config.manifest_path],
+            {
+                "mode": mode,
+                "image_size": self.config.params_image_size,
+                "batch_size": self.config.params_batch_size,
+                # The optimizer state in a checkpoint includes the learning rate.
+                "learning_rate": self.config.params_learning_rate,
+                "augmentation": self.config.params_is_augmentation,
+                "augmented_views": self.config.params_augmented_views,
+                # The replicas decide the global batch and the learning rate.
+                "replicas": self.strategy.num_replicas_in_sync,
+            },
+        )
+        checkpoint = TrainingCheckpoint(
+            self.config.checkpoint_dir,
+            key,
+            every=self.config.params_checkpoint_every,
+            monitor=self.config.params_monitor,
+            patience=self.config.params_early_stopping_patience,
+            min_delta=self.config.params_early_stopping_min_delta,
+            restore_best_weights=self.config.params_restore_best_weights,
+            data=train_data,
+            chief=self.is_chief,
+        )
+        with self.strategy.scope():
+            initial_epoch = checkpoint.restore(model) if self.is_chief else 0
+            if self.multi_worker:
+                initial_epoch = self.sync_with_chief(checkpoint, model)
+        if checkpoint.finished(self.config.params_epochs):
+            logger.info(f"Training already finished at epoch {initial_epoch}, nothing to resume")
+            checkpoint.restore_best(model)
+            return
+        if self.multi_worker:
+            distributed_fit(
+                self.strategy,
+                model,
+                train_data,
+                epochs=self.config.params_epochs,
+                initial_epoch=initial_epoch,
+                callbacks=[checkpoint],
+                **fit_kwargs,
+            )
+            return
+        with self.strategy.scope():
+            model.fit(
+                train_data,
+                epochs=self.config.params_epochs,
+                initial_epoch=initial_epoch,
+                callbacks=[checkpoint],
+                **fit_kwargs,
+            )
+
+    def sync_with_chief(self, checkpoint: TrainingCheckpoint, model: tf.keras.Model) -> int:
+        """
+        WHAT: Gives every worker the checkpoint the chief restored and returns
+        the epoch to continue from.
+
+        WHY:
+        - Only the chief writes checkpoints, so without a shared filesystem
+          the other workers would start at epoch 0 while the chief resumes at
+          epoch N: they would run a different number of steps and wait for
+          each other forever. The early stopping state must match too, or
+          one worker stops while the others keep waiting.
+
+        HOW:
+        1. The chief's checkpoint state (epoch, best score, patience) is
+           broadcast to every worker.
+        2. If the chief resumed, its model weights and optimizer state are
+           broadcast too (in one all-reduce).
+        """
+        checkpoint.state = broadcast_json(self.strategy, checkpoint.state)
+        if checkpoint.state["epoch"]:
+            if not model.optimizer.built:
+                model.optimizer.build(model.trainable_variables)
+            variables = list(model.weights) + list(model.optimizer.variables)
+            for variable, value in zip(variables, broadcast_from_chief(self.strategy, variables)):
+                variable.assign(value)
+            if not self.is_chief:
+                logger.info(f"Worker {self.worker_index} resumed from the chief's checkpoint "
+                            f"(epoch {checkpoint.state['epoch']})")
+        return checkpoint.state["epoch"]
@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+from cnnClassifier import logger
+from cnnClassifier.components.admission import DeadlineExceeded, record_expired, time_left
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Prediction Cache" Component for serving.
+#
+# Our PACS integration often sends the SAME image again (retries, or a second
+# radiologist re-reading a study). Each re-send used to cost a full VGG16
+# forward pass. This cache:
+# 1. Remembers recent results, keyed by a hash of the image bytes + the model version.
+# 2. Keeps at most 'max_entries' results (Least Recently Used are dropped first)
+#    and forgets results older than 'ttl_seconds'.
+# 3. Coalesces identical requests that arrive at the same time ("single-flight"):
+#    only the first one runs the model, the others wait for its answer.
+# 4. Is cleared whenever the Model Registry swaps in a new model.
+# -----------------------------------------------------------------------------
+
+
+class PredictionCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        """
+        WHAT: Initializes an empty cache.
+
+        ARGS:
+        - max_entries: Upper bound on cached results (LRU eviction beyond it).
+        - ttl_seconds: How long a result stays valid. 0 means "no expiry".
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._in_flight = {}  # key -> Future of the computation running right now
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any],
+                       deadline: Optional[float] = None) -> Any:
+        """
+        WHAT: Returns the cached value for 'key', computing it at most once.
+
+        HOW:
+        1. Cached and not expired? -> return it (hit).
+        2. Someone is already computing this key? -> wait for their result (coalesced).
+        3. Otherwise we compute it ourselves (miss) and store it.
+
+        Errors are NOT cached: every waiter gets the exception, and the next
+        request tries again.
+
+        DEADLINES ('deadline' is this caller's time.monotonic() deadline):
+        - A coalesced waiter waits at most until ITS OWN deadline, then raises
+          DeadlineExceeded.
+        - If the computation it waited for failed with DeadlineExceeded, that
+          was the OTHER request's deadline: the waiter tries again itself
+          ('compute' must check its own deadline).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self.ttl_seconds or time.monotonic() - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                self.misses += 1
+                owner = True
+            generation = self._generation
+
+        if not owner:
+            timeout = time_left(deadline)
+            try:
+                return future.result(timeout=None if timeout is None else max(0.0, timeout))
+            except TimeoutError:
+                record_expired("coalesced_wait")
+                raise DeadlineExceeded("coalesced_wait")
+            except DeadlineExceeded:
+                return self.get_or_compute(key, compute, deadline)
+
+        try:
+            value = compute()
+        except Exception as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            # If the model was swapped while we computed, don't store the old answer.
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        future.set_result(value)
+        return value
+
+    def clear(self, *_):
+        """
+        WHAT: Drops every cached result.
+
+        WHY the unused arguments:
+        - This is registered as a Model Registry listener, which passes the
+          newly loaded model. We don't need it - any swap invalidates everything.
+        """
+        with self._lock:
+            dropped = len(self._entries)
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+        logger.info(f"Prediction cache cleared ({dropped} entries)")
+
+    def stats(self) -> dict:
+        """
+        WHAT: Returns the hit/miss counters and the current size.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": ((self.hits + self.coalesced) / lookups) if lookups else 0.0,
+            }
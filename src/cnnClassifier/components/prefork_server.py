@@ -0,0 +1,224 @@
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+from typing import Callable, Optional
+from cnnClassifier import logger
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Pre-fork Server" Component - the production serving mode.
+#
+# 'app.run()' is ONE process, so all Python-side work (decoding, resizing,
+# JSON) is stuck on one CPU core. The pre-fork server:
+# 1. Opens the listening socket ONCE in a master process.
+# 2. Forks N worker processes that all accept connections on that socket
+#    (the OS spreads incoming connections across them).
+# 3. Pins each worker's TensorFlow thread pools, so N workers x M threads
+#    never oversubscribes the machine.
+# 4. Restarts a worker if it dies.
+#
+# IMPORTANT - how the workers share ONE copy of the weights:
+# - TensorFlow's runtime is NOT fork-safe. A process that forks after
+#   TensorFlow has started its thread pools hangs on its first prediction,
+#   so the master never imports TensorFlow and each worker opens the model
+#   itself, after the fork.
+# - The workers serve the "tflite" backend: the TFLite interpreter
+#   memory-maps the .tflite file read-only, so the weights of every worker
+#   are the SAME pages of the OS page cache - one copy in RAM, however many
+#   workers there are. (A Keras model.h5 would be read into every worker's
+#   own memory, so the pre-fork mode requires backend: tflite.)
+# - The master pre-reads the file, so those shared pages are already in RAM
+#   when the first worker starts.
+# What stays per worker: the TensorFlow runtime and the interpreter's
+# activation buffers.
+# -----------------------------------------------------------------------------
+
+
+def configure_tf_threads(intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """
+    WHAT: Sets how many threads TensorFlow may use in THIS process.
+
+    WHY:
+    - By default every TensorFlow process grabs one thread per core. With 4
+      workers on an 8-core box that is 32 busy threads fighting over 8 cores.
+    - intra_op: threads used INSIDE one op (e.g. one big matmul).
+    - inter_op: ops that may run at the same time.
+    - 0 means "let TensorFlow decide".
+
+    HOW:
+    - Must run before TensorFlow executes its first op, so we set both the
+      environment variables (read at startup) and the tf.config values.
+    """
+    if intra_op_threads:
+        os.environ["TF_NUM_INTRAOP_THREADS"] = str(intra_op_threads)
+        os.environ["OMP_NUM_THREADS"] = str(intra_op_threads)
+    if inter_op_threads:
+        os.environ["TF_NUM_INTEROP_THREADS"] = str(inter_op_threads)
+
+    import tensorflow as tf
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+
+def warm_page_cache(path: Path, chunk_size: int = 8 * 1024 * 1024):
+    """
+    WHAT: Reads a file once so the OS keeps it in its (shared) page cache.
+
+    WHY:
+    - The workers memory-map the model file: these cached pages ARE their
+      weights, shared by all of them, and they are in RAM before the first
+      request instead of being faulted in from disk.
+    """
+    try:
+        with open(path, "rb") as f:
+            while f.read(chunk_size):
+                pass
+    except FileNotFoundError:
+        logger.warning(f"Cannot pre-read {path}: file not found")
+
+
+class PreforkServer:
+    def __init__(self, app_factory: Callable, host: str = "0.0.0.0", port: int = 8080,
+                 workers: int = 2, intra_op_threads: int = 0, inter_op_threads: int = 0,
+                 preload_path: Optional[Path] = None):
+        """
+        WHAT: Initializes the server (nothing starts until serve_forever()).
+
+        ARGS:
+        - app_factory: Called INSIDE each worker to build the WSGI app (and load the model).
+        - workers: Number of worker processes.
+        - intra_op_threads / inter_op_threads: TensorFlow threads PER WORKER.
+          0 for intra_op means "share the cores evenly between the workers".
+        - preload_path: The memory-mapped model file the workers serve; the
+          master pre-reads it into the page cache.
+        """
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.workers = max(1, int(workers))
+        cpus = os.cpu_count() or 1
+        self.intra_op_threads = intra_op_threads or max(1, cpus // self.workers)
+        self.inter_op_threads = inter_op_threads or 1
+        self.preload_path = preload_path
+
+        self._socket = None
+        self._children = {}  # pid -> worker index
+        self._stopping = False
+
+    def serve_forever(self):
+        """
+        WHAT: The master loop.
+
+        HOW:
+        1. Bind the socket and pre-read the model file.
+        2. Fork the workers.
+        3. Wait for workers to exit and replace any that die, until SIGTERM/SIGINT.
+        """
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(128)
+        self._socket.set_inheritable(True)
+
+        if self.preload_path is not None:
+            warm_page_cache(self.preload_path)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        logger.info(
+            f"Pre-fork server on {self.host}:{self.port} with {self.workers} workers "
+            f"x {self.intra_op_threads} intra-op / {self.inter_op_threads} inter-op threads"
+        )
+        if self.preload_path is not None and Path(self.preload_path).exists():
+            size_mb = Path(self.preload_path).stat().st_size / 2**20
+            logger.info(
+                f"The workers share one memory-mapped copy of {self.preload_path} ({size_mb:.0f} MB)"
+            )
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while not self._stopping:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            index = self._children.pop(pid, None)
+            if index is None or self._stopping:
+                continue
+            logger.warning(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+            # Don't spin if a worker crashes immediately on startup.
+            time.sleep(1.0)
+            self._spawn(index)
+
+        self._shutdown()
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            # ---- Child (worker) process ----
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            exit_code = 0
+            try:
+                self._run_worker(index)
+            except BaseException as e:
+                logger.exception(f"Worker {index} crashed: {e}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self._children[pid] = index
+
+    def _run_worker(self, index: int):
+        """
+        WHAT: Runs inside a worker: pin threads, build the app, serve on the shared socket.
+        """
+        from werkzeug.serving import make_server
+
+        configure_tf_threads(self.intra_op_threads, self.inter_op_threads)
+        app = self.app_factory()
+        server = make_server(
+            self.host, self.port, app, threaded=True, fd=self._socket.fileno()
+        )
+        logger.info(f"Worker {index} (pid {os.getpid()}) ready")
+        server.serve_forever()
+
+    def _handle_stop(self, signum, frame):
+        """
+        WHAT: SIGTERM/SIGINT handler of the master.
+
+        WHY it signals the workers right away:
+        - os.wait() is automatically retried after a signal, so the master only
+          wakes up once a worker actually exits.
+        """
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _shutdown(self):
+        """
+        WHAT: Stops every worker, waits for them, and closes the socket.
+        """
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self._children):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self._children.clear()
+        if self._socket is not None:
+            self._socket.close()
+        logger.info("Pre-fork server stopped")
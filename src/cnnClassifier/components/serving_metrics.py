@@ -0,0 +1,254 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Serving Metrics" Component.
+#
+# Before, the only signal from '/predict' was a print() of the result, so we
+# could not tell where the time goes: Base64 decode, image decode/resize,
+# waiting for a batch, the model itself, or JSON serialization.
+#
+# This records, on the hot path:
+# - Per-stage timers as histograms (p50 / p95 / p99 are computed from them).
+# - Request counters (by route and HTTP status).
+# - Batch sizes, queue depth, cache counters and the model version.
+#
+# and renders them at '/metrics' in the Prometheus text format.
+#
+# WHY it is cheap:
+# - Recording a value = one binary search over ~15 bucket bounds + a few
+#   integer additions. No samples are stored, so memory never grows.
+# - Percentiles, gauges (queue depth, cache size...) and the text output are
+#   only computed when someone actually scrapes '/metrics'.
+# -----------------------------------------------------------------------------
+
+# Latency bucket upper bounds in seconds (0.5 ms ... 30 s).
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Batch size buckets (1 ... 256 images).
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    WHAT: Counts how many observed values fall into each bucket.
+
+    WHY buckets instead of keeping every value:
+    - Constant memory and O(log buckets) per observation, even after
+      millions of requests.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot = "+Inf"
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q: float, snapshot=None) -> float:
+        """
+        WHAT: Estimates the q-quantile (e.g. 0.95 -> p95) from the bucket counts.
+
+        HOW:
+        - Find the bucket that contains the q-th value, then interpolate
+          linearly inside that bucket (the same method Prometheus uses).
+        """
+        counts, _, total = snapshot or self.snapshot()
+        if total == 0:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count > 0:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index >= len(self.buckets):
+                    return self.buckets[-1]
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class Counter:
+    """
+    WHAT: A number that only goes up (e.g. requests served).
+    """
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+def _label_key(labels: dict) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple, extra: dict = None) -> str:
+    items = list(key) + sorted((extra or {}).items())
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+class ServingMetrics:
+    def __init__(self, prefix: str = "cnn"):
+        """
+        WHAT: A collection of named metrics, each with optional labels.
+
+        ARGS:
+        - prefix: Put in front of every metric name (e.g. "cnn_requests_total").
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # name -> {"type": ..., "help": ..., "series": {label_key: object}}
+        self._families: Dict[str, dict] = {}
+
+    def _series(self, kind: str, name: str, help_text: str, labels: dict, factory: Callable):
+        family = self._families.get(name)
+        key = _label_key(labels)
+        if family is not None:
+            series = family["series"].get(key)
+            if series is not None:
+                return series
+        with self._lock:
+            family = self._families.setdefault(name, {"type": kind, "help": help_text, "series": {}})
+            return family["series"].setdefault(key, factory())
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._series("counter", name, help_text, labels, Counter)
+
+    def histogram(self, name: str, help_text: str = "", buckets=LATENCY_BUCKETS, **labels) -> Histogram:
+        return self._series("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    def gauge(self, name: str, fn: Callable[[], float], help_text: str = "",
+              kind: str = "gauge", **labels):
+        """
+        WHAT: Registers a gauge whose value is read by calling 'fn' at scrape time.
+        (kind="counter" for values that only go up but are counted elsewhere,
+        e.g. the prediction cache's hit counter.)
+
+        WHY a function instead of a stored value:
+        - Things like queue depth are already known by their owner. Asking for
+          them only when scraped costs nothing on the request path.
+        """
+        with self._lock:
+            family = self._families.setdefault(name, {"type": kind, "help": help_text, "series": {}})
+            family["series"][_label_key(labels)] = fn
+
+    @contextmanager
+    def timer(self, name: str, help_text: str = "", **labels):
+        """
+        WHAT: Times the 'with' block and records the seconds in a histogram.
+
+        Example:
+            with metrics.timer("stage_seconds", stage="decode"):
+                data = decode(...)
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name, help_text, **labels).observe(time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        """
+        WHAT: All metrics as a dict (histograms as count / mean / p50 / p95 / p99).
+        """
+        result = {}
+        for name, family in list(self._families.items()):
+            entries = []
+            for key, series in list(family["series"].items()):
+                entry = {"labels": dict(key)}
+                if family["type"] == "histogram":
+                    snap = series.snapshot()
+                    entry["count"] = snap[2]
+                    entry["mean"] = (snap[1] / snap[2]) if snap[2] else 0.0
+                    for q in PERCENTILES:
+                        entry[f"p{int(q * 100)}"] = series.quantile(q, snap)
+                else:
+                    entry["value"] = _read_value(series)
+                entries.append(entry)
+            result[f"{self.prefix}_{name}"] = entries
+        return result
+
+    def render_prometheus(self) -> str:
+        """
+        WHAT: Renders every metric in the Prometheus text exposition format.
+
+        HOW:
+        - Histograms get the standard _bucket / _sum / _count lines, so Prometheus
+          can aggregate them across workers. We also add a '<name>_percentile'
+          gauge with our own p50 / p95 / p99, for people reading '/metrics' directly.
+        """
+        lines = []
+        for name, family in list(self._families.items()):
+            full_name = f"{self.prefix}_{name}"
+            if family["help"]:
+                lines.append(f"# HELP {full_name} {family['help']}")
+            lines.append(f"# TYPE {full_name} {family['type']}")
+            percentile_lines = []
+            for key, series in list(family["series"].items()):
+                if family["type"] == "histogram":
+                    counts, total_sum, total_count = snap = series.snapshot()
+                    cumulative = 0
+                    for bound, bucket_count in zip(list(series.buckets) + ["+Inf"], counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {total_sum}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {total_count}")
+                    for q in PERCENTILES:
+                        percentile_lines.append(
+                            f"{full_name}_percentile{_format_labels(key, {'quantile': q})} "
+                            f"{series.quantile(q, snap)}"
+                        )
+                else:
+                    lines.append(f"{full_name}{_format_labels(key)} {_read_value(series)}")
+            if percentile_lines:
+                lines.append(f"# TYPE {full_name}_percentile gauge")
+                lines.extend(percentile_lines)
+        return "\n".join(lines) + "\n"
+
+
+def _read_value(series) -> float:
+    """
+    WHAT: The current value of a Counter, or of a gauge function (NaN if it fails).
+    """
+    if isinstance(series, Counter):
+        return series.value
+    try:
+        return float(series())
+    except Exception:
+        return float("nan")
+
+
+_metrics = ServingMetrics()
+
+
+def get_serving_metrics() -> ServingMetrics:
+    """
+    WHAT: Returns the process-wide metrics collection (shared by all components).
+    """
+    return _metrics
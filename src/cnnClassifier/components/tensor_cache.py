@@ -0,0 +1,277 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import TensorCacheConfig
+from cnnClassifier.components.dataset_manifest import load_manifest
+from cnnClassifier.utils.common import get_size
+from cnnClassifier.utils.preprocessing import load_pixels, normalize
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Tensor Cache" Component (runs at the end of Data Ingestion).
+#
+# Training and Evaluation used to read, decode and resize every JPEG again on
+# every epoch. The pixels never change, so this component does it ONCE:
+# 1. Decodes every image of the dataset manifest (dataset_manifest.py), with
+#    the shared preprocessing, into ONE packed uint8 array of shape
+#    (N, 224, 224, 3), saved as 'images.npy'.
+# 2. Saves the class of every image ('labels.npy') and an 'index.json' with
+#    the file paths and class names.
+# 3. Names the cache folder after a hash of the source images (their SHA-256
+#    from the manifest) + IMAGE_SIZE, so a changed dataset (or image size)
+#    never reads a stale cache.
+#
+# Training and Evaluation then open 'images.npy' memory-mapped: nothing is
+# loaded up front, the OS pages the pixels in on demand, and a batch of
+# consecutive images is a plain slice of the file (no copy, no decoding).
+# -----------------------------------------------------------------------------
+
+# Bump when the cache layout or the preprocessing changes (invalidates all caches).
+CACHE_VERSION = 1
+
+INDEX_FILE = "index.json"
+IMAGES_FILE = "images.npy"
+LABELS_FILE = "labels.npy"
+
+
+class CachedDataset:
+    """
+    WHAT: A tensor cache opened for reading.
+
+    ATTRIBUTES:
+    - images: (N, H, W, 3) uint8, memory-mapped (read-only).
+    - labels: (N,) class index of every image.
+    - classes / class_indices: class names, as flow_from_directory() reports them.
+    - paths: source file of every image (as written in the manifest).
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        with open(self.cache_dir / INDEX_FILE) as f:
+            self.index = json.load(f)
+        self.images = np.load(self.cache_dir / IMAGES_FILE, mmap_mode="r")
+        self.labels = np.load(self.cache_dir / LABELS_FILE)
+        self.classes = self.index["classes"]
+        self.class_indices = {name: i for i, name in enumerate(self.classes)}
+        self.paths = self.index["paths"]
+        self._row_of = {path: i for i, path in enumerate(self.paths)}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def indices(self, rows: list) -> np.ndarray:
+        """
+        WHAT: The cache rows of some manifest rows (e.g. manifest.subset("validation")).
+        """
+        return np.array([self._row_of[row["path"]] for row in rows], dtype=np.int64)
+
+    def sequence(self, indices: np.ndarray, batch_size: int, shuffle: bool,
+                 image_data_generator=None, seed: int = None):
+        """
+        WHAT: A Keras Sequence that serves (images, one_hot_labels) batches of
+        'indices' - usable everywhere a flow_from_directory() iterator was.
+
+        ARGS:
+        - image_data_generator: Optional ImageDataGenerator whose augmentation
+          and rescaling are applied per image (as flow_from_directory() does).
+          Without one, images are just rescaled to 0-1.
+        """
+        return _sequence_class()(self, indices, batch_size, shuffle, image_data_generator, seed)
+
+
+_sequence_cls = None
+
+
+def _sequence_class():
+    """
+    WHAT: Builds (once) the Keras Sequence class.
+
+    WHY a function:
+    - Data Ingestion builds the cache without TensorFlow installed/imported;
+      only readers need Keras.
+    """
+    global _sequence_cls
+    if _sequence_cls is not None:
+        return _sequence_cls
+
+    import tensorflow as tf
+
+    class TensorCacheSequence(tf.keras.utils.Sequence):
+        """
+        WHAT: Batches straight out of the memory-mapped cache.
+
+        HOW:
+        - No shuffling: a batch is a slice of consecutive rows -> a view of
+          the file, no copy until it is rescaled to float.
+        - Shuffling: indices are reshuffled every epoch; inside a batch they
+          are read in file order (sorted), which keeps disk reads sequential.
+        """
+
+        def __init__(self, dataset, indices, batch_size, shuffle, image_data_generator, seed):
+            super().__init__()
+            self.dataset = dataset
+            self.indices = np.asarray(indices, dtype=np.int64)
+            self.batch_size = batch_size
+            self.shuffle = shuffle
+            self.image_data_generator = image_data_generator
+            self.rng = np.random.default_rng(seed)
+            # The same attributes a DirectoryIterator has.
+            self.samples = len(self.indices)
+            self.classes = dataset.labels[self.indices]
+            self.class_indices = dataset.class_indices
+            self.num_classes = len(dataset.classes)
+            self.filenames = [dataset.paths[i] for i in self.indices]
+            self._order = self.indices.copy()
+            if shuffle:
+                self.rng.shuffle(self._order)
+
+        def __len__(self):
+            return math.ceil(self.samples / self.batch_size)
+
+        def __getitem__(self, batch_index):
+            rows = self._order[batch_index * self.batch_size:(batch_index + 1) * self.batch_size]
+            if self.shuffle:
+                rows = np.sort(rows)
+            if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+                pixels = self.dataset.images[rows[0]:rows[-1] + 1]   # zero-copy slice
+            else:
+                pixels = self.dataset.images[rows]
+
+            if self.image_data_generator is None:
+                batch_x = normalize(pixels)
+            else:
+                batch_x = np.empty(pixels.shape, dtype=np.float32)
+                for i, image in enumerate(pixels):
+                    x = image.astype(np.float32)
+                    params = self.image_data_generator.get_random_transform(x.shape)
+                    x = self.image_data_generator.apply_transform(x, params)
+                    batch_x[i] = self.image_data_generator.standardize(x)
+
+            batch_y = np.zeros((len(rows), self.num_classes), dtype=np.float32)
+            batch_y[np.arange(len(rows)), self.dataset.labels[rows]] = 1.0
+            return batch_x, batch_y
+
+        def on_epoch_end(self):
+            if self.shuffle:
+                self.rng.shuffle(self._order)
+
+    _sequence_cls = TensorCacheSequence
+    return _sequence_cls
+
+
+class TensorCache:
+    def __init__(self, config: TensorCacheConfig, shared: bool = False):
+        """
+        WHAT: Initializes the Tensor Cache.
+
+        ARGS:
+        - config: Where the cache lives, which data it caches, the image size
+          (IMAGE_SIZE in params.yaml) and how many threads decode.
+        - shared: Other processes (sweep trials, the workers of a multi-worker
+          job, evaluation) may be reading other versions' folders right now:
+          never delete them.
+        """
+        self.config = config
+        self.shared = shared
+        self.height, self.width = config.params_image_size[:2]
+
+    def source_key(self, rows: list) -> str:
+        """
+        WHAT: A hash of everything the cached pixels depend on.
+
+        HOW:
+        - The content (SHA-256, already in the manifest) of every image, its
+          path and class, plus IMAGE_SIZE and CACHE_VERSION. Renaming,
+          editing, adding or removing a single image gives a new key.
+        - The train/validation split is NOT part of it: re-splitting the
+          same images reuses the same pixels.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"version": CACHE_VERSION, "image_size": [self.height, self.width]}).encode())
+        for row in rows:
+            digest.update(f"{row['path']}\0{row['class']}\0{row['sha256']}\n".encode())
+        return digest.hexdigest()
+
+    def build(self) -> Path:
+        """
+        WHAT: Makes sure the cache for the current images exists, and returns its folder.
+
+        HOW:
+        1. Read the image list from the manifest and compute the source key.
+        2. If 'root_dir/<key>' already exists, we are done.
+        3. Otherwise decode every image on a thread pool straight into a
+           memory-mapped 'images.npy' (never holding the dataset in RAM),
+           inside a temporary folder (one per process).
+        4. Rename the folder into place (atomic: a reader never sees a
+           half-built cache). If another process was faster, its copy wins.
+        5. Delete caches of older versions of the data, unless the cache
+           is 'shared'.
+        """
+        root_dir = Path(self.config.root_dir)
+        manifest = load_manifest(self.config.manifest_path)
+        key = self.source_key(manifest.rows)
+        cache_dir = root_dir / key[:16]
+        if (cache_dir / INDEX_FILE).exists():
+            logger.info(f"Tensor cache {cache_dir} is up to date ({len(manifest.rows)} images)")
+            return cache_dir
+        samples = list(zip(manifest.filepaths(manifest.rows), manifest.labels(manifest.rows)))
+
+        started = time.perf_counter()
+        tmp_dir = root_dir / f"{key[:16]}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        images = np.lib.format.open_memmap(
+            tmp_dir / IMAGES_FILE, mode="w+", dtype=np.uint8,
+            shape=(len(samples), self.height, self.width, 3),
+        )
+
+        def decode(row: int):
+            images[row] = load_pixels(samples[row][0], (self.width, self.height))
+
+        with ThreadPoolExecutor(max_workers=max(1, self.config.decode_workers)) as pool:
+            list(pool.map(decode, range(len(samples))))
+        images.flush()
+        del images
+
+        np.save(tmp_dir / LABELS_FILE, np.array([label for _, label in samples], dtype=np.int32))
+        with open(tmp_dir / INDEX_FILE, "w") as f:
+            json.dump({
+                "key": key,
+                "version": CACHE_VERSION,
+                "image_size": [self.height, self.width, 3],
+                "classes": manifest.classes,
+                "paths": [row["path"] for row in manifest.rows],
+            }, f)
+        try:
+            os.rename(tmp_dir, cache_dir)
+        except OSError:
+            if not (cache_dir / INDEX_FILE).exists():
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)   # another process was faster
+
+        if not self.shared:
+            for old in root_dir.iterdir():
+                # Other processes' ".tmp-<pid>" folders may still be in use.
+                if old.is_dir() and old != cache_dir and ".tmp-" not in old.name:
+                    shutil.rmtree(old, ignore_errors=True)
+
+        seconds = time.perf_counter() - started
+        logger.info(
+            f"Built tensor cache {cache_dir}: {len(samples)} images "
+            f"({get_size(cache_dir / IMAGES_FILE)}) in {seconds:.1f}s"
+        )
+        return cache_dir
+
+    def load(self) -> CachedDataset:
+        """
+        WHAT: Opens the cache of the current images (building it first if needed).
+        """
+        return CachedDataset(self.build())
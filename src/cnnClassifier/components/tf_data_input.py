@@ -0,0 +1,178 @@
+import hashlib
+import math
+import os
+from pathlib import Path
+import numpy as np
+import tensorflow as tf
+from cnnClassifier.utils.preprocessing import RESCALE, load_pixels
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "tf.data" input pipeline (INPUT_PIPELINE: tf_data in params.yaml).
+#
+# flow_from_directory() (and our flow_from_files()) load every batch in ONE
+# Python thread, so on a many-core training box the model waits for images.
+# tf.data runs the same work as a parallel, prefetching pipeline:
+#
+#   file list -> shard -> decode (parallel) -> cache -> shuffle
+#             -> batch -> augment + rescale (parallel) -> prefetch
+#
+# - Decoding still goes through load_pixels() (the shared preprocessing), so
+#   the model sees the same pixels as with the other pipelines and in serving.
+#   Pillow releases the GIL while it decodes and resizes, so the parallel
+#   calls really run in parallel.
+# - Augmentation runs as TensorFlow ops (Keras preprocessing layers built from
+#   the Training's ImageDataGenerator settings, see augmentation_layers()).
+#   ImageDataGenerator itself transforms one image at a time in Python, which
+#   holds the GIL - in a tf.data map that runs serially, whatever
+#   num_parallel_calls says.
+# - Rescaling is the same float32 multiply as ImageDataGenerator(rescale=1./255),
+#   the target size and class indices come from the same manifest.
+# -----------------------------------------------------------------------------
+
+# Where decoded images are kept between epochs (TF_DATA_CACHE in params.yaml).
+# - none: decode again every epoch.
+# - memory: keep the decoded uint8 images in RAM after the first epoch.
+# - disk: write them to a cache file (reused by later runs on the same images).
+CACHE_MODES = ("none", "memory", "disk")
+
+
+def cache_key(rows: list, image_size: list) -> str:
+    """
+    WHAT: A short hash of the images (paths + SHA-256) and IMAGE_SIZE.
+
+    WHY:
+    - A tf.data cache file does not know when the images change. Naming the
+      file after this key means a changed dataset never reads a stale cache.
+    """
+    digest = hashlib.sha256(str(list(image_size)).encode())
+    for row in rows:
+        digest.update(f"{row['path']}\0{row['sha256']}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def augmentation_layers(image_data_generator, target_size: list,
+                        seed: int = None) -> tf.keras.Sequential:
+    """
+    WHAT: The random transforms of an ImageDataGenerator as Keras
+    preprocessing layers, which run as TensorFlow ops on whole batches.
+
+    HOW (ImageDataGenerator setting -> layer):
+    - rotation_range (degrees)           -> RandomRotation
+    - width/height_shift_range           -> RandomTranslation (fractions; pixels are converted)
+    - shear_range (degrees)              -> RandomShear (along x, like the generator)
+    - zoom_range ([lower, upper])        -> RandomZoom (same factor range on both axes)
+    - horizontal_flip / vertical_flip    -> RandomFlip
+    - fill_mode / cval                   -> the layers' fill_mode / fill_value
+    Every image gets its own random transform, as with the generator.
+    Settings that have no layer here (brightness, channel shift, feature-wise
+    normalization, preprocessing_function) raise ValueError instead of being
+    silently dropped. Rescaling is left to the caller.
+    """
+    generator = image_data_generator
+    unsupported = [
+        name for name, off in (
+            ("featurewise_center", False), ("samplewise_center", False),
+            ("featurewise_std_normalization", False), ("samplewise_std_normalization", False),
+            ("zca_whitening", False), ("channel_shift_range", 0.0),
+            ("brightness_range", None), ("preprocessing_function", None),
+        ) if getattr(generator, name, off) not in (off, 0)
+    ]
+    if unsupported:
+        raise ValueError(f"The tf_data pipeline cannot augment with {unsupported}")
+
+    height, width = target_size[:2]
+    fill = dict(fill_mode=generator.fill_mode, fill_value=float(generator.cval))
+
+    def fraction(shift, size):
+        return shift / size if shift >= 1 else shift
+
+    layers = []
+    flip = ("horizontal_and_vertical" if generator.horizontal_flip and generator.vertical_flip
+            else "horizontal" if generator.horizontal_flip
+            else "vertical" if generator.vertical_flip else None)
+    if flip:
+        layers.append(tf.keras.layers.RandomFlip(flip, seed=seed))
+    if generator.rotation_range:
+        layers.append(tf.keras.layers.RandomRotation(generator.rotation_range / 360.0, seed=seed, **fill))
+    if generator.width_shift_range or generator.height_shift_range:
+        layers.append(tf.keras.layers.RandomTranslation(
+            fraction(generator.height_shift_range, height),
+            fraction(generator.width_shift_range, width),
+            seed=seed, **fill,
+        ))
+    if generator.shear_range:
+        layers.append(tf.keras.layers.RandomShear(
+            x_factor=math.tan(math.radians(generator.shear_range)), seed=seed, **fill,
+        ))
+    lower, upper = generator.zoom_range
+    if (lower, upper) != (1, 1):
+        # The generator samples how much of the image to show (>1 = zoom out);
+        # RandomZoom takes the same range shifted by 1 (>0 = zoom out).
+        zoom = (lower - 1.0, upper - 1.0)
+        layers.append(tf.keras.layers.RandomZoom(zoom, zoom, seed=seed, **fill))
+    return tf.keras.Sequential(layers)
+
+
+def make_dataset(filepaths: list, labels: list, num_classes: int, target_size: list,
+                 batch_size: int, shuffle: bool, cache: str = "none", cache_path: Path = None,
+                 image_data_generator=None, num_shards: int = 1, shard_index: int = 0,
+                 seed: int = None) -> tf.data.Dataset:
+    """
+    WHAT: Builds the tf.data pipeline for a list of image files.
+
+    ARGS:
+    - target_size: (height, width).
+    - cache / cache_path: See CACHE_MODES ('cache_path' is the file for "disk").
+    - image_data_generator: Optional ImageDataGenerator whose augmentation
+      settings are applied to each image as TensorFlow ops (see
+      augmentation_layers()). Without one, images are only rescaled.
+    - num_shards / shard_index: Give every worker of a multi-worker job its
+      own 1/num_shards of the files. Sharding happens on the file list,
+      BEFORE shuffling, so the shards are deterministic and never overlap.
+
+    Returns:
+        tf.data.Dataset: Batches of (float32 images, one-hot float32 labels).
+    """
+    if cache not in CACHE_MODES:
+        raise ValueError(f"TF_DATA_CACHE must be one of {CACHE_MODES}, got '{cache}'")
+    height, width = target_size[:2]
+    autotune = tf.data.AUTOTUNE
+
+    def decode(path):
+        return load_pixels(path.decode(), (width, height))
+
+    def load(path, label):
+        pixels = tf.numpy_function(decode, [path], tf.uint8)
+        pixels.set_shape((height, width, 3))
+        return pixels, label
+
+    augment = None
+    if image_data_generator is not None:
+        augment = augmentation_layers(image_data_generator, target_size, seed=seed)
+
+    def finish(pixels, label):
+        images = tf.cast(pixels, tf.float32)
+        if augment is not None:
+            images = augment(images, training=True)
+        images = images * tf.constant(RESCALE, tf.float32)
+        return images, tf.one_hot(label, num_classes, dtype=tf.float32)
+
+    dataset = tf.data.Dataset.from_tensor_slices(
+        ([os.fspath(path) for path in filepaths], np.asarray(labels, dtype=np.int32))
+    )
+    if num_shards > 1:
+        dataset = dataset.shard(num_shards, shard_index)
+    dataset = dataset.map(load, num_parallel_calls=autotune, deterministic=True)
+
+    if cache == "memory":
+        dataset = dataset.cache()
+    elif cache == "disk":
+        os.makedirs(Path(cache_path).parent, exist_ok=True)
+        dataset = dataset.cache(os.fspath(cache_path))
+
+    if shuffle:
+        dataset = dataset.shuffle(len(filepaths), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(finish, num_parallel_calls=autotune, deterministic=not shuffle)
+    return dataset.prefetch(autotune)
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import math
+import os
+from pathlib import Path
+import numpy as np
+import tensorflow as tf
+from cnnClassifier import logger
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# These are the "Training Checkpoints" used by Training.
+#
+# Training used to save model.h5 only after the LAST epoch: a crash in epoch 4
+# lost epochs 1-3, and training kept going long after the validation loss had
+# stopped improving. This callback:
+# 1. Saves a checkpoint every CHECKPOINT_EVERY epochs: the model weights, the
+#    optimizer state and where the data is (the epoch, the state of the
+#    random generator that shuffles the training batches and the current
+#    batch order).
+# 2. On the next run with the same model + data, resumes from the newest
+#    checkpoint that loads (a half-written or corrupt file is skipped).
+# 3. Stops early once MONITOR (e.g. val_loss) has not improved for
+#    EARLY_STOPPING_PATIENCE epochs, and keeps the weights of the best epoch
+#    (RESTORE_BEST_WEIGHTS) in 'best-<epoch>.npz'. A best file newer than the
+#    checkpoint a run resumes from is deleted, so the best weights always
+#    match the best score in the resumed state.
+#
+# Checkpoints are taken at epoch boundaries, so a resumed run starts at the
+# beginning of the epoch after the checkpoint.
+#
+# LIMITATION: Only the tensor cache Sequence (INPUT_PIPELINE = tensor_cache)
+# exposes its shuffling generator and batch order. The directory iterator and
+# the tf.data pipeline shuffle with their own (unseeded) random state, so a
+# run resumed with them sees a different batch order than an uninterrupted
+# run would have (a warning is logged when that happens).
+# -----------------------------------------------------------------------------
+
+STATE_FILE = "state.json"
+BEST_FILE = "best-{epoch:04d}.npz"
+
+# How many epoch checkpoints to keep (the newest one may be the broken one).
+KEEP_CHECKPOINTS = 2
+
+
+def run_key(files: list, settings: dict) -> str:
+    """
+    WHAT: A hash of what a checkpoint is only valid for.
+
+    ARGS:
+    - files: The inputs (e.g. the base model and the dataset manifest), hashed by content.
+    - settings: Anything else that must not change between runs (e.g. the batch size).
+
+    EPOCHS and the early stopping settings are NOT part of it: raising EPOCHS
+    continues a finished run instead of starting over.
+    """
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode())
+    for path in files:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_npz(path: Path, **arrays):
+    """
+    WHAT: Writes a .npz file atomically (temp file + rename).
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+class TrainingCheckpoint(tf.keras.callbacks.Callback):
+    def __init__(self, checkpoint_dir: Path, key: str, every: int = 1, monitor: str = "val_loss",
+                 patience: int = 0, min_delta: float = 0.0, restore_best_weights: bool = True,
+                 data=None, chief: bool = True):
+        """
+        WHAT: Initializes the checkpoint callback.
+
+        ARGS:
+        - checkpoint_dir: Where the checkpoints live.
+        - key: The run_key() of this run. Checkpoints of another key are deleted.
+        - every: Save a checkpoint every 'every' epochs (and always after the last one).
+        - monitor: The metric that decides the best epoch. Metrics with "loss"
+          in their name are minimized, the others (e.g. val_accuracy) maximized.
+        - patience: Stop after this many epochs without improvement (0 = never stop early).
+        - min_delta: The smallest change of 'monitor' that counts as an improvement.
+        - restore_best_weights: End with the weights of the best epoch instead of the last.
+        - data: The training Sequence; its shuffling generator ('rng') and its
+          batch order ('_order') are saved too. Data without them (the
+          directory iterator, a tf.data pipeline) resumes with a new order.
+        - chief: False on the other workers of a multi-worker job: they never
+          read, write or delete checkpoints (the chief sends them what it
+          restored, see Training.sync_with_chief()).
+        """
+        super().__init__()
+        if every < 1:
+            raise ValueError(f"CHECKPOINT_EVERY must be at least 1, got {every}")
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.key = key
+        self.every = every
+        self.monitor = monitor
+        self.patience = patience
+        self.min_delta = abs(min_delta)
+        self.restore_best_weights = restore_best_weights
+        self.data = data
+        self.chief = chief
+        self.minimize = "loss" in monitor
+        self.state = self._new_state()
+        self._data_state = None
+
+    def _new_state(self) -> dict:
+        return {
+            "key": self.key,
+            "epoch": 0,            # number of finished epochs
+            "best": None,
+            "best_epoch": None,
+            "wait": 0,
+            "stopped": False,
+            "data": None,
+            "history": [],
+        }
+
+    def _checkpoint_paths(self) -> list:
+        """
+        WHAT: The epoch checkpoints, newest first.
+        """
+        if not self.checkpoint_dir.exists():
+            return []
+        return sorted(self.checkpoint_dir.glob("epoch-*.npz"), reverse=True)
+
+    # ------------------------------------------------------------------ resume
+
+    def restore(self, model: tf.keras.Model) -> int:
+        """
+        WHAT: Loads the newest valid checkpoint into 'model' (compiled) and
+        returns the epoch to continue from (0 if there is none).
+
+        HOW:
+        1. Checkpoints are tried newest first; one that can't be read or
+           belongs to another run (key) is skipped.
+        2. Checkpoints of another run are deleted, so they are never mixed
+           with this one.
+        3. The model weights, the optimizer state, the early stopping state
+           and the data generator state and batch order are restored.
+        4. Best weights files written after the checkpoint (by the run that
+           crashed) are deleted: their score is not in the restored state.
+        """
+        for path in self._checkpoint_paths():
+            try:
+                with np.load(path) as checkpoint:
+                    state = json.loads(str(checkpoint["state"]))
+                    if state["key"] != self.key:
+                        logger.info(f"Checkpoints in {self.checkpoint_dir} are from another run, starting over")
+                        if self.chief:
+                            self.clear()
+                        return 0
+                    weights = [checkpoint[f"model_{i}"] for i in range(state["model_weights"])]
+                    optimizer = [checkpoint[f"optimizer_{i}"] for i in range(state["optimizer_weights"])]
+                    order = checkpoint["data_order"] if "data_order" in checkpoint.files else None
+            except Exception as e:
+                logger.warning(f"Skipping unreadable checkpoint {path}: {type(e).__name__}: {e}")
+                continue
+
+            model.set_weights(weights)
+            if not model.optimizer.built:
+                model.optimizer.build(model.trainable_variables)
+            for variable, value in zip(model.optimizer.variables, optimizer):
+                variable.assign(value)
+            self.state = {key: value for key, value in state.items()
+                          if key not in ("model_weights", "optimizer_weights")}
+            rng = getattr(self.data, "rng", None)
+            if rng is not None and state["data"] is not None:
+                rng.bit_generator.state = state["data"]
+            elif self.data is not None and rng is None:
+                logger.warning(
+                    f"{type(self.data).__name__} has no saved shuffling state: the resumed "
+                    f"epochs see a different batch order than an uninterrupted run "
+                    f"(only INPUT_PIPELINE = tensor_cache resumes the exact order)"
+                )
+            if order is not None and getattr(self.data, "_order", None) is not None \
+                    and len(order) == len(self.data._order):
+                self.data._order = order.copy()
+            if self.chief:
+                for epoch, best_path in self._best_paths().items():
+                    if epoch > state["epoch"]:
+                        best_path.unlink(missing_ok=True)
+            logger.info(
+                f"Resumed from checkpoint {path} (epoch {state['epoch']}, "
+                f"best {self.monitor}: {state['best']})"
+            )
+            return state["epoch"]
+        return 0
+
+    def finished(self, epochs: int) -> bool:
+        """
+        WHAT: True if the restored run already stopped early or ran 'epochs' epochs.
+        """
+        return self.state["stopped"] or self.state["epoch"] >= epochs
+
+    def _best_paths(self) -> dict:
+        """
+        WHAT: The best weights files by epoch.
+        """
+        if not self.checkpoint_dir.exists():
+            return {}
+        return {int(path.stem.split("-")[1]): path for path in self.checkpoint_dir.glob("best-*.npz")}
+
+    def _remove_old_best_files(self):
+        """
+        WHAT: Deletes the best weights files that no kept checkpoint refers to.
+
+        The best epoch of an older kept checkpoint is still needed: a resume
+        falls back to it when the newest checkpoint is broken.
+        """
+        keep = {self.state["best_epoch"]}
+        for path in self._checkpoint_paths():
+            try:
+                with np.load(path) as checkpoint:
+                    keep.add(json.loads(str(checkpoint["state"]))["best_epoch"])
+            except Exception:
+                continue
+        for epoch, path in self._best_paths().items():
+            if epoch not in keep:
+                path.unlink(missing_ok=True)
+
+    def clear(self):
+        for path in list(self.checkpoint_dir.glob("*.npz")) + [self.checkpoint_dir / STATE_FILE]:
+            path.unlink(missing_ok=True)
+
+    # ---------------------------------------------------------------- callback
+
+    def _snapshot_data(self):
+        """
+        WHAT: The shuffling generator state and batch order of the training Sequence.
+        """
+        rng = getattr(self.data, "rng", None)
+        order = getattr(self.data, "_order", None)
+        return (
+            rng.bit_generator.state if rng is not None else None,
+            np.array(order) if order is not None else None,
+        )
+
+    def on_epoch_begin(self, epoch, logs=None):
+        # Keras shuffles the Sequence after every epoch AND once when fit()
+        # starts. The checkpoint therefore stores the data state from the
+        # beginning of the epoch: the shuffle at the start of the resumed
+        # fit() then gives exactly the order of the next epoch.
+        self._data_state = self._snapshot_data()
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        state = self.state
+        state["epoch"] = epoch + 1
+        state["history"].append({name: float(value) for name, value in logs.items()})
+
+        current = logs.get(self.monitor)
+        if current is None:
+            logger.warning(f"Early stopping metric '{self.monitor}' is not available (got {sorted(logs)})")
+        elif self._improved(float(current)):
+            state.update(best=float(current), best_epoch=epoch + 1, wait=0)
+            if self.restore_best_weights and self.chief:
+                os.makedirs(self.checkpoint_dir, exist_ok=True)
+                _save_npz(self.checkpoint_dir / BEST_FILE.format(epoch=epoch + 1), **{
+                    f"model_{i}": w for i, w in enumerate(self.model.get_weights())
+                })
+        else:
+            state["wait"] += 1
+            if self.patience and state["wait"] >= self.patience:
+                logger.info(
+                    f"Early stopping after epoch {epoch + 1}: {self.monitor} has not improved "
+                    f"for {state['wait']} epochs (best {state['best']:.4f} at epoch {state['best_epoch']})"
+                )
+                state["stopped"] = True
+                self.model.stop_training = True
+
+        last = epoch + 1 >= self.params.get("epochs", math.inf)
+        if (epoch + 1) % self.every == 0 or last or state["stopped"]:
+            self.save(self.model)
+
+    def _improved(self, current: float) -> bool:
+        best = self.state["best"]
+        if best is None or math.isnan(best):
+            return not math.isnan(current)
+        if self.minimize:
+            return current < best - self.min_delta
+        return current > best + self.min_delta
+
+    def save(self, model: tf.keras.Model):
+        """
+        WHAT: Writes 'epoch-<n>.npz' (weights + optimizer + state + batch order)
+        and a readable 'state.json'.
+
+        Best weights files that no kept checkpoint refers to are deleted.
+        """
+        if not self.chief:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self.state["data"], order = self._data_state or self._snapshot_data()
+        weights = model.get_weights()
+        optimizer = [variable.numpy() for variable in model.optimizer.variables]
+        state = dict(self.state, model_weights=len(weights), optimizer_weights=len(optimizer))
+        extra = {"data_order": order} if order is not None else {}
+
+        path = self.checkpoint_dir / f"epoch-{self.state['epoch']:04d}.npz"
+        _save_npz(
+            path,
+            state=np.array(json.dumps(state, default=int)),
+            **{f"model_{i}": w for i, w in enumerate(weights)},
+            **{f"optimizer_{i}": w for i, w in enumerate(optimizer)},
+            **extra,
+        )
+        tmp_path = self.checkpoint_dir / f"{STATE_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=4, default=int)
+        os.replace(tmp_path, self.checkpoint_dir / STATE_FILE)
+
+        for old in self._checkpoint_paths()[KEEP_CHECKPOINTS:]:
+            old.unlink(missing_ok=True)
+        self._remove_old_best_files()
+        logger.info(f"Saved checkpoint {path}")
+
+    def on_train_end(self, logs=None):
+        self.restore_best(self.model)
+
+    def restore_best(self, model: tf.keras.Model):
+        """
+        WHAT: Loads the weights of the best epoch into 'model' (if RESTORE_BEST_WEIGHTS).
+        """
+        if not self.chief:
+            return
+        if not self.restore_best_weights or self.state["best_epoch"] is None:
+            return
+        best_path = self.checkpoint_dir / BEST_FILE.format(epoch=self.state["best_epoch"])
+        if not best_path.exists():
+            logger.warning(f"Best weights {best_path} are missing, keeping the weights of the last epoch")
+            return
+        with np.load(best_path) as best:
+            model.set_weights([best[f"model_{i}"] for i in range(len(best.files))])
+        logger.info(
+            f"Restored the weights of epoch {self.state['best_epoch']} "
+            f"(best {self.monitor}: {self.state['best']:.4f})"
+        )
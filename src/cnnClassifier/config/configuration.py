@@ -1,7 +1,10 @@
 import os
 from cnnClassifier.constants import *
 from cnnClassifier.utils.common import read_yaml, create_directories
-from cnnClassifier.entity.config_entity import (DataIngestionConfig, PrepareBaseModelConfig, TrainingConfig, EvaluationConfig)
+from cnnClassifier.entity.config_entity import (DataIngestionConfig, PrepareBaseModelConfig, TrainingConfig, EvaluationConfig,
+                                                ModelExportConfig, ServingConfig, TrainingJobConfig,
+                                                BatchScoringConfig, LoadTestConfig, TensorCacheConfig,
+                                                DatasetManifestConfig, DataValidationConfig, SweepConfig)
 
 # -----------------------------------------------------------------------------
 # WHY THIS FILE EXISTS:
@@ -62,7 +65,10 @@ class ConfigurationManager:
             root_dir=config.root_dir,
             source_URL=config.source_URL,
             local_data_file=config.local_data_file,
-            unzip_dir=config.unzip_dir 
+            unzip_dir=config.unzip_dir,
+            source_sha256=config.source_sha256 or None,
+            download_retries=int(config.download_retries),
+            extract_workers=int(config.extract_workers),
         )
 
         return data_ingestion_config
@@ -118,8 +124,26 @@ class ConfigurationManager:
             training_data=Path(training_data),
             params_epochs=self.params.EPOCHS,
             params_batch_size=self.params.BATCH_SIZE,
+            params_learning_rate=float(self.params.LEARNING_RATE),
             params_is_augmentation=self.params.AUGMENTATION,
             params_image_size=self.params.IMAGE_SIZE,
+            params_input_pipeline=self.params.INPUT_PIPELINE,
+            params_tf_data_cache=self.params.TF_DATA_CACHE,
+            tensor_cache_dir=Path(self.config.tensor_cache.root_dir),
+            tf_data_cache_dir=Path(self.config.training.tf_data_cache_dir),
+            manifest_path=Path(self.config.dataset_manifest.manifest_path),
+            params_bottleneck_cache=bool(self.params.BOTTLENECK_CACHE),
+            params_augmented_views=int(self.params.AUGMENTED_VIEWS),
+            bottleneck_cache_dir=Path(training_config.bottleneck_cache_dir),
+            # Only the sweep's trials share the folder (see hyperparameter_sweep.py).
+            bottleneck_cache_shared=False,
+            checkpoint_dir=Path(training_config.checkpoint_dir),
+            params_checkpoint_every=int(self.params.CHECKPOINT_EVERY),
+            params_monitor=self.params.MONITOR,
+            params_early_stopping_patience=int(self.params.EARLY_STOPPING_PATIENCE),
+            params_early_stopping_min_delta=float(self.params.EARLY_STOPPING_MIN_DELTA),
+            params_restore_best_weights=bool(self.params.RESTORE_BEST_WEIGHTS),
+            params_distribution_strategy=self.params.DISTRIBUTION_STRATEGY,
         )
         return training_config  
 
@@ -148,8 +172,277 @@ class ConfigurationManager:
             mlflow_uri="https://dagshub.com/GaneshkrishnaL/mlflow_dvc_cancer_classification.mlflow",
             params_image_size=self.params.IMAGE_SIZE,
             params_batch_size=self.params.BATCH_SIZE,
+            params_input_pipeline=self.params.INPUT_PIPELINE,
+            params_tf_data_cache=self.params.TF_DATA_CACHE,
+            tensor_cache_dir=Path(self.config.tensor_cache.root_dir),
+            tf_data_cache_dir=Path(self.config.training.tf_data_cache_dir),
+            manifest_path=Path(self.config.dataset_manifest.manifest_path),
         )
         return evaluation_config    
 
-    
-        
+    def get_model_export_config(self) -> ModelExportConfig:
+        """
+        WHAT: Returns the ModelExportConfig from our config.yaml file.
+
+        WHY:
+        - The Model Export stage needs the trained model, where to write the
+          TFLite model, the data to calibrate/evaluate on, and the quantization mode.
+
+        HOW:
+        - Reads the 'model_export' section from config.yaml plus the
+          QUANTIZATION / CALIBRATION_SAMPLES params.
+        """
+        export_config = self.config.model_export
+        create_directories([export_config.root_dir])
+        model_export_config = ModelExportConfig(
+            root_dir=Path(export_config.root_dir),
+            trained_model_path=Path(self.config.training.trained_model_path),
+            tflite_model_path=Path(export_config.tflite_model_path),
+            training_data=Path(os.path.join(self.config.artifacts_root, "data_ingestion")),
+            scores_path=Path(export_config.scores_path),
+            params_quantization=str(self.params.QUANTIZATION),
+            params_calibration_samples=int(self.params.CALIBRATION_SAMPLES),
+            params_image_size=self.params.IMAGE_SIZE,
+            params_batch_size=self.params.BATCH_SIZE,
+            manifest_path=Path(self.config.dataset_manifest.manifest_path),
+        )
+        return model_export_config
+
+    def get_serving_config(self) -> ServingConfig:
+        """
+        WHAT: Returns the ServingConfig from our config.yaml file.
+
+        WHY:
+        - The web app (app.py) needs to know which model file to serve,
+          how often to check it for a newer version, how to batch requests,
+          how many worker processes / threads to use, and how much load to
+          admit before rejecting requests.
+
+        HOW:
+        - Reads the 'serving' section from config.yaml.
+        - Converts it into a ServingConfig object.
+        """
+        serving_config = self.config.serving
+        serving_config = ServingConfig(
+            backend=serving_config.backend,
+            model_path=Path(serving_config.model_path),
+            tflite_model_path=Path(serving_config.tflite_model_path),
+            poll_interval=float(serving_config.poll_interval),
+            max_batch_size=int(serving_config.max_batch_size),
+            max_wait_ms=float(serving_config.max_wait_ms),
+            batch_chunk_size=int(serving_config.batch_chunk_size),
+            decode_workers=int(serving_config.decode_workers),
+            cache_max_entries=int(serving_config.cache_max_entries),
+            cache_ttl_seconds=float(serving_config.cache_ttl_seconds),
+            workers=int(serving_config.workers),
+            intra_op_threads=int(serving_config.intra_op_threads),
+            inter_op_threads=int(serving_config.inter_op_threads),
+            warmup_batch_sizes=[int(size) for size in serving_config.warmup_batch_sizes],
+            max_in_flight=int(serving_config.max_in_flight),
+            max_queue_size=int(serving_config.max_queue_size),
+            request_timeout_ms=float(serving_config.request_timeout_ms),
+            retry_after_seconds=float(serving_config.retry_after_seconds),
+            max_request_mb=float(serving_config.max_request_mb),
+        )
+        return serving_config
+
+    def get_training_job_config(self) -> TrainingJobConfig:
+        """
+        WHAT: Returns the TrainingJobConfig from our config.yaml file.
+
+        WHY:
+        - The '/train' route runs training as a background job. It needs to
+          know what command to run, where to keep job logs, and where to copy
+          the trained model so the web app starts serving it.
+
+        HOW:
+        - Reads the 'training_jobs' section, plus the model paths from the
+          'training', 'model_export' and 'serving' sections.
+        - With the "tflite" serving backend, the exported model is promoted instead.
+        """
+        job_config = self.config.training_jobs
+        create_directories([job_config.root_dir])
+        if self.config.serving.backend == "tflite":
+            trained_model_path = self.config.model_export.tflite_model_path
+            serving_model_path = self.config.serving.tflite_model_path
+        else:
+            trained_model_path = self.config.training.trained_model_path
+            serving_model_path = self.config.serving.model_path
+        training_job_config = TrainingJobConfig(
+            root_dir=Path(job_config.root_dir),
+            command=job_config.command,
+            trained_model_path=Path(trained_model_path),
+            serving_model_path=Path(serving_model_path),
+            promote_model=bool(job_config.promote_model),
+        )
+        return training_job_config
+
+    def get_batch_scoring_config(self) -> BatchScoringConfig:
+        """
+        WHAT: Returns the BatchScoringConfig from our config.yaml file.
+
+        WHY:
+        - The offline batch scorer (re-scoring whole archives overnight) needs
+          to know where to write its results, how big its batches and output
+          shards are, and how many images to decode ahead of the model.
+
+        HOW:
+        - Reads the 'batch_scoring' section from config.yaml.
+        """
+        scoring_config = self.config.batch_scoring
+        batch_scoring_config = BatchScoringConfig(
+            root_dir=Path(scoring_config.root_dir),
+            output_format=scoring_config.output_format,
+            batch_size=int(scoring_config.batch_size),
+            shard_size=int(scoring_config.shard_size),
+            decode_workers=int(scoring_config.decode_workers),
+            prefetch_batches=int(scoring_config.prefetch_batches),
+        )
+        return batch_scoring_config
+
+    def get_load_test_config(self) -> LoadTestConfig:
+        """
+        WHAT: Returns the LoadTestConfig from our config.yaml file.
+
+        WHY:
+        - The load test needs to know what to hit (the app in-process, or a
+          running server's URL), which images to send, how hard to push, and
+          which p95 latency counts as a regression.
+
+        HOW:
+        - Reads the 'load_test' section from config.yaml.
+        - In-process runs serve the model the pipeline just produced
+          (the trained model.h5, or the exported model.tflite with the "tflite"
+          serving backend), so 'dvc repro' measures the current model.
+        """
+        load_test_config = self.config.load_test
+        create_directories([load_test_config.root_dir])
+        if self.config.serving.backend == "tflite":
+            model_path = self.config.model_export.tflite_model_path
+        else:
+            model_path = self.config.training.trained_model_path
+        load_test_config = LoadTestConfig(
+            root_dir=Path(load_test_config.root_dir),
+            app_path=Path(load_test_config.app_path),
+            model_path=Path(model_path),
+            target=str(load_test_config.target),
+            endpoint=load_test_config.endpoint,
+            images_dir=Path(load_test_config.images_dir),
+            fallback_image=Path(load_test_config.fallback_image),
+            max_images=int(load_test_config.max_images),
+            payload=load_test_config.payload,
+            bypass_cache=bool(load_test_config.bypass_cache),
+            concurrency=int(load_test_config.concurrency),
+            arrival_rate=float(load_test_config.arrival_rate),
+            requests=int(load_test_config.requests),
+            warmup_requests=int(load_test_config.warmup_requests),
+            timeout_seconds=float(load_test_config.timeout_seconds),
+            scores_path=Path(load_test_config.scores_path),
+            baseline_path=Path(load_test_config.baseline_path),
+            max_error_rate=float(load_test_config.max_error_rate),
+            max_p95_ms=float(load_test_config.max_p95_ms),
+            max_p95_regression=float(load_test_config.max_p95_regression),
+        )
+        return load_test_config
+
+    def get_tensor_cache_config(self) -> TensorCacheConfig:
+        """
+        WHAT: Returns the TensorCacheConfig from our config.yaml file.
+
+        WHY:
+        - The tensor cache decodes the ingested images once, at IMAGE_SIZE,
+          so Training and Evaluation never decode a JPEG again.
+
+        HOW:
+        - Reads the 'tensor_cache' section from config.yaml plus IMAGE_SIZE.
+        """
+        cache_config = self.config.tensor_cache
+        create_directories([cache_config.root_dir])
+        tensor_cache_config = TensorCacheConfig(
+            root_dir=Path(cache_config.root_dir),
+            manifest_path=Path(self.config.dataset_manifest.manifest_path),
+            params_image_size=self.params.IMAGE_SIZE,
+            decode_workers=int(cache_config.decode_workers),
+        )
+        return tensor_cache_config
+
+    def get_dataset_manifest_config(self) -> DatasetManifestConfig:
+        """
+        WHAT: Returns the DatasetManifestConfig from our config.yaml file.
+
+        WHY:
+        - The manifest lists (and splits) the ingested images once, so
+          Training, Evaluation and Model Export all use the same split.
+
+        HOW:
+        - Reads the 'dataset_manifest' section from config.yaml plus the
+          VALIDATION_SPLIT / SPLIT_SEED params.
+        """
+        manifest_config = self.config.dataset_manifest
+        create_directories([manifest_config.root_dir])
+        dataset_manifest_config = DatasetManifestConfig(
+            data_dir=Path(self.config.data_ingestion.unzip_dir),
+            manifest_path=Path(manifest_config.manifest_path),
+            hash_workers=int(manifest_config.hash_workers),
+            params_validation_split=float(self.params.VALIDATION_SPLIT),
+            params_split_seed=int(self.params.SPLIT_SEED),
+        )
+        return dataset_manifest_config
+
+    def get_data_validation_config(self) -> DataValidationConfig:
+        """
+        WHAT: Returns the DataValidationConfig from our config.yaml file.
+
+        WHY:
+        - Data Validation needs the extracted dataset, where to move bad files
+          and write its report, and which images count as valid.
+
+        HOW:
+        - Reads the 'data_validation' section from config.yaml.
+        """
+        validation_config = self.config.data_validation
+        create_directories([validation_config.root_dir, Path(validation_config.cache_path).parent])
+        data_validation_config = DataValidationConfig(
+            root_dir=Path(validation_config.root_dir),
+            data_dir=Path(self.config.data_ingestion.unzip_dir),
+            quarantine_dir=Path(validation_config.quarantine_dir),
+            report_path=Path(validation_config.report_path),
+            cache_path=Path(validation_config.cache_path),
+            workers=int(validation_config.workers),
+            min_image_size=int(validation_config.min_image_size),
+            allowed_modes=list(validation_config.allowed_modes),
+        )
+        return data_validation_config
+
+    def get_sweep_config(self) -> SweepConfig:
+        """
+        WHAT: Returns the SweepConfig from our config.yaml file.
+
+        WHY:
+        - The sweep needs the search space and the successive halving
+          settings (SWEEP in params.yaml), how many trials run at once, and
+          where to write the trials, leaderboard and best params.
+
+        HOW:
+        - Reads the 'sweep' section from config.yaml plus SWEEP and MONITOR.
+        """
+        sweep_config = self.config.sweep
+        sweep_params = self.params.SWEEP
+        create_directories([sweep_config.root_dir])
+        config = SweepConfig(
+            root_dir=Path(sweep_config.root_dir),
+            trials_dir=Path(sweep_config.trials_dir),
+            leaderboard_path=Path(sweep_config.leaderboard_path),
+            best_params_path=Path(sweep_config.best_params_path),
+            workers=int(sweep_config.workers),
+            threads_per_trial=int(sweep_config.threads_per_trial),
+            params_space={name: list(values) if isinstance(values, list) else values
+                          for name, values in sweep_params.SPACE.items()},
+            params_trials=int(sweep_params.TRIALS),
+            params_min_epochs=int(sweep_params.MIN_EPOCHS),
+            params_max_epochs=int(sweep_params.MAX_EPOCHS),
+            params_reduction_factor=int(sweep_params.REDUCTION_FACTOR),
+            params_seed=int(sweep_params.SEED),
+            params_monitor=self.params.MONITOR,
+        )
+        return config
@@ -35,11 +35,17 @@ class DataIngestionConfig:
     - source_URL (str): The link to download the dataset from.
     - local_data_file (Path): The path where the zip file will be saved locally.
     - unzip_dir (Path): Where to extract the unzipped files.
+    - source_sha256 (str): Expected SHA-256 of the zip (None = not pinned).
+    - download_retries (int): How many times to retry (and resume) a failed download.
+    - extract_workers (int): Threads used to unzip the dataset.
     """
     root_dir: Path
     source_URL: str
     local_data_file: Path
     unzip_dir: Path
+    source_sha256: str
+    download_retries: int
+    extract_workers: int
 
 @dataclass(frozen=True)
 class PrepareBaseModelConfig:
@@ -62,8 +68,25 @@ class TrainingConfig:
     training_data: Path
     params_epochs: int
     params_batch_size: int
+    params_learning_rate: float
     params_is_augmentation: bool
     params_image_size: list
+    params_input_pipeline: str
+    params_tf_data_cache: str
+    tensor_cache_dir: Path
+    tf_data_cache_dir: Path
+    manifest_path: Path
+    params_bottleneck_cache: bool
+    params_augmented_views: int
+    bottleneck_cache_dir: Path
+    bottleneck_cache_shared: bool
+    checkpoint_dir: Path
+    params_checkpoint_every: int
+    params_monitor: str
+    params_early_stopping_patience: int
+    params_early_stopping_min_delta: float
+    params_restore_best_weights: bool
+    params_distribution_strategy: str
 
     
 @dataclass(frozen=True)
@@ -73,4 +96,135 @@ class EvaluationConfig:
     all_params: dict
     mlflow_uri: str
     params_image_size: list
-    params_batch_size: int
\ No newline at end of file
+    params_batch_size: int
+    params_input_pipeline: str
+    params_tf_data_cache: str
+    tensor_cache_dir: Path
+    tf_data_cache_dir: Path
+    manifest_path: Path
+
+
+@dataclass(frozen=True)
+class ModelExportConfig:
+    root_dir: Path
+    trained_model_path: Path
+    tflite_model_path: Path
+    training_data: Path
+    scores_path: Path
+    params_quantization: str
+    params_calibration_samples: int
+    params_image_size: list
+    params_batch_size: int
+    manifest_path: Path
+
+
+@dataclass(frozen=True)
+class ServingConfig:
+    backend: str
+    model_path: Path
+    tflite_model_path: Path
+    poll_interval: float
+    max_batch_size: int
+    max_wait_ms: float
+    batch_chunk_size: int
+    decode_workers: int
+    cache_max_entries: int
+    cache_ttl_seconds: float
+    workers: int
+    intra_op_threads: int
+    inter_op_threads: int
+    warmup_batch_sizes: list
+    max_in_flight: int
+    max_queue_size: int
+    request_timeout_ms: float
+    retry_after_seconds: float
+    max_request_mb: float
+
+
+@dataclass(frozen=True)
+class TrainingJobConfig:
+    root_dir: Path
+    command: str
+    trained_model_path: Path
+    serving_model_path: Path
+    promote_model: bool
+
+
+@dataclass(frozen=True)
+class BatchScoringConfig:
+    root_dir: Path
+    output_format: str
+    batch_size: int
+    shard_size: int
+    decode_workers: int
+    prefetch_batches: int
+
+
+@dataclass(frozen=True)
+class LoadTestConfig:
+    root_dir: Path
+    app_path: Path
+    model_path: Path
+    target: str
+    endpoint: str
+    images_dir: Path
+    fallback_image: Path
+    max_images: int
+    payload: str
+    bypass_cache: bool
+    concurrency: int
+    arrival_rate: float
+    requests: int
+    warmup_requests: int
+    timeout_seconds: float
+    scores_path: Path
+    baseline_path: Path
+    max_error_rate: float
+    max_p95_ms: float
+    max_p95_regression: float
+
+
+@dataclass(frozen=True)
+class TensorCacheConfig:
+    root_dir: Path
+    manifest_path: Path
+    params_image_size: list
+    decode_workers: int
+
+
+@dataclass(frozen=True)
+class DatasetManifestConfig:
+    data_dir: Path
+    manifest_path: Path
+    hash_workers: int
+    params_validation_split: float
+    params_split_seed: int
+
+
+@dataclass(frozen=True)
+class DataValidationConfig:
+    root_dir: Path
+    data_dir: Path
+    quarantine_dir: Path
+    report_path: Path
+    cache_path: Path
+    workers: int
+    min_image_size: int
+    allowed_modes: list
+
+
+@dataclass(frozen=True)
+class SweepConfig:
+    root_dir: Path
+    trials_dir: Path
+    leaderboard_path: Path
+    best_params_path: Path
+    workers: int
+    threads_per_trial: int
+    params_space: dict
+    params_trials: int
+    params_min_epochs: int
+    params_max_epochs: int
+    params_reduction_factor: int
+    params_seed: int
+    params_monitor: str
@@ -0,0 +1,96 @@
+import argparse
+from dataclasses import replace
+from pathlib import Path
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.components.batch_scorer import BatchScorer, OUTPUT_FORMATS
+from cnnClassifier.pipeline.prediction import PredictionPipeline
+from cnnClassifier import logger
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the command-line entry point for offline batch scoring.
+#
+# Usage:
+#   python -m cnnClassifier.pipeline.batch_scoring archive/slices/
+#   python -m cnnClassifier.pipeline.batch_scoring manifest.jsonl --format parquet
+#
+# Re-running the same command after an interruption resumes from the first
+# shard that was not finished.
+# -----------------------------------------------------------------------------
+
+STAGE_NAME = "Batch scoring"
+
+
+class BatchScoringPipeline:
+    def __init__(self):
+        pass
+
+    def main(self, source: Path, output_dir: Path = None, output_format: str = None,
+             batch_size: int = None, shard_size: int = None, workers: int = None,
+             model_path: Path = None, overwrite: bool = False):
+        """
+        WHAT: Main execution flow for batch scoring.
+
+        HOW:
+        1. Load Config ('batch_scoring' + 'serving'); command-line options override it.
+        2. Load the model once (the serving model, unless --model is given).
+        3. Run the BatchScorer -> Writes part-*.jsonl / part-*.parquet + summary.json.
+        """
+        config = ConfigurationManager()
+        scoring_config = config.get_batch_scoring_config()
+        overrides = {
+            "output_format": output_format,
+            "batch_size": batch_size,
+            "shard_size": shard_size,
+            "decode_workers": workers,
+        }
+        scoring_config = replace(
+            scoring_config, **{k: v for k, v in overrides.items() if v is not None}
+        )
+
+        serving_config = config.get_serving_config()
+        if model_path is not None:
+            model_field = "tflite_model_path" if serving_config.backend == "tflite" else "model_path"
+            serving_config = replace(serving_config, **{model_field: Path(model_path)})
+
+        classifier = PredictionPipeline(config=serving_config)
+        scorer = BatchScorer(config=scoring_config, classifier=classifier)
+        summary = scorer.run(source, output_dir=output_dir, overwrite=overwrite)
+        logger.info(f"Batch scoring summary: {summary}")
+        return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score a directory or JSONL manifest of CT images.")
+    parser.add_argument("source", type=Path, help="Image directory, or a JSONL manifest with a 'path' per line")
+    parser.add_argument("--output", type=Path, default=None, help="Output directory (default: batch_scoring.root_dir)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=None, help="Output format")
+    parser.add_argument("--batch-size", type=int, default=None, help="Images per model call")
+    parser.add_argument("--shard-size", type=int, default=None, help="Images per output file")
+    parser.add_argument("--workers", type=int, default=None, help="Image decoding threads")
+    parser.add_argument("--model", type=Path, default=None, help="Model file (default: the serving model)")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Start over instead of resuming (deletes only the scorer's own files)")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        logger.info(f"*******************")
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        obj = BatchScoringPipeline()
+        obj.main(
+            source=args.source,
+            output_dir=args.output,
+            output_format=args.format,
+            batch_size=args.batch_size,
+            shard_size=args.shard_size,
+            workers=args.workers,
+            model_path=args.model,
+            overwrite=args.overwrite,
+        )
+        logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
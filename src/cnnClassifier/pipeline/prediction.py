@@ -1,73 +1,354 @@
+import io
+import hashlib
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-import os
+from PIL import Image, UnidentifiedImageError
+from werkzeug.exceptions import BadRequest
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.components.model_registry import get_model_registry, load_keras_model, load_tflite_model
+from cnnClassifier.components.micro_batcher import MicroBatcher
+from cnnClassifier.components.prediction_cache import PredictionCache
+from cnnClassifier.components.serving_metrics import get_serving_metrics, BATCH_SIZE_BUCKETS
+from cnnClassifier.components.admission import check_deadline
+from cnnClassifier.utils import preprocessing
+from cnnClassifier.utils.preprocessing import TARGET_SIZE
 
 # -----------------------------------------------------------------------------
 # WHY THIS FILE EXISTS:
 # This is the "Prediction" Pipeline.
-# 
+#
 # This is what runs when a user uploads an image to the website.
-# 1. It takes the filename of the uploaded image.
-# 2. It loads our trained model.
-# 3. It preprocesses the image (resizes it to 224x224).
+# 1. It takes the uploaded image (raw bytes, a NumPy array, or a filename).
+# 2. It gets our trained model from the Model Registry (loaded once, kept in memory).
+# 3. It preprocesses the image in memory (resizes it to 224x224), with the
+#    same shared code Training uses (cnnClassifier/utils/preprocessing.py).
 # 4. It asks the model for a prediction.
 # 5. It returns the result ("Normal" or "Cancer") to the user.
 # -----------------------------------------------------------------------------
 
+# Class index -> label (flow_from_directory sorts the class folders alphabetically).
+# Class 0 = Adenocarcinoma (Cancer)
+# Class 1 = Normal
+CLASS_LABELS = np.array(['Adenocarcinoma Cancer', 'Normal'])
+
+# Process-wide serving metrics (exposed at '/metrics' by app.py).
+METRICS = get_serving_metrics()
+STAGE_HELP = "Time spent in each stage of the prediction path"
+
+
 class PredictionPipeline:
-    def __init__(self, filename):
+    def __init__(self, filename=None, config=None):
+        """
+        WHAT: Sets up the pipeline and connects it to the shared Model Registry.
+
+        WHY:
+        - The registry is process-wide, so every PredictionPipeline shares the
+          SAME resident model instead of loading VGG16 again.
+        - 'filename' is only needed for the old file-based predict() call.
+          The web app uses predict_bytes(), which never touches the disk.
+        - 'backend' in config.yaml picks the model format:
+          "keras" serves model.h5, "tflite" serves the exported (quantized) model.tflite.
+        """
         self.filename = filename
+        if config is None:
+            config = ConfigurationManager().get_serving_config()
+        self.config = config
+        if config.backend == "tflite":
+            model_path = config.tflite_model_path
+            loader = partial(load_tflite_model, num_threads=config.intra_op_threads or None)
+        elif config.backend == "keras":
+            model_path = config.model_path
+            loader = load_keras_model
+        else:
+            raise ValueError(f"Unknown serving backend '{config.backend}' (use 'keras' or 'tflite')")
+        self.registry = get_model_registry(
+            model_path, poll_interval=config.poll_interval, loader=loader
+        )
+        self.registry.add_listener(self._publish_model_info)
+        if self.registry.version is not None:
+            self._publish_model_info(self.registry.get())
+        self.batcher = None
+        self.cache = None
+
+    def _publish_model_info(self, loaded):
+        """
+        WHAT: Exposes the served model version as 'cnn_model_info{version=...} 1'.
+
+        WHY:
+        - A latency change on a dashboard can then be lined up with the model swap
+          that caused it. Older versions stay listed with value 0.
+        """
+        METRICS.gauge(
+            "model_info",
+            lambda version=loaded.version: 1 if self.registry.version == version else 0,
+            "1 for the model version being served",
+            version=loaded.version, backend=self.config.backend,
+        )
+
+    def enable_batching(self, max_batch_size: int = None, max_wait_ms: float = None):
+        """
+        WHAT: Routes single-image predictions through a shared MicroBatcher.
+
+        WHY:
+        - Concurrent requests (e.g. from a threaded Flask server) are grouped
+          into ONE model call instead of one call per image.
+        - Limits default to the 'serving' section of config.yaml.
+        """
+        self.batcher = MicroBatcher(
+            self.predict_batch,
+            max_batch_size=max_batch_size or self.config.max_batch_size,
+            max_wait_ms=self.config.max_wait_ms if max_wait_ms is None else max_wait_ms,
+            max_queue_size=self.config.max_queue_size,
+        ).start()
+        METRICS.gauge("batch_queue_depth", lambda: self.batcher.queue_depth,
+                      "Requests waiting for the MicroBatcher")
+        return self.batcher
+
+    def enable_cache(self, max_entries: int = None, ttl_seconds: float = None):
+        """
+        WHAT: Turns on the PredictionCache for predict_bytes() / predict_array().
+
+        WHY:
+        - Re-submitted images (retries, second reads) are answered from memory.
+        - The cache is cleared automatically when the registry swaps models.
+        - Limits default to the 'serving' section of config.yaml.
+        """
+        self.cache = PredictionCache(
+            max_entries=max_entries or self.config.cache_max_entries,
+            ttl_seconds=self.config.cache_ttl_seconds if ttl_seconds is None else ttl_seconds,
+        )
+        self.registry.add_listener(self.cache.clear)
+        for counter in ("hits", "misses", "coalesced", "evictions", "invalidations"):
+            METRICS.gauge(f"prediction_cache_{counter}_total",
+                          lambda counter=counter: getattr(self.cache, counter),
+                          f"Prediction cache {counter}", kind="counter")
+        METRICS.gauge("prediction_cache_size", lambda: self.cache.stats()["size"],
+                      "Results currently cached")
+        return self.cache
+
+    def _cached(self, content: bytes, compute, deadline: float = None):
+        """
+        WHAT: Runs 'compute' through the cache (if enabled).
+
+        HOW:
+        - Key = model version + SHA-256 of the image content, so the same image
+          scored by a different model is never served a stale answer.
+        - We return a fresh copy, so a caller can't modify the cached result.
+        - 'deadline' bounds how long we wait for an identical request that is
+          already being computed (see PredictionCache.get_or_compute()).
+        """
+        if self.cache is None:
+            return compute()
+        key = f"{self.registry.get().version}:{hashlib.sha256(content).hexdigest()}"
+        result = self.cache.get_or_compute(key, compute, deadline)
+        return [dict(row) for row in result]
+
+    @staticmethod
+    def to_pixels(img: Image.Image) -> np.ndarray:
+        """
+        WHAT: Turns a PIL image into (224, 224, 3) uint8 pixels
+        (RGB + bilinear resize, exactly like training - see utils/preprocessing.py).
+        """
+        return preprocessing.to_pixels(img, TARGET_SIZE)
+
+    @staticmethod
+    def normalize(pixels: np.ndarray) -> np.ndarray:
+        """
+        WHAT: Scales 0-255 pixels to 0-1 floats (works on one image or a batch).
+
+        WHY: During training, we divided by 255 (rescale=1./255).
+        We MUST do the same here, or the model will see huge numbers it doesn't understand.
+        """
+        return preprocessing.normalize(pixels)
+
+    @classmethod
+    def preprocess(cls, img: Image.Image) -> np.ndarray:
+        """
+        WHAT: Turns a PIL image into the (224, 224, 3) float array the model expects.
+        """
+        return cls.normalize(cls.to_pixels(img))
+
+    @classmethod
+    def decode_pixels(cls, data: bytes) -> np.ndarray:
+        """
+        WHAT: Decodes image bytes (JPG/PNG) in memory into (224, 224, 3) uint8 pixels.
+
+        HOW:
+        - JPEGs are decoded in draft mode (already shrunk towards 224x224 by
+          the decoder), then resized - the same as preprocessing.load_pixels().
+
+        Raises BadRequest (HTTP 400) if 'data' is not a readable image (empty,
+        truncated, not an image at all, or a decompression bomb).
+        """
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                with METRICS.timer("stage_seconds", STAGE_HELP, stage="image_decode"):
+                    preprocessing.draft(img, TARGET_SIZE)
+                    img.load()
+                with METRICS.timer("stage_seconds", STAGE_HELP, stage="resize"):
+                    return cls.to_pixels(img)
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+            raise BadRequest(f"not a readable image ({type(e).__name__})") from e
+
+    @staticmethod
+    def labels_for(probabilities: np.ndarray) -> np.ndarray:
+        """
+        WHAT: Maps a (N, CLASSES) probability matrix to N labels in ONE step.
+
+        HOW:
+        - argmax over axis 1 gives the class index of every row at once.
+        - Indexing CLASS_LABELS with that index array gives all the labels
+          at once (no per-image 'if' branches).
+        """
+        return CLASS_LABELS[np.argmax(probabilities, axis=1)]
+
+    def predict_bytes(self, data: bytes, deadline: float = None):
+        """
+        WHAT: Predicts from the raw bytes of an uploaded image (JPG/PNG).
+
+        WHY:
+        - The bytes are decoded straight from memory. Nothing is written to disk,
+          so two requests running at the same time can never overwrite each other.
+        - 'deadline' (time.monotonic() seconds): if it has already passed, we
+          skip the decode and the model and raise DeadlineExceeded.
+        """
+        def compute():
+            check_deadline(deadline, "before_decode")
+            return self._predict_preprocessed(self.normalize(self.decode_pixels(data)), deadline)
+
+        return self._cached(data, compute, deadline)
+
+    def predict_array(self, array: np.ndarray):
+        """
+        WHAT: Predicts from an image that is already decoded into a NumPy array.
+
+        ARGS:
+        - array: Pixels with shape (H, W, 3) or (H, W), values 0-255.
+          Any size works - it is resized in memory.
+        """
+        array = np.ascontiguousarray(array, dtype=np.uint8)
+        return self._cached(
+            array.tobytes() + str(array.shape).encode(),
+            lambda: self._predict_preprocessed(self.preprocess(Image.fromarray(array))),
+        )
+
+    def predict_many(self, images: list, chunk_size: int = None, workers: int = None,
+                     deadline: float = None) -> list:
+        """
+        WHAT: Predicts a whole series of images (e.g. every slice of a CT study).
+
+        HOW:
+        1. Decode + resize all images in parallel on a thread pool
+           (Pillow releases the GIL while decoding, so threads really run in parallel).
+        2. Run the decoded images through the model in chunks of 'chunk_size'
+           (one forward pass per chunk, and memory stays bounded).
+        3. Map every chunk's argmax to its label in one vectorized step.
+
+        ARGS:
+        - images: List of raw image bytes.
+        - chunk_size / workers: Default to 'batch_chunk_size' / 'decode_workers'
+          from the 'serving' section of config.yaml.
+        - deadline: Checked before decoding and before every chunk; once it has
+          passed, the rest of the series is not scored (DeadlineExceeded).
+
+        Returns:
+            list: One result per image, in order:
+            {"image": label, "probabilities": {label: p, ...}}
+            or {"error": "..."} if that image could not be decoded.
+        """
+        chunk_size = max(1, chunk_size or self.config.batch_chunk_size)
+        workers = max(1, workers or self.config.decode_workers)
+
+        def decode(data):
+            try:
+                return self.decode_pixels(data)
+            except Exception as e:
+                return e
+
+        check_deadline(deadline, "before_decode")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            decoded = list(pool.map(decode, images))
+
+        results = [None] * len(decoded)
+        valid = [i for i, pixels in enumerate(decoded) if not isinstance(pixels, Exception)]
+        for i, pixels in enumerate(decoded):
+            if isinstance(pixels, Exception):
+                results[i] = {"error": f"could not decode image: {getattr(pixels, 'description', pixels)}"}
+
+        for start in range(0, len(valid), chunk_size):
+            indices = valid[start:start + chunk_size]
+            check_deadline(deadline, "before_inference")
+            batch = self.normalize(np.stack([decoded[i] for i in indices]))
+            probabilities = self.predict_batch(batch)
+            labels = self.labels_for(probabilities)
+            for i, label, row in zip(indices, labels.tolist(), probabilities.tolist()):
+                results[i] = {
+                    "image": label,
+                    "probabilities": dict(zip(CLASS_LABELS.tolist(), row)),
+                }
+        return results
 
-    
     def predict(self):
         """
-        WHAT: The main prediction logic.
-        
+        WHAT: The original file-based prediction (reads 'self.filename').
+
         HOW:
-        1. Load Model: We load the trained brain we saved earlier.
-           Note: We use 'model.keras' as it's the modern format we switched to.
-        2. Load Image: We read the image file the user uploaded.
-        3. Preprocess: 
-           - Resize to (224, 224) because that's what VGG16 expects.
-           - Convert to Array: Computers read numbers, not pictures.
-           - Expand Dims: The model expects a "batch" of images, even if it's just one.
-             So we turn (224, 224, 3) into (1, 224, 224, 3).
-        4. Predict: The model gives us probabilities.
-        5. Argmax: We take the highest probability to decide the class.
-        """
-        
-        # Load the trained model
-        # Ideally, this path should be dynamic or from config, but for simplicity:
-        # We check if a local 'model' folder exists (for deployment) or use artifacts
-        model = load_model(os.path.join("model", "model.h5"))
-
-        imagename = self.filename
-        
-        # 1. Load the image with the target size (224x224)
-        test_image = image.load_img(imagename, target_size = (224,224))
-        
-        # 2. Convert image to numpy array
-        test_image = image.img_to_array(test_image)
-        
-        # CRITICAL FIX: Normalize the image!
-        # During training, we divided by 255 (rescale=1./255).
-        # We MUST do the same here, or the model will see huge numbers it doesn't understand.
-        test_image = test_image / 255.0
-        
-        # 3. Add the batch dimension (1, 224, 224, 3)
-        test_image = np.expand_dims(test_image, axis = 0)
-        
-        # 4. Get prediction (returns index of the class with highest probability)
-        result = np.argmax(model.predict(test_image), axis=1)
-        print(result)
-
-        # 5. Interpret the result
-        # Class 1 = Normal
-        # Class 0 = Adenocarcinoma (Cancer)
-        if result[0] == 1:
-            prediction = 'Normal'
-            return [{ "image" : prediction}]
+        - Reads the file once and hands the bytes to predict_bytes().
+        """
+        with open(self.filename, "rb") as f:
+            return self.predict_bytes(f.read())
+
+    def warm_up(self, batch_size: int = 1):
+        """
+        WHAT: Runs the model once on a dummy (all-black) batch of 'batch_size' images.
+
+        WHY:
+        - The first call for a new batch shape is slow (graph tracing, memory
+          allocation). Doing it at startup keeps that spike away from real users.
+        """
+        self.predict_batch(np.zeros((batch_size, *TARGET_SIZE[::-1], 3), dtype=np.float32))
+
+    def predict_batch(self, images: np.ndarray) -> np.ndarray:
+        """
+        WHAT: Runs the model on a whole batch of preprocessed images.
+
+        HOW:
+        1. Get Model: We ask the registry for the current model snapshot.
+           It is already in memory, so this costs nothing.
+        2. predict_on_batch: ONE forward pass for all N images, without the
+           per-call setup overhead of model.predict().
+
+        Returns:
+            np.ndarray: Class probabilities with shape (N, CLASSES).
+        """
+        # Get the resident model (the path comes from the 'serving' section of config.yaml)
+        loaded = self.registry.get()
+        METRICS.histogram("inference_batch_size", "Images per model call",
+                          buckets=BATCH_SIZE_BUCKETS).observe(len(images))
+        with METRICS.timer("stage_seconds", STAGE_HELP, stage="inference", model_version=loaded.version):
+            return np.asarray(loaded.model.predict_on_batch(images))
+
+    def _predict_preprocessed(self, test_image: np.ndarray, deadline: float = None):
+        """
+        WHAT: The main prediction logic, on an already preprocessed image.
+
+        HOW:
+        1. If batching is on, the MicroBatcher merges this image with other
+           concurrent requests and gives us back our own row of probabilities.
+        2. Otherwise, add the batch dimension ((224, 224, 3) -> (1, 224, 224, 3))
+           and run the model directly.
+        3. Map the highest probability to its label (see CLASS_LABELS).
+
+        The MicroBatcher drops the image if 'deadline' passes while it is queued.
+        """
+        if self.batcher is not None:
+            probabilities = self.batcher.predict(test_image, deadline=deadline)[np.newaxis, :]
         else:
-            prediction = 'Adenocarcinoma Cancer'
-            return [{ "image" : prediction}]
\ No newline at end of file
+            check_deadline(deadline, "before_inference")
+            probabilities = self.predict_batch(np.expand_dims(test_image, axis = 0))
+
+        # Get prediction (returns the label of the class with highest probability)
+        prediction = self.labels_for(probabilities)[0]
+        METRICS.counter("predictions_total", "Predictions by label", label=prediction).inc()
+        return [{ "image" : str(prediction)}]
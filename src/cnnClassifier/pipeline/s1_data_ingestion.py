@@ -1,5 +1,8 @@
 from cnnClassifier.config.configuration import ConfigurationManager
 from cnnClassifier.components.data_ingestion import DataIngestion
+from cnnClassifier.components.data_validation import DataValidation
+from cnnClassifier.components.dataset_manifest import DatasetManifest
+from cnnClassifier.components.tensor_cache import TensorCache
 from cnnClassifier import logger
 
 # -----------------------------------------------------------------------------
@@ -32,12 +35,18 @@ class DataIngestionTrainingPipeline:
         3. Initialize the DataIngestion component with that config.
         4. Call download_file() -> Downloads the zip.
         5. Call extract_zip_file() -> Unzips it.
+        6. Validate the images -> Moves corrupt files to a quarantine folder.
+        7. Build the dataset manifest -> Lists every image and splits train/validation once.
+        8. Build the tensor cache -> Decodes every image once for Training/Evaluation.
         """
         config = ConfigurationManager()
         data_ingestion_config = config.get_data_ingestion_config()
         data_ingestion = DataIngestion(config=data_ingestion_config)
         data_ingestion.download_file()
         data_ingestion.extract_zip_file()
+        DataValidation(config=config.get_data_validation_config()).validate()
+        DatasetManifest(config=config.get_dataset_manifest_config()).build()
+        TensorCache(config=config.get_tensor_cache_config()).build()
 
 
 
@@ -1,11 +1,21 @@
+import argparse
+import sys
 from cnnClassifier.config.configuration import ConfigurationManager
 from cnnClassifier.components.model_trainer import Training
+from cnnClassifier.components.distribution import launch_local_workers
 from cnnClassifier import logger
 
 
 
 STAGE_NAME = "Training"
 
+# -----------------------------------------------------------------------------
+# Examples:
+#   python src/cnnClassifier/pipeline/s3_model_trainer.py
+#   # DISTRIBUTION_STRATEGY: multi_worker, as 2 worker processes on localhost:
+#   python src/cnnClassifier/pipeline/s3_model_trainer.py --local-workers 2
+# -----------------------------------------------------------------------------
+
 
 
 class ModelTrainingPipeline:
@@ -20,16 +30,40 @@ class ModelTrainingPipeline:
         training.train_valid_generator()
         training.train()
 
+    def launch_local_workers(self, num_workers: int):
+        """
+        WHAT: Re-runs this script as 'num_workers' multi-worker processes on localhost.
+        """
+        training_config = ConfigurationManager().get_training_config()
+        if training_config.params_distribution_strategy != "multi_worker":
+            raise ValueError(
+                "--local-workers needs DISTRIBUTION_STRATEGY: multi_worker in params.yaml, "
+                f"got '{training_config.params_distribution_strategy}'"
+            )
+        exit_code = launch_local_workers(num_workers, [sys.executable, __file__])
+        if exit_code != 0:
+            raise RuntimeError(f"A training worker failed with exit code {exit_code}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the model.")
+    parser.add_argument("--local-workers", type=int, default=0,
+                        help="Run N multi-worker training processes on localhost")
+    return parser.parse_args(argv)
+
 
 
 if __name__ == '__main__':
+    args = parse_args()
     try:
         logger.info(f"*******************")
         logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
         obj = ModelTrainingPipeline()
-        obj.main()
+        if args.local_workers:
+            obj.launch_local_workers(args.local_workers)
+        else:
+            obj.main()
         logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
     except Exception as e:
         logger.exception(e)
         raise e
-        
\ No newline at end of file
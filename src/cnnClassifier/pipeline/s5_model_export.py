@@ -0,0 +1,51 @@
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.components.model_export import ModelExport
+from cnnClassifier import logger
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Pipeline" script for Stage 5 (Model Export).
+#
+# It turns the trained Keras model into a fast, quantized TFLite model for
+# CPU serving, and checks how much accuracy that costs.
+# 1. It gets the configuration.
+# 2. It converts the model.
+# 3. It compares the accuracy of both models and saves 'export_scores.json'.
+# -----------------------------------------------------------------------------
+
+STAGE_NAME = "Model Export stage"
+
+
+class ModelExportPipeline:
+    def __init__(self):
+        pass
+
+    def main(self):
+        """
+        WHAT: Main execution flow for the export.
+
+        HOW:
+        1. Load Config.
+        2. Load the trained Keras model.
+        3. Run convert() -> Writes model.tflite.
+        4. Run evaluate() -> Writes export_scores.json (accuracy delta).
+        """
+        config = ConfigurationManager()
+        export_config = config.get_model_export_config()
+        model_export = ModelExport(config=export_config)
+        model_export.load_model()
+        model_export.convert()
+        model_export.evaluate()
+
+
+
+if __name__ == '__main__':
+    try:
+        logger.info(f"*******************")
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        obj = ModelExportPipeline()
+        obj.main()
+        logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
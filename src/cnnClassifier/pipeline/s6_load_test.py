@@ -0,0 +1,83 @@
+import argparse
+from dataclasses import replace
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.components.load_test import LoadTest
+from cnnClassifier import logger
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Pipeline" script for Stage 6 (Load Test).
+#
+# It measures how much traffic the web app can take with the model we just
+# trained, and fails the pipeline if p95 latency got worse.
+# 1. It gets the configuration ('load_test' in config.yaml; flags override it).
+# 2. It starts the app (in-process) or connects to a running server.
+# 3. It fires the requests and saves 'load_test_scores.json'.
+# 4. With --accept-baseline, it also makes this run the p95 baseline (commit
+#    'load_test_baseline.json' afterwards). Nothing else ever changes it.
+#
+# Examples:
+#   python src/cnnClassifier/pipeline/s6_load_test.py
+#   python src/cnnClassifier/pipeline/s6_load_test.py --target http://localhost:8080 --rate 50
+#   python src/cnnClassifier/pipeline/s6_load_test.py --accept-baseline
+# -----------------------------------------------------------------------------
+
+STAGE_NAME = "Load Test stage"
+
+
+class LoadTestPipeline:
+    def __init__(self):
+        pass
+
+    def main(self, accept_baseline=False, **overrides):
+        """
+        WHAT: Main execution flow for the load test.
+
+        HOW:
+        1. Load Config (keyword arguments override single fields).
+        2. Load the test images and start the target.
+        3. Run the load -> throughput + latency percentiles.
+        4. Check the p95 thresholds, then save 'load_test_scores.json'.
+        5. 'accept_baseline': skip the regression check and store this run
+           as the new baseline (the error and absolute limits still apply).
+        """
+        config = ConfigurationManager()
+        load_test_config = config.get_load_test_config()
+        load_test_config = replace(
+            load_test_config, **{k: v for k, v in overrides.items() if v is not None}
+        )
+        load_test = LoadTest(config=load_test_config)
+        load_test.load_images()
+        load_test.start_target()
+        load_test.run()
+        load_test.check_thresholds(check_regression=not accept_baseline)
+        load_test.save_scores()
+        if accept_baseline:
+            load_test.accept_baseline()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the /predict endpoint.")
+    parser.add_argument("--target", default=None, help="'inprocess' or a server URL, e.g. http://localhost:8080")
+    parser.add_argument("--endpoint", default=None, help="Route to hit (default: /predict)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Parallel clients")
+    parser.add_argument("--rate", dest="arrival_rate", type=float, default=None,
+                        help="Requests per second (open loop); 0 = closed loop")
+    parser.add_argument("--requests", type=int, default=None, help="Number of measured requests")
+    parser.add_argument("--payload", choices=("raw", "base64"), default=None, help="Request body format")
+    parser.add_argument("--accept-baseline", action="store_true",
+                        help="Store this run as the p95 baseline later runs are compared against")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        logger.info(f"*******************")
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        obj = LoadTestPipeline()
+        obj.main(**vars(args))
+        logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
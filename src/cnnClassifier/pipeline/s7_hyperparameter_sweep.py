@@ -0,0 +1,49 @@
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.components.hyperparameter_sweep import HyperparameterSweep
+from cnnClassifier import logger
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the "Pipeline" script for Stage 7 (Hyperparameter Sweep).
+#
+# It trains many versions of the model (different LEARNING_RATE, BATCH_SIZE,
+# AUGMENTATION, ...) in parallel, stops the bad ones early, and tells us
+# which params to put in params.yaml.
+# 1. It gets the configuration (SWEEP in params.yaml + the training settings).
+# 2. It runs the trials (on the data Data Ingestion already prepared).
+# 3. It saves 'leaderboard.json' and 'best_params.yaml' in artifacts/sweep.
+# -----------------------------------------------------------------------------
+
+STAGE_NAME = "Hyperparameter Sweep stage"
+
+
+class HyperparameterSweepPipeline:
+    def __init__(self):
+        pass
+
+    def main(self):
+        """
+        WHAT: Main execution flow for the sweep.
+
+        HOW:
+        1. Load Config (the sweep settings and the normal training settings).
+        2. Run the sweep -> Writes the leaderboard and the best params.
+        """
+        config = ConfigurationManager()
+        sweep_config = config.get_sweep_config()
+        training_config = config.get_training_config()
+        sweep = HyperparameterSweep(config=sweep_config, training_config=training_config)
+        sweep.run()
+
+
+
+if __name__ == '__main__':
+    try:
+        logger.info(f"*******************")
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        obj = HyperparameterSweepPipeline()
+        obj.main()
+        logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
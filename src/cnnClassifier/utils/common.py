@@ -9,6 +9,7 @@ from box import ConfigBox
 from pathlib import Path
 from typing import Any
 import base64
+import hashlib
 
 # -----------------------------------------------------------------------------
 # WHY THIS FILE EXISTS:
@@ -173,6 +174,39 @@ def get_size(path: Path) -> str:
     return f"~ {size_in_kb} KB"
 
 
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    WHAT: Computes the SHA-256 of a file, reading it in 1MB chunks.
+
+    WHY:
+    - Used wherever we must know a file's content is exactly what we expect
+      (model versions, the downloaded dataset) without loading it into memory.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def decodeImageToBytes(imgstring) -> bytes:
+    """
+    WHAT: Decodes a Base64 string into the raw bytes of the image (in memory).
+
+    WHY:
+    - The prediction pipeline can read the image straight from these bytes.
+    - No temporary file on disk means no disk I/O and no clashes between
+      two users predicting at the same time.
+
+    Args:
+        imgstring (str): The Base64 encoded string of the image.
+
+    Returns:
+        bytes: The decoded image file content (e.g. JPG bytes).
+    """
+    return base64.b64decode(imgstring)
+
+
 def decodeImage(imgstring, fileName):
     """
     WHAT: Decodes a Base64 string into an image file.
@@ -186,7 +220,7 @@ def decodeImage(imgstring, fileName):
         imgstring (str): The Base64 encoded string of the image.
         fileName (str): The path where the decoded image should be saved.
     """
-    imgdata = base64.b64decode(imgstring)
+    imgdata = decodeImageToBytes(imgstring)
     with open(fileName, 'wb') as f:
         f.write(imgdata)
         f.close()
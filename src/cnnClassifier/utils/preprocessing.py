@@ -0,0 +1,188 @@
+import io
+import os
+from pathlib import Path
+from typing import Union
+import numpy as np
+from PIL import Image
+
+# -----------------------------------------------------------------------------
+# WHY THIS FILE EXISTS:
+# This is the ONE place where an image file becomes a model input.
+#
+# Serving, Training, Evaluation and Model Export all call these functions, so
+# the model sees bit-for-bit the same (224, 224, 3) tensor for the same file,
+# no matter which path loaded it. (Before, serving resized with 'nearest' and
+# training with 'bilinear' - the model was served slightly different images
+# than it was trained on.)
+#
+# WHY it is fast - JPEG "draft mode":
+# - A JPEG stores 8x8 blocks of frequency (DCT) coefficients. The decoder can
+#   rebuild each block at 1/2, 1/4 or 1/8 size directly from those
+#   coefficients, which skips most of the decoding work.
+# - For a 2048x2048 scan we only need 224x224, so we ask the decoder for the
+#   smallest of those scales that is still >= 224 on both sides (here 1/8 ->
+#   256x256) and only resize the last bit with a normal (bilinear) resize.
+# - PNG and other formats have no such trick; they are decoded at full size.
+#
+# Nothing here imports TensorFlow (the web app must start without it). The
+# Keras data generators live in flow_from_directory() / flow_from_files(),
+# which import it lazily.
+# -----------------------------------------------------------------------------
+
+# The (width, height) VGG16 expects.
+TARGET_SIZE = (224, 224)
+
+# The 'rescale' factor used in training (ImageDataGenerator(rescale=1./255)).
+RESCALE = 1. / 255
+
+RESAMPLE = Image.BILINEAR
+
+
+def draft(img: Image.Image, target_size=TARGET_SIZE) -> Image.Image:
+    """
+    WHAT: Tells the JPEG decoder to decode at the smallest DCT scale (1/1, 1/2,
+    1/4, 1/8) that is still at least 'target_size'. A no-op for other formats.
+
+    WHY:
+    - Must be called BEFORE the pixels are decoded (before img.load()).
+    """
+    if img.format == "JPEG":
+        img.draft("RGB", target_size)
+    return img
+
+
+def to_pixels(img: Image.Image, target_size=TARGET_SIZE) -> np.ndarray:
+    """
+    WHAT: Turns a (decoded or drafted) PIL image into (H, W, 3) uint8 pixels.
+
+    HOW:
+    1. Convert to RGB (PNG uploads can be RGBA or grayscale).
+    2. Resize to 'target_size' with bilinear interpolation (as in training).
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != tuple(target_size):
+        img = img.resize(tuple(target_size), RESAMPLE)
+    return np.asarray(img, dtype=np.uint8)
+
+
+def load_pixels(source: Union[str, Path, bytes], target_size=TARGET_SIZE) -> np.ndarray:
+    """
+    WHAT: Reads an image file (path) or image bytes into (H, W, 3) uint8 pixels.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        draft(img, target_size)
+        return to_pixels(img, target_size)
+
+
+def normalize(pixels: np.ndarray) -> np.ndarray:
+    """
+    WHAT: Scales 0-255 pixels to 0-1 floats (works on one image or a batch).
+
+    WHY exactly this expression:
+    - It is the same float32 multiply ImageDataGenerator(rescale=1./255)
+      does, so the Keras generators and our own code give identical bits.
+    """
+    return pixels.astype(np.float32) * np.float32(RESCALE)
+
+
+_iterator_classes = None
+
+
+def _preprocessed_iterator_classes():
+    """
+    WHAT: Builds (once) the Keras iterators that load images with load_pixels().
+
+    WHY a function:
+    - Keeps TensorFlow out of this module's imports (see the header).
+
+    Returns:
+        tuple: (PreprocessedDirectoryIterator, PreprocessedFileIterator)
+    """
+    global _iterator_classes
+    if _iterator_classes is not None:
+        return _iterator_classes
+
+    import tensorflow as tf
+
+    def load_batch(self, index_array):
+        """
+        WHAT: Identical to Keras' own batching, except for the image loading.
+
+        HOW:
+        - Augmentation (if the generator has any) and rescaling still run on
+          the generator, exactly as before.
+        """
+        batch_x = np.zeros((len(index_array),) + self.image_shape, dtype=self.dtype)
+        for i, j in enumerate(index_array):
+            x = load_pixels(self.filepaths[j], self.target_size[::-1]).astype(self.dtype)
+            if self.image_data_generator:
+                params = self.image_data_generator.get_random_transform(x.shape)
+                x = self.image_data_generator.apply_transform(x, params)
+                x = self.image_data_generator.standardize(x)
+            batch_x[i] = x
+        batch_y = np.zeros((len(index_array), self.num_classes), dtype=self.dtype)
+        batch_y[np.arange(len(index_array)), self.classes[index_array]] = 1.0
+        return batch_x, batch_y
+
+    class PreprocessedDirectoryIterator(tf.keras.preprocessing.image.DirectoryIterator):
+        """
+        WHAT: flow_from_directory(), but every image goes through load_pixels().
+        """
+        _get_batches_of_transformed_samples = load_batch
+
+    class PreprocessedFileIterator(tf.keras.preprocessing.image.Iterator):
+        """
+        WHAT: The same iterator over an explicit list of (file, class) pairs
+        (e.g. one split of the dataset manifest) instead of a folder scan.
+        """
+        _get_batches_of_transformed_samples = load_batch
+
+        def __init__(self, filepaths, classes, class_indices, image_data_generator,
+                     target_size, batch_size, shuffle, seed=None, dtype="float32"):
+            self.filepaths = list(filepaths)
+            self.filenames = self.filepaths
+            self.classes = np.asarray(classes, dtype="int32")
+            self.class_indices = dict(class_indices)
+            self.num_classes = len(self.class_indices)
+            self.image_data_generator = image_data_generator
+            self.target_size = tuple(target_size)
+            self.image_shape = self.target_size + (3,)
+            self.dtype = dtype
+            self.samples = len(self.filepaths)
+            super().__init__(self.samples, batch_size, shuffle, seed)
+
+    _iterator_classes = (PreprocessedDirectoryIterator, PreprocessedFileIterator)
+    return _iterator_classes
+
+
+def flow_from_directory(image_data_generator, directory: Union[str, Path], **kwargs):
+    """
+    WHAT: Drop-in replacement for image_data_generator.flow_from_directory(...)
+    that loads every image with load_pixels() (draft-mode JPEG decoding).
+
+    NOTE:
+    - Only class_mode="categorical" (what this project uses) is supported.
+    - 'interpolation' is ignored: resizing is always done by load_pixels().
+    """
+    if kwargs.pop("class_mode", "categorical") != "categorical":
+        raise ValueError("flow_from_directory() only supports class_mode='categorical'")
+    kwargs.pop("interpolation", None)
+    return _preprocessed_iterator_classes()[0](
+        os.fspath(directory), image_data_generator, class_mode="categorical", **kwargs
+    )
+
+
+def flow_from_files(image_data_generator, filepaths: list, classes: list, class_indices: dict,
+                    target_size=TARGET_SIZE[::-1], batch_size: int = 32, shuffle: bool = True,
+                    seed: int = None):
+    """
+    WHAT: Like flow_from_directory(), but over a given list of files and their
+    class indices (categorical labels, (height, width) target size).
+    """
+    return _preprocessed_iterator_classes()[1](
+        filepaths, classes, class_indices, image_data_generator,
+        target_size, batch_size, shuffle, seed,
+    )